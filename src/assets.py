@@ -0,0 +1,107 @@
+import os
+import re
+import json
+import hashlib
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+
+from atomic import AtomicFile
+from manifest import hash_file
+from minify import minifier_for
+from static_sync import scan_static, DEFAULT_SYNC_JOBS
+
+# Where the asset manifest is written, relative to the output directory
+ASSET_MANIFEST_PATH = "asset-manifest.json"
+
+# Files that keep their names: pages, and files that browsers and crawlers
+# look for at a fixed URL (robots.txt, sitemap.xml, favicon.ico)
+UNFINGERPRINTED_EXTENSIONS = (".html", ".htm", ".txt", ".xml", ".ico")
+
+# How many hex digits of the content hash go into a fingerprinted name
+FINGERPRINT_LENGTH = 10
+
+# url(...) in a stylesheet, quoted or not
+CSS_URL_PATTERN = re.compile(r"""url\(\s*(['"]?)([^'")]*)\1\s*\)""")
+
+
+def fingerprinted_name(path, digest):
+    # images/a.png -> images/a.<hash>.png
+    root, extension = os.path.splitext(path)
+    return f"{root}.{digest[:FINGERPRINT_LENGTH]}{extension}"
+
+
+def _asset_digest(src_path, minify, file_hash=hash_file):
+    digest = file_hash(src_path)
+    if minify and minifier_for(src_path) is not None:
+        # The minified file isn't the source's bytes, so it gets its own name
+        digest = hashlib.sha256(f"{digest}:minify".encode()).hexdigest()
+    return digest
+
+
+def fingerprint_assets(src, minify=False, jobs=DEFAULT_SYNC_JOBS, manifest=None):
+    # Map the root-relative URL of every static asset ("/index.css") to the
+    # URL of its fingerprinted copy ("/index.3f2a9c01b7.css"). A name only
+    # changes when the file's contents do, so the CDN can cache them forever.
+    # With a manifest, files whose size and mtime haven't changed since the
+    # last build aren't hashed again
+    file_hash = manifest.stat_hash if manifest is not None else hash_file
+    pairs = [
+        (src_path, rel_path) for src_path, rel_path in scan_static(src, "")
+        if not rel_path.endswith(UNFINGERPRINTED_EXTENSIONS)
+    ]
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        digests = executor.map(lambda pair: _asset_digest(pair[0], minify, file_hash), pairs)
+        assets = {}
+        for (_, rel_path), digest in zip(pairs, digests):
+            url = "/" + rel_path.replace(os.sep, "/")
+            assets[url] = fingerprinted_name(url, digest)
+    return assets
+
+
+def css_asset_references(src, assets):
+    # (stylesheet, url) for every url(...) in a static stylesheet that points
+    # at a fingerprinted asset. Stylesheets are copied as they are, so those
+    # URLs still name the original file, which isn't written
+    found = []
+    for src_path, rel_path in scan_static(src, ""):
+        if not rel_path.endswith(".css"):
+            continue
+        with open(src_path, "r") as f:
+            text = f.read()
+        base = "/" + posixpath.dirname(rel_path.replace(os.sep, "/"))
+        for match in CSS_URL_PATTERN.finditer(text):
+            url = match.group(2).strip()
+            # Fragments, other sites and data: URLs aren't assets
+            if not url or url.startswith(("#", "//")) or ":" in url.split("/")[0]:
+                continue
+            path = url.split("#")[0].split("?")[0]
+            path = posixpath.normpath(path if path.startswith("/") else posixpath.join(base, path))
+            if path in assets:
+                found.append((src_path, url))
+    return found
+
+
+def asset_output_path(path, output_dir, assets):
+    # Where the static file that would be copied to path is written instead
+    url = "/" + os.path.relpath(path, output_dir).replace(os.sep, "/")
+    if url not in assets:
+        return path
+    return os.path.join(output_dir, *assets[url].lstrip("/").split("/"))
+
+
+def write_asset_manifest(assets, output_dir):
+    # Publish the mapping ({"index.css": "index.3f2a9c01b7.css"}) next to the
+    # assets, for anything outside the generator that links to them. The file
+    # is left alone when the mapping hasn't changed
+    path = os.path.join(output_dir, ASSET_MANIFEST_PATH)
+    data = {url.lstrip("/"): fingerprinted.lstrip("/") for url, fingerprinted in sorted(assets.items())}
+    text = json.dumps(data, indent=1, sort_keys=True) + "\n"
+    try:
+        with open(path, "r") as f:
+            if f.read() == text:
+                return path
+    except FileNotFoundError:
+        pass
+    with AtomicFile(path) as f:
+        f.write(text)
+    return path
@@ -0,0 +1,133 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from markdown import prepare_page, write_page
+from mapped_source import should_map
+from references import collect_references
+from profiler import NULL_PROFILER
+from parallel import init_worker, worker_initargs, make_batches, merge_batch_result, batch_failed, _generate_batch
+from parallel import DEFAULT_BATCH_SIZE
+
+# Reads and writes mostly wait on the disk, so many can be in flight at once
+DEFAULT_READ_CONCURRENCY = 16
+DEFAULT_WRITE_CONCURRENCY = 8
+# Rendered pages waiting to be written; when the queue is full the renderer
+# stops taking new pages until the writers catch up
+DEFAULT_WRITE_QUEUE_SIZE = 32
+
+
+def _read_source(path, dest_path, profiler):
+    # Very large sources aren't read up front; the renderer memory-maps them
+    if should_map(path):
+        return None
+    with profiler.stage("read", dest_path):
+        with open(path, "r") as f:
+            return f.read()
+
+
+def _prepare(markdown, source_path, template_path, dest_path, basepath, profiler):
+    # Parse the page into what write_page streams out, collecting its
+    # references here since the writer runs on another thread
+    with collect_references() as references:
+        page = prepare_page(source_path, template_path, dest_path, basepath, profiler, markdown)
+    return page, references
+
+
+async def _build_batches(pages, template_path, basepath, jobs, batch_size, references, profiler):
+    # With worker processes, each worker reads, renders and streams its pages
+    # itself, like generate_pages_parallel, so the loop only hands out
+    # batches and merges what comes back
+    loop = asyncio.get_running_loop()
+    batches = make_batches(pages, jobs, batch_size)
+    errors = []
+
+    async def run(batch):
+        try:
+            result = await loop.run_in_executor(executor, _generate_batch, batch, template_path, basepath,
+                                                profiler is not NULL_PROFILER)
+        except Exception as e:
+            errors.extend(batch_failed(batch, e))
+            return
+        errors.extend(merge_batch_result(batch, result, references, profiler))
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(batches)), initializer=init_worker,
+                             initargs=worker_initargs()) as executor:
+        await asyncio.gather(*(run(batch) for batch in batches))
+    return sorted(errors)
+
+
+async def build_pages_async(pages, template_path, basepath='/', jobs=1,
+                            read_concurrency=DEFAULT_READ_CONCURRENCY,
+                            write_concurrency=DEFAULT_WRITE_CONCURRENCY,
+                            queue_size=DEFAULT_WRITE_QUEUE_SIZE, references=None, profiler=NULL_PROFILER,
+                            batch_size=DEFAULT_BATCH_SIZE):
+    # Three overlapping stages: sources are read ahead of the renderer on an
+    # I/O thread pool, a single render thread parses them, and parsed pages
+    # are streamed into their outputs (see write_page) behind it by a fixed
+    # set of writer tasks fed through a bounded queue. With jobs > 1 the pages
+    # go to worker processes in batches instead. Returns (dest_path, message)
+    # for every page that failed
+    if not pages:
+        return []
+    if jobs > 1:
+        return await _build_batches(pages, template_path, basepath, jobs, batch_size, references, profiler)
+
+    loop = asyncio.get_running_loop()
+    io_executor = ThreadPoolExecutor(max_workers=read_concurrency + write_concurrency)
+    cpu_executor = ThreadPoolExecutor(max_workers=1)
+
+    read_slots = asyncio.Semaphore(read_concurrency)
+    # Pages between "read started" and "queued for writing". Bounding this is
+    # what makes a full write queue push back on the readers, so a slow disk
+    # can't make every source pile up in memory
+    in_flight = asyncio.Semaphore(read_concurrency + 1)
+    queue = asyncio.Queue(maxsize=queue_size)
+    errors = []
+
+    async def render(source_path, dest_path):
+        try:
+            async with read_slots:
+                markdown = await loop.run_in_executor(io_executor, _read_source, source_path, dest_path, profiler)
+            page, page_references = await loop.run_in_executor(
+                cpu_executor, _prepare, markdown, source_path, template_path, dest_path, basepath, profiler)
+        except Exception as e:
+            errors.append((dest_path, f"{type(e).__name__}: {e}"))
+            in_flight.release()
+            return
+        if references is not None:
+            references.add(dest_path, page_references)
+        # Waits here while the writers are behind
+        await queue.put((dest_path, page))
+        in_flight.release()
+
+    async def write():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            dest_path, (template, title, content) = item
+            try:
+                await loop.run_in_executor(io_executor, write_page, template, dest_path, title, content, basepath,
+                                           profiler)
+                print(f"Generated: {dest_path}")
+            except Exception as e:
+                errors.append((dest_path, f"{type(e).__name__}: {e}"))
+
+    try:
+        writers = [asyncio.create_task(write()) for _ in range(write_concurrency)]
+        renderers = []
+        for source_path, dest_path in pages:
+            await in_flight.acquire()
+            renderers.append(asyncio.create_task(render(source_path, dest_path)))
+        await asyncio.gather(*renderers)
+
+        # One stop marker per writer, queued behind the last page
+        for _ in writers:
+            await queue.put(None)
+        await asyncio.gather(*writers)
+    finally:
+        cpu_executor.shutdown()
+        io_executor.shutdown()
+
+    # Report failures in a stable order regardless of completion order
+    return sorted(errors)
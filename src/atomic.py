@@ -0,0 +1,78 @@
+import os
+import tempfile
+
+# The process's umask, read once at import (reading it means setting it).
+# mkstemp creates files only their owner can read, so finished files are
+# given the permissions open() would have given them
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _mkstemp(path, makedirs=False):
+    # A new file next to path, so replacing path with it never crosses
+    # filesystems, under a name no other writer can be using
+    directory = os.path.dirname(path) or "."
+    try:
+        return tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    except FileNotFoundError:
+        if not makedirs:
+            raise
+        os.makedirs(directory, exist_ok=True)
+        return tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+
+
+def temp_path(path):
+    # The name of a temporary file for writers that want a path rather than
+    # a file object (a hardlink, an image library). The caller moves it over
+    # path with os.replace, or removes it
+    fd, tmp_path = _mkstemp(path)
+    os.close(fd)
+    return tmp_path
+
+
+def finish(tmp_path, path):
+    # Give a finished temporary file the usual permissions and put it in
+    # place of path
+    os.chmod(tmp_path, 0o666 & ~_UMASK)
+    os.replace(tmp_path, path)
+
+
+def discard(tmp_path):
+    try:
+        os.remove(tmp_path)
+    except FileNotFoundError:
+        pass
+
+
+class AtomicFile:
+    # A file written in place of path: it's created next to path under a
+    # temporary name, moved over path when the with block finishes, and
+    # removed if the block raises, so readers (and the next incremental
+    # build) only ever see the old file or the complete new one
+    def __init__(self, path, mode="w", makedirs=False):
+        self.path = path
+        fd, self.tmp_path = _mkstemp(path, makedirs)
+        try:
+            self.file = os.fdopen(fd, mode)
+        except BaseException:
+            os.close(fd)
+            discard(self.tmp_path)
+            raise
+
+    def write(self, data):
+        return self.file.write(data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            try:
+                self.file.close()
+                finish(self.tmp_path, self.path)
+            except BaseException:
+                discard(self.tmp_path)
+                raise
+        else:
+            self.file.close()
+            discard(self.tmp_path)
@@ -0,0 +1,125 @@
+import gc
+import sys
+import time
+import argparse
+import tracemalloc
+
+from htmlnode import LeafNode, ParentNode
+from textnode import TextNode, TextType
+from markdown import markdown_to_html_node
+from corpus import synthetic_markdown
+
+
+# Copies of the node classes as they were before __slots__, so the benchmark
+# can compare both layouts side by side
+class DictHTMLNode:
+    def __init__(self, tag=None, attributes=None, value=None, children=None, props=None):
+        self.tag = tag
+        self.attributes = attributes or {}
+        self.value = value
+        self.children = children
+        self.props = props
+
+
+class DictLeafNode(DictHTMLNode):
+    def __init__(self, tag=None, value="", attributes=None):
+        super().__init__(tag, attributes)
+        self.value = value
+
+
+class DictParentNode(DictHTMLNode):
+    def __init__(self, tag=None, children=None, attributes=None):
+        super().__init__(tag, attributes)
+        self.children = children or []
+
+
+class DictTextNode:
+    def __init__(self, text, text_type, url=None):
+        self.text = text
+        self.text_type = text_type
+        self.url = url
+
+
+def measure_allocations(make_node, count):
+    # Bytes allocated per node and seconds to allocate count nodes
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    nodes = [make_node(i) for i in range(count)]
+    elapsed = time.perf_counter() - start
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Don't count the list holding the nodes
+    allocated -= sys.getsizeof(nodes)
+    del nodes
+    return allocated / count, elapsed
+
+
+def compare_layouts(count):
+    text = "shared text"
+    cases = {
+        "LeafNode (text)": (
+            lambda i: DictLeafNode(None, text),
+            lambda i: LeafNode(None, text),
+        ),
+        "ParentNode (li)": (
+            lambda i: DictParentNode("li", [None]),
+            lambda i: ParentNode("li", [None]),
+        ),
+        "TextNode": (
+            lambda i: DictTextNode(text, TextType.Normal_text),
+            lambda i: TextNode(text, TextType.Normal_text),
+        ),
+    }
+
+    print(f"{'node':<18} {'dict B/node':>12} {'slots B/node':>13} {'dict s':>8} {'slots s':>8}")
+    for name, (make_dict, make_slots) in cases.items():
+        dict_bytes, dict_time = measure_allocations(make_dict, count)
+        slots_bytes, slots_time = measure_allocations(make_slots, count)
+        print(f"{name:<18} {dict_bytes:>12.1f} {slots_bytes:>13.1f} {dict_time:>8.3f} {slots_time:>8.3f}")
+
+
+def count_nodes(node):
+    # Iterative walk so deep trees don't hit the recursion limit
+    count = 0
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        count += 1
+        if isinstance(current, ParentNode):
+            stack.extend(current.children)
+    return count
+
+
+def parse_corpus(size_mb, trace):
+    markdown = synthetic_markdown(int(size_mb * 1024 * 1024))
+    print(f"\nParsing {len(markdown) / (1024 * 1024):.1f} MB of synthetic markdown")
+
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    tree = markdown_to_html_node(markdown)
+    elapsed = time.perf_counter() - start
+    nodes = count_nodes(tree)
+    print(f"{nodes} HTML nodes in {elapsed:.2f}s")
+    if trace:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"tree holds {current / (1024 * 1024):.1f} MB ({current / nodes:.1f} B/node), peak {peak / (1024 * 1024):.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare node memory layouts and parse a synthetic corpus")
+    parser.add_argument("--nodes", type=int, default=1_000_000, help="nodes allocated per layout comparison")
+    parser.add_argument("--size-mb", type=float, default=100, help="size of the synthetic markdown corpus (0 to skip)")
+    parser.add_argument("--trace", action="store_true", help="trace allocations while parsing the corpus (slow)")
+    args = parser.parse_args()
+
+    compare_layouts(args.nodes)
+    if args.size_mb:
+        parse_corpus(args.size_mb, args.trace)
+
+
+if __name__ == "__main__":
+    main()
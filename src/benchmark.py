@@ -0,0 +1,138 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+from textnode import markdown_to_blocks, block_to_block_type, text_to_textnodes
+from markdown import inline_markdown_to_textnodes, markdown_to_html_node
+from template import Template
+from corpus import CORPORA
+
+# A stage regresses when it is this much slower than the stored baseline
+DEFAULT_THRESHOLD = 0.25
+
+# ...and by at least this many seconds, so timer noise on tiny stages
+# doesn't count as a regression
+DEFAULT_MIN_DELTA = 0.001
+
+TEMPLATE = """<!doctype html>
+<html>
+  <head>
+    <title>{{ Title }}</title>
+    <link href="/index.css" rel="stylesheet" />
+  </head>
+  <body>
+    <article>{{ Content }}</article>
+  </body>
+</html>"""
+
+
+def _time(func, repeat):
+    # Best of several runs is the least noisy estimate of the real cost
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark_corpus(pages, repeat, tmp_dir):
+    template = Template(TEMPLATE, "/site/")
+    blocks = [markdown_to_blocks(page) for page in pages]
+    paragraphs = [block for page in blocks for block in page if block_to_block_type(block) == "paragraph"]
+    trees = [markdown_to_html_node(page) for page in pages]
+    html = [tree.to_html() for tree in trees]
+    documents = [template.render(Title="Title", Content=content) for content in html]
+    out_path = os.path.join(tmp_dir, "page.html")
+
+    def write_pages():
+        for document in documents:
+            with open(out_path, "w") as f:
+                f.write(document)
+
+    stages = {
+        "markdown_to_blocks": lambda: [markdown_to_blocks(page) for page in pages],
+        "block_to_block_type": lambda: [block_to_block_type(block) for page in blocks for block in page],
+        "inline_markdown_to_textnodes": lambda: [inline_markdown_to_textnodes(p) for p in paragraphs],
+        "text_to_textnodes": lambda: [text_to_textnodes(p) for p in paragraphs],
+        "markdown_to_html_node": lambda: [markdown_to_html_node(page) for page in pages],
+        "to_html": lambda: [tree.to_html() for tree in trees],
+        "template": lambda: [template.render(Title="Title", Content=content) for content in html],
+        "write": write_pages,
+    }
+    return {name: _time(func, repeat) for name, func in stages.items()}
+
+
+def run_benchmarks(corpora, scale, repeat, seed=0):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in corpora:
+            pages = CORPORA[name](random.Random(seed), scale)
+            results[name] = benchmark_corpus(pages, repeat, tmp_dir)
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold=DEFAULT_THRESHOLD, min_delta=DEFAULT_MIN_DELTA):
+    # Return (corpus, stage, baseline seconds, current seconds) for every stage
+    # that got slower than the baseline allows
+    regressions = []
+    for corpus, stages in sorted(results.items()):
+        for stage, seconds in sorted(stages.items()):
+            expected = baseline.get(corpus, {}).get(stage)
+            if expected is None:
+                continue
+            if seconds > expected * (1 + threshold) and seconds - expected > min_delta:
+                regressions.append((corpus, stage, expected, seconds))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time each stage of the markdown to HTML pipeline")
+    parser.add_argument("--corpus", action="append", choices=sorted(CORPORA),
+                        help="corpus shape to run (repeatable, default: all)")
+    parser.add_argument("--scale", type=int, default=5, help="size multiplier for the synthetic corpora")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage; the fastest is reported")
+    parser.add_argument("--output", help="write the results as JSON to this file (default: stdout)")
+    parser.add_argument("--baseline", help="JSON results to compare against; exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown relative to the baseline (0.25 = 25%%)")
+    parser.add_argument("--min-delta", type=float, default=DEFAULT_MIN_DELTA,
+                        help="ignore slowdowns smaller than this many seconds")
+    parser.add_argument("--save-baseline", help="also write the results to this file as the new baseline")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.corpus or sorted(CORPORA), args.scale, args.repeat)
+    report = json.dumps({"scale": args.scale, "results": results}, indent=2, sort_keys=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            f.write(report + "\n")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        if baseline.get("scale") != args.scale:
+            print(f"Baseline was recorded at scale {baseline.get('scale')}, not {args.scale}", file=sys.stderr)
+            return 2
+        regressions = compare_to_baseline(results, baseline["results"], args.threshold, args.min_delta)
+        for corpus, stage, expected, seconds in regressions:
+            print(f"Regression: {corpus}/{stage} took {seconds:.4f}s (baseline {expected:.4f}s)", file=sys.stderr)
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import random
+
+# Synthetic markdown shared by the benchmarks (benchmark.py times the build
+# stages on these corpora, bench_nodes.py measures node allocations). All
+# of it comes from a seeded random.Random, so every run sees the same input
+
+WORDS = ["gambit", "remy", "cards", "kinetic", "energy", "new", "orleans", "thieves", "guild", "storm"]
+
+
+def synthetic_markdown(size_bytes, seed=0):
+    # Build a markdown document of roughly size_bytes out of headings,
+    # paragraphs with inline markup, lists and quotes
+    rng = random.Random(seed)
+    blocks = ["# Synthetic corpus"]
+    total = len(blocks[0])
+    while total < size_bytes:
+        kind = rng.randrange(4)
+        words = [rng.choice(WORDS) for _ in range(rng.randint(10, 40))]
+        words[rng.randrange(len(words))] = f"**{rng.choice(WORDS)}**"
+        words[rng.randrange(len(words))] = f"_{rng.choice(WORDS)}_"
+        words[rng.randrange(len(words))] = f"[{rng.choice(WORDS)}](/blog/{rng.choice(WORDS)})"
+        line = " ".join(words)
+        if kind == 0:
+            block = f"## {rng.choice(WORDS)} {rng.choice(WORDS)}"
+        elif kind == 1:
+            block = "\n".join(f"- {line[:rng.randint(20, len(line))]}" for _ in range(rng.randint(2, 8)))
+        elif kind == 2:
+            block = f"> {line}"
+        else:
+            block = line
+        blocks.append(block)
+        total += len(block) + 2
+    return "\n\n".join(blocks)
+
+
+def sentence(rng, words, markup=True):
+    parts = [rng.choice(WORDS) for _ in range(words)]
+    if markup and words >= 4:
+        parts[rng.randrange(words)] = f"**{rng.choice(WORDS)}**"
+        parts[rng.randrange(words)] = f"_{rng.choice(WORDS)}_"
+        parts[rng.randrange(words)] = f"`{rng.choice(WORDS)}`"
+    return " ".join(parts)
+
+
+def long_paragraphs(rng, scale):
+    # A handful of very long paragraphs full of inline markup
+    paragraphs = [sentence(rng, 2000) for _ in range(scale)]
+    return ["# Long paragraphs\n\n" + "\n\n".join(paragraphs)]
+
+
+def deep_lists(rng, scale):
+    # Long unordered and ordered lists
+    blocks = ["# Lists"]
+    for _ in range(scale):
+        blocks.append("\n".join(f"- {sentence(rng, 8)}" for _ in range(200)))
+        blocks.append("\n".join(f"{n}. {sentence(rng, 8)}" for n in range(1, 201)))
+    return ["\n\n".join(blocks)]
+
+
+def many_links(rng, scale):
+    # Paragraphs that are mostly links and images
+    blocks = ["# Links"]
+    for _ in range(scale * 20):
+        links = [f"[{rng.choice(WORDS)}](/blog/{rng.choice(WORDS)})" for _ in range(50)]
+        links.append(f"![{rng.choice(WORDS)}](/images/{rng.choice(WORDS)}.png)")
+        blocks.append(" and ".join(links))
+    return ["\n\n".join(blocks)]
+
+
+def many_small_pages(rng, scale):
+    # Lots of short pages, like a blog
+    pages = []
+    for n in range(scale * 100):
+        pages.append(
+            f"# Post {n}\n\n{sentence(rng, 30)}\n\n> {sentence(rng, 12)}\n\n"
+            f"- [{rng.choice(WORDS)}](/blog/{rng.choice(WORDS)})\n- {sentence(rng, 6)}"
+        )
+    return pages
+
+
+CORPORA = {
+    "long_paragraphs": long_paragraphs,
+    "deep_lists": deep_lists,
+    "many_links": many_links,
+    "many_small_pages": many_small_pages,
+}
@@ -0,0 +1,126 @@
+import os
+
+from manifest import GENERATOR_VERSION
+from minify import minifier_for
+
+
+class DependencyGraph:
+    # The build's dependency graph as recorded in the manifest: every output
+    # points at the files it was built from. Outputs can be inputs too (a
+    # page embeds the copy of an image in the output directory, which is
+    # itself built from the static file), so changes propagate transitively
+    def __init__(self, records):
+        # output -> {input path: fingerprint}
+        self.inputs = {output: record.get("inputs", {}) for output, record in records.items()}
+        # input path -> outputs built from it
+        self.dependents = {}
+        for output, inputs in self.inputs.items():
+            for path in inputs:
+                self.dependents.setdefault(path, set()).add(output)
+
+    def update(self, output, record):
+        # Replace what output was built from, e.g. after rebuilding it
+        self.remove(output)
+        self.inputs[output] = record.get("inputs", {})
+        for path in self.inputs[output]:
+            self.dependents.setdefault(path, set()).add(output)
+
+    def remove(self, output):
+        for path in self.inputs.pop(output, ()):
+            dependents = self.dependents.get(path)
+            if dependents is not None:
+                dependents.discard(output)
+                if not dependents:
+                    del self.dependents[path]
+
+    def affected(self, paths, content_hash=None):
+        # Every output built from paths, directly or through other outputs.
+        # content_hash(output) predicts the hash an affected output will have
+        # once rebuilt (None if it can't tell); outputs that recorded exactly
+        # that hash for it aren't affected through it, just like the build
+        # itself compares content hashes (a touched image is copied again,
+        # but the pages embedding it stay as they are)
+        affected = set()
+        stack = list(paths)
+        while stack:
+            path = stack.pop()
+            digest = content_hash(path) if content_hash is not None and path in self.inputs else None
+            for output in self.dependents.get(path, ()):
+                if output in affected or (digest is not None and self.inputs[output][path] == digest):
+                    continue
+                affected.add(output)
+                stack.append(output)
+        return affected
+
+    def changed_inputs(self, manifest):
+        # Source files (inputs that aren't outputs themselves) whose
+        # fingerprint no longer matches the recorded one, or that are gone
+        changed = set()
+        checked = set()
+        for inputs in self.inputs.values():
+            for path, recorded in inputs.items():
+                if path in checked or path in self.inputs:
+                    continue
+                checked.add(path)
+                if manifest.fingerprint(path, recorded) != recorded:
+                    changed.add(path)
+        return changed
+
+
+def plan_rebuild(manifest, outputs, basepath, layouts=None, minify=False, images=False, changed=None, graph=None):
+    # What an incremental build would do, without doing it. outputs maps
+    # every output the build would produce now to its kind ("page" or
+    # "static"), layouts maps pages to the template they would use now, and
+    # minify and images say whether the build minifies and adds image
+    # attributes. changed is the set of input paths known to have changed or
+    # gone (watch.py gets it from the file watcher); without it every
+    # recorded input is fingerprinted to find them. graph is the
+    # DependencyGraph of manifest.previous, when the caller keeps one.
+    # Returns ({output: sorted reasons}, stale outputs)
+    layouts = layouts or {}
+    graph = graph or DependencyGraph(manifest.previous)
+    if changed is None:
+        changed = graph.changed_inputs(manifest)
+
+    def content_hash(output):
+        # A static file that is copied as is ends up with its source's
+        # contents. Anything else (minified, renamed away or no longer
+        # built) counts as changed
+        sources = list(graph.inputs.get(output, ()))
+        if outputs.get(output) != "static" or len(sources) != 1:
+            return None
+        if minify and minifier_for(output) is not None:
+            return None
+        return manifest.file_hash(sources[0])
+
+    reasons = {}
+    for path in sorted(changed):
+        for output in graph.affected([path], content_hash):
+            reasons.setdefault(output, set()).add(f"{path} changed")
+
+    for output, kind in outputs.items():
+        record = manifest.previous.get(output)
+        if record is None:
+            reason = "new"
+        elif "inputs" not in record:
+            reason = "failed last time" if record.get("failed") else "not recorded"
+        elif record.get("generator") != GENERATOR_VERSION:
+            reason = "generator changed"
+        elif kind == "page" and record.get("basepath") != basepath:
+            reason = "basepath changed"
+        elif output in layouts and layouts[output] not in record["inputs"]:
+            reason = "layout changed"
+        elif record.get("minify", False) != (minify and (kind == "page" or
+                                                        (kind == "static" and minifier_for(output) is not None))):
+            reason = "minify changed"
+        elif kind == "page" and record.get("images", False) != images:
+            reason = "image attributes changed"
+        elif not os.path.exists(output):
+            reason = "output missing"
+        else:
+            continue
+        reasons.setdefault(output, set()).add(reason)
+
+    rebuild = {output: sorted(reasons[output]) for output in reasons if output in outputs}
+    stale = sorted(output for output in manifest.previous if output not in outputs)
+    return rebuild, stale
@@ -0,0 +1,103 @@
+import os
+from collections import namedtuple
+
+from manifest import load_versioned_json, save_versioned_json
+
+# Where the content index lives by default (next to the build manifest)
+DEFAULT_INDEX_PATH = ".content_index.json"
+
+# One markdown page found under the content directory
+Page = namedtuple("Page", ["source", "dest", "mtime", "size"])
+
+
+class ContentIndex:
+    # Remembers the listing of every content directory, keyed by the
+    # directory's path and stamped with its mtime. A directory's mtime only
+    # changes when entries are added, removed or renamed, so a directory with
+    # the same mtime as last time doesn't have to be listed again
+    def __init__(self, previous=None):
+        # Listings from the last build, keyed by directory path
+        self.previous = previous or {}
+        # Listings seen during this scan, keyed by directory path
+        self.current = {}
+        # How many directories were listed vs. reused in the last scan
+        self.scanned = 0
+        self.reused = 0
+
+    @classmethod
+    def load(cls, path=DEFAULT_INDEX_PATH):
+        # No usable index means a full scan
+        data = load_versioned_json(path)
+        if data is None:
+            return cls()
+        return cls(data.get("directories", {}))
+
+    def save(self, path=DEFAULT_INDEX_PATH):
+        save_versioned_json(path, None, {"directories": self.current})
+
+    def list_directory(self, path):
+        # Returns (markdown file names, subdirectory names) for one directory
+        mtime = os.stat(path).st_mtime_ns
+        previous = self.previous.get(path)
+        if previous is not None and previous["mtime"] == mtime:
+            self.reused += 1
+            listing = previous
+        else:
+            # DirEntry caches the entry type from readdir, so telling files
+            # from directories costs no extra stat calls
+            files = []
+            directories = []
+            for entry in os.scandir(path):
+                if entry.is_dir():
+                    directories.append(entry.name)
+                elif entry.name.endswith('.md') and entry.is_file():
+                    files.append(entry.name)
+            self.scanned += 1
+            listing = {"mtime": mtime, "files": sorted(files), "directories": sorted(directories)}
+        self.current[path] = listing
+        return listing["files"], listing["directories"]
+
+    def scan(self, content_dir, dest_dir):
+        # Flat list of every page under content_dir, sorted by source path.
+        # Each page is stat'ed for its mtime and size even when its directory
+        # listing was reused, since editing a file in place doesn't touch the
+        # directory's mtime
+        pages = []
+        stack = [(content_dir, dest_dir)]
+        while stack:
+            directory, dest_directory = stack.pop()
+            files, directories = self.list_directory(directory)
+            for name in files:
+                source = os.path.join(directory, name)
+                stat = os.stat(source)
+                dest = os.path.join(dest_directory, _output_name(name))
+                pages.append(Page(source, dest, stat.st_mtime_ns, stat.st_size))
+            for name in directories:
+                stack.append((os.path.join(directory, name), os.path.join(dest_directory, name)))
+        pages.sort()
+        return pages
+
+
+def _output_name(name):
+    return name.replace('.md', '.html')
+
+
+def page_dest(source, content_dir, dest_dir):
+    # Where the page for one source goes, as scan would put it
+    # (content/blog/post.md -> docs/blog/post.html)
+    directory, name = os.path.split(os.path.relpath(source, content_dir))
+    return os.path.join(dest_dir, directory, _output_name(name))
+
+
+def discover_pages(content_dir, dest_dir, index=None):
+    # Scan without a persisted index when the caller doesn't keep one
+    return (index or ContentIndex()).scan(content_dir, dest_dir)
+
+
+def create_output_dirs(pages):
+    # Create every output directory up front, once each, so writing a page
+    # never has to check for its directory
+    directories = sorted({os.path.dirname(page.dest) for page in pages})
+    for directory in directories:
+        os.makedirs(directory, exist_ok=True)
+    return directories
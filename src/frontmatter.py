@@ -0,0 +1,98 @@
+import itertools
+
+# Front matter is a block of "key: value" lines between two "---" lines at
+# the very top of a markdown file:
+#
+#   ---
+#   title: Powers
+#   date: 2024-05-01
+#   tags: [gambit, powers]
+#   ---
+FRONT_MATTER_DELIMITER = "---"
+
+# Keys whose value is always a list, even when written without brackets
+# ("tags: a, b")
+LIST_KEYS = ("tags",)
+
+
+def _unquote(value):
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        return value[1:-1]
+    return value
+
+
+def parse_value(key, value):
+    value = value.strip()
+    if value.startswith("[") and value.endswith("]"):
+        items = value[1:-1].split(",")
+    elif key in LIST_KEYS:
+        items = value.split(",")
+    else:
+        return _unquote(value)
+    return [_unquote(item.strip()) for item in items if item.strip()]
+
+
+def parse_header(lines):
+    # Turn the lines between the delimiters into a dict
+    metadata = {}
+    for line in lines:
+        line = line.rstrip("\n")
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        key, separator, value = line.partition(":")
+        if not separator:
+            raise ValueError(f"Invalid front matter line: {line!r}")
+        key = key.strip()
+        metadata[key] = parse_value(key, value)
+    return metadata
+
+
+def front_matter_span(data):
+    # Where the front matter of a str or bytes document (e.g. a memory-mapped
+    # file) is: (header start, header end, body start), or None when the
+    # document has none. Only the header is searched, never the body
+    if isinstance(data, str):
+        newline, delimiter = "\n", FRONT_MATTER_DELIMITER
+    else:
+        newline, delimiter = b"\n", FRONT_MATTER_DELIMITER.encode()
+    if data[:len(delimiter) + 1] != delimiter + newline:
+        return None
+
+    position = len(delimiter)
+    while True:
+        end = data.find(newline + delimiter, position)
+        if end == -1:
+            # Never closed, so it isn't front matter after all
+            return None
+        close = end + 1 + len(delimiter)
+        if close == len(data) or data[close:close + 1] == newline:
+            return len(delimiter) + 1, end + 1, min(close + 1, len(data))
+        position = close
+
+
+def split_front_matter(markdown):
+    # (metadata, body) for a whole document held in a string
+    span = front_matter_span(markdown)
+    if span is None:
+        return {}, markdown
+    header_start, header_end, body_start = span
+    return parse_header(markdown[header_start:header_end].split("\n")), markdown[body_start:]
+
+
+def read_front_matter(lines):
+    # (metadata, remaining lines) for an iterator of lines such as an open
+    # file. Only the header is consumed, so the body can still be streamed
+    lines = iter(lines)
+    first = next(lines, None)
+    if first is None:
+        return {}, iter(())
+    if first.rstrip("\n") != FRONT_MATTER_DELIMITER:
+        return {}, itertools.chain([first], lines)
+
+    header = []
+    for line in lines:
+        if line.rstrip("\n") == FRONT_MATTER_DELIMITER:
+            return parse_header(header), lines
+        header.append(line)
+    # Never closed, so hand back everything that was read
+    return {}, itertools.chain([first], header)
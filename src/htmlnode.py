@@ -1,7 +1,19 @@
+import sys
+from types import MappingProxyType
+
+# Shared, read-only attribute map for the (very common) nodes without any
+# attributes, so each plain text leaf doesn't allocate its own empty dict
+EMPTY_ATTRIBUTES = MappingProxyType({})
+
+
 class HTMLNode:
+    # Fixed slots instead of a per-instance __dict__ keep large trees compact
+    __slots__ = ("tag", "attributes", "value", "children", "props")
+
     def __init__(self, tag=None, attributes=None, value=None, children=None, props=None):
-        self.tag = tag
-        self.attributes = attributes or {}  # Initialize to an empty dict if None
+        # Intern tag names so every "li" or "p" node shares one string
+        self.tag = sys.intern(tag) if tag is not None else None
+        self.attributes = attributes or EMPTY_ATTRIBUTES
         self.value = value
         self.children = children
         self.props = props
@@ -9,6 +21,21 @@ class HTMLNode:
     def to_html(self):
         raise NotImplementedError
 
+    def iter_html(self):
+        # Yield the HTML in chunks instead of building one big string
+        raise NotImplementedError
+
+    def write_html(self, fp):
+        # Stream the HTML straight into a writable file object
+        for chunk in self.iter_html():
+            fp.write(chunk)
+
+    def attributes_to_html(self):
+        attributes_html = ""
+        for attr, value in self.attributes.items():
+            attributes_html += f' {attr}="{value}"'
+        return attributes_html
+
     def props_to_html(self):
         if self.props is None:
             return ""
@@ -25,6 +52,8 @@ class HTMLNode:
 
 
 class LeafNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag=None, value="", attributes=None):
         super().__init__(tag, attributes)
         self.value = value
@@ -33,25 +62,26 @@ class LeafNode(HTMLNode):
         if self.tag is None:
             return self.value
 
-        attributes_html = ""
-        for attr, value in self.attributes.items():
-            attributes_html += f' {attr}="{value}"'
+        return f"<{self.tag}{self.attributes_to_html()}>{self.value}</{self.tag}>"
 
-        return f"<{self.tag}{attributes_html}>{self.value}</{self.tag}>"
+    def iter_html(self):
+        # A leaf is small, so it goes out as a single chunk
+        yield self.to_html()
 
 
 class ParentNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag=None, children=None, attributes=None):
         super().__init__(tag, attributes)  # Make sure to call the parent's __init__
         self.children = children or []
 
     def to_html(self):
-        children_html = ""
-        for child in self.children:
-            children_html += child.to_html()
+        # Join the streamed chunks once instead of concatenating per level
+        return "".join(self.iter_html())
 
-        attributes_html = ""
-        for attr, value in self.attributes.items():
-            attributes_html += f' {attr}="{value}"'
-
-        return f"<{self.tag}{attributes_html}>{children_html}</{self.tag}>"
\ No newline at end of file
+    def iter_html(self):
+        yield f"<{self.tag}{self.attributes_to_html()}>"
+        for child in self.children:
+            yield from child.iter_html()
+        yield f"</{self.tag}>"
@@ -0,0 +1,241 @@
+import os
+import struct
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from atomic import temp_path, finish, discard
+from manifest import hash_file, load_versioned_json, save_versioned_json, GENERATOR_VERSION
+from static_sync import scan_static, copy_file
+from assets import fingerprinted_name
+
+# Pillow is only needed for resized variants; dimensions are read from the
+# file headers without it
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Where incremental builds keep image dimensions, and where resized variants
+# are cached between builds
+DEFAULT_IMAGE_INDEX_PATH = ".image_index.json"
+DEFAULT_IMAGE_CACHE_DIR = ".image_cache"
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".webp")
+
+# Header reads and resizes are I/O or release the GIL, so threads do
+DEFAULT_IMAGE_JOBS = os.cpu_count() or 1
+
+# What pages need to know about a static image. variants are
+# (width, url, cache path) for each resized copy, narrowest first
+ImageInfo = namedtuple("ImageInfo", ["source", "url", "hash", "width", "height", "variants"])
+
+# JPEG start-of-frame markers, which carry the dimensions. 0xC4, 0xC8 and
+# 0xCC share the range but are other segments
+_JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _jpeg_size(f):
+    # Walk the segments up to the first start-of-frame, seeking over the
+    # rest, so only a few hundred bytes are read
+    f.seek(2)
+    while True:
+        # Each segment starts with 0xFF, possibly padded with more of them
+        if f.read(1) != b"\xff":
+            return None
+        marker = f.read(1)
+        while marker == b"\xff":
+            marker = f.read(1)
+        if not marker:
+            return None
+        if marker[0] in _JPEG_SOF_MARKERS:
+            data = f.read(7)
+            if len(data) < 7:
+                return None
+            height, width = struct.unpack(">xxxHH", data)
+            return width, height
+        length = f.read(2)
+        if len(length) < 2:
+            return None
+        f.seek(struct.unpack(">H", length)[0] - 2, 1)
+
+
+def image_size(path):
+    # (width, height) from the image's header, or None if the format isn't
+    # recognized. PNG, GIF and WebP keep them in the first 30 bytes
+    with open(path, "rb") as f:
+        head = f.read(30)
+        if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+            return struct.unpack(">II", head[16:24])
+        if head[:6] in (b"GIF87a", b"GIF89a"):
+            return struct.unpack("<HH", head[6:10])
+        if head[:4] == b"RIFF" and head[8:12] == b"WEBP" and len(head) == 30:
+            chunk = head[12:16]
+            if chunk == b"VP8 ":
+                width, height = struct.unpack("<HH", head[26:30])
+                return width & 0x3FFF, height & 0x3FFF
+            if chunk == b"VP8L":
+                bits = int.from_bytes(head[21:25], "little")
+                return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+            if chunk == b"VP8X":
+                return int.from_bytes(head[24:27], "little") + 1, int.from_bytes(head[27:30], "little") + 1
+        if head[:2] == b"\xff\xd8":
+            return _jpeg_size(f)
+    return None
+
+
+def variant_url(url, width, digest):
+    # /images/a.png -> /images/a-480w.<hash>.png. The source's hash is in the
+    # name, so a variant's URL changes whenever its contents can
+    root, extension = os.path.splitext(url)
+    return fingerprinted_name(f"{root}-{width}w{extension}", digest)
+
+
+def resize(src_path, dst_path, width):
+    # Write a copy of the image scaled down to width, keeping its format
+    tmp_path = temp_path(dst_path)
+    try:
+        with Image.open(src_path) as image:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS)
+            resized.save(tmp_path, format=image.format)
+        finish(tmp_path, dst_path)
+    except BaseException:
+        discard(tmp_path)
+        raise
+
+
+class ImageIndex:
+    # Dimensions of every static image, keyed by content hash, so a renamed
+    # or copied image is never measured twice. Each source is remembered
+    # with its mtime and size too, so unchanged images aren't even hashed
+    def __init__(self, paths=None, images=None):
+        # Source path -> {"mtime", "size", "hash"}
+        self.paths = paths or {}
+        # Content hash -> [width, height]
+        self.images = images or {}
+        # How many images the last scan had to hash, measure or resize
+        self.hashed = 0
+        self.measured = 0
+        self.resized = 0
+
+    @classmethod
+    def load(cls, path=DEFAULT_IMAGE_INDEX_PATH):
+        # No usable index means measuring every image again
+        data = load_versioned_json(path)
+        if data is None:
+            return cls()
+        return cls(data.get("paths", {}), data.get("images", {}))
+
+    def save(self, path=DEFAULT_IMAGE_INDEX_PATH):
+        save_versioned_json(path, None, {"paths": self.paths, "images": self.images})
+
+    def _process(self, src_path, widths, cache_dir, make_variants=True):
+        # Returns (path record, size, variants, hashed, measured, resized) for
+        # one image; runs on the thread pool, so it only reads the index
+        stat = os.stat(src_path)
+        record = self.paths.get(src_path)
+        hashed = record is None or record["mtime"] != stat.st_mtime_ns or record["size"] != stat.st_size
+        if hashed:
+            record = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "hash": hash_file(src_path)}
+        digest = record["hash"]
+
+        size = self.images.get(digest)
+        measured = size is None
+        if measured:
+            size = image_size(src_path)
+        if size is None:
+            return record, None, [], hashed, measured, 0
+
+        variants = []
+        resized = 0
+        extension = os.path.splitext(src_path)[1]
+        for width in sorted(set(widths)):
+            if width >= size[0]:
+                continue
+            cache_path = os.path.join(cache_dir, digest[:2], f"{digest}-{width}w{extension}")
+            if not os.path.exists(cache_path):
+                if make_variants:
+                    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                    resize(src_path, cache_path, width)
+                resized += 1
+            variants.append((width, cache_path))
+        return record, list(size), variants, hashed, measured, resized
+
+    def scan(self, static_dir, widths=(), cache_dir=DEFAULT_IMAGE_CACHE_DIR, jobs=DEFAULT_IMAGE_JOBS,
+             make_variants=True):
+        # Measure every image under static_dir (and make its resized
+        # variants, if widths are given) in parallel. Returns {root-relative
+        # URL: ImageInfo}. Without make_variants the variants are only
+        # planned: missing ones are counted in resized but not written to
+        # cache_dir (for --dry-run)
+        pairs = [pair for pair in scan_static(static_dir, "") if pair[1].lower().endswith(IMAGE_EXTENSIONS)]
+        paths = {}
+        self.hashed = self.measured = self.resized = 0
+        found = {}
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            results = executor.map(lambda pair: self._process(pair[0], widths, cache_dir, make_variants), pairs)
+            for (src_path, rel_path), (record, size, variants, hashed, measured, resized) in zip(pairs, results):
+                paths[src_path] = record
+                self.hashed += hashed
+                self.measured += measured
+                self.resized += resized
+                if size is None:
+                    continue
+                digest = record["hash"]
+                self.images[digest] = size
+                url = "/" + rel_path.replace(os.sep, "/")
+                found[url] = ImageInfo(
+                    src_path,
+                    url,
+                    digest,
+                    size[0],
+                    size[1],
+                    tuple((width, variant_url(url, width, digest), cache_path) for width, cache_path in variants),
+                )
+
+        # Forget images that are gone
+        self.paths = paths
+        live = {record["hash"] for record in paths.values()}
+        self.images = {digest: size for digest, size in self.images.items() if digest in live}
+        return found
+
+
+def variant_inputs(info, width):
+    # What the manifest remembers about a resized variant: the source image
+    # it was made from, by hash, and the width
+    return {"inputs": {info.source: info.hash}, "width": width, "generator": GENERATOR_VERSION}
+
+
+def write_variants(images, output_dir, manifest=None, select=None):
+    # Copy the cached variants into the output directory. With a manifest,
+    # variants that are already there are left alone, and every variant is
+    # recorded so it's pruned once its source is gone. select picks the
+    # variants this build writes (see sharding.py)
+    written = 0
+    for info in images.values():
+        for width, url, cache_path in info.variants:
+            dst_path = os.path.join(output_dir, *url.lstrip("/").split("/"))
+            if select is not None and not select(dst_path):
+                continue
+            inputs = variant_inputs(info, width)
+            if manifest is not None:
+                manifest.record(dst_path, inputs)
+                if manifest.is_fresh(dst_path, inputs):
+                    continue
+            os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+            copy_file(cache_path, dst_path)
+            written += 1
+    return written
+
+
+def image_attributes(info, basepath='/', assets=None):
+    # The attributes added to an <img> of this image: its intrinsic size, so
+    # the browser reserves the space before it loads, lazy loading and, when
+    # there are resized variants, a srcset to choose from
+    attributes = f' width="{info.width}" height="{info.height}" loading="lazy"'
+    if info.variants:
+        url = assets.get(info.url, info.url) if assets else info.url
+        candidates = [f"{basepath}{variant[1:]} {width}w" for width, variant, _ in info.variants]
+        candidates.append(f"{basepath}{url[1:]} {info.width}w")
+        attributes += f' srcset="{", ".join(candidates)}" sizes="(max-width: {info.width}px) 100vw, {info.width}px"'
+    return attributes
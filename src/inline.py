@@ -0,0 +1,106 @@
+import re
+
+# Characters that can start an inline element; everything else is plain text
+SPECIAL_CHARS = re.compile(r"[`\[!*_]")
+
+
+class _Finder:
+    # Wraps str.find and remembers the last answer for each needle. The
+    # tokenizer only ever searches forward, so once a needle's next occurrence
+    # is known (or known to be missing) it never has to be searched for again
+    # until the scan passes it. This keeps unmatched delimiters from turning
+    # the scan quadratic.
+    def __init__(self, text):
+        self.text = text
+        self.memo = {}
+
+    def find(self, needle, position):
+        searched_from, found = self.memo.get(needle, (None, None))
+        if searched_from is not None and searched_from <= position:
+            if found == -1 or found >= position:
+                return found
+        found = self.text.find(needle, position)
+        self.memo[needle] = (position, found)
+        return found
+
+
+def tokenize_inline(text, strict=False):
+    # Split inline markdown into (kind, text, url) tokens in a single left to
+    # right scan. kind is one of "text", "code", "link", "image", "bold" or
+    # "italic"; url is only set for links and images.
+    #
+    # At each position the elements are tried in the same order the old
+    # parser used: code, link, image, bold, italic. Unclosed delimiters are
+    # plain text, unless strict is set, in which case they raise ValueError.
+    tokens = []
+    length = len(text)
+    finder = _Finder(text)
+
+    # Start of the plain text that hasn't been emitted yet
+    start = 0
+    i = 0
+
+    while True:
+        # Jump straight to the next character that could start an element
+        match = SPECIAL_CHARS.search(text, i)
+        if match is None:
+            break
+        i = match.start()
+        char = text[i]
+        token = None
+
+        # Handle inline code with backticks
+        if char == '`':
+            end = finder.find('`', i + 1) if i + 1 < length else -1
+            if end != -1:
+                token = ("code", text[i + 1:end], None)
+                next_i = end + 1
+            elif strict:
+                raise ValueError("No closing delimiter found for `")
+
+        # Handle links [text](url) and images ![alt](url)
+        elif char == '[' or (char == '!' and i + 2 < length and text[i + 1] == '['):
+            closing_bracket = finder.find(']', i)
+            if closing_bracket != -1 and closing_bracket + 1 < length and text[closing_bracket + 1] == '(':
+                closing_paren = finder.find(')', closing_bracket + 1)
+                if closing_paren != -1:
+                    url = text[closing_bracket + 2:closing_paren]
+                    if char == '[':
+                        token = ("link", text[i + 1:closing_bracket], url)
+                    else:
+                        token = ("image", text[i + 2:closing_bracket], url)
+                    next_i = closing_paren + 1
+
+        # Handle bold with double asterisks
+        elif char == '*' and text.startswith('*', i + 1):
+            end = finder.find('**', i + 2) if i + 2 < length else -1
+            if end != -1:
+                token = ("bold", text[i + 2:end], None)
+                next_i = end + 2
+            elif strict:
+                raise ValueError("No closing delimiter found for **")
+
+        # Handle italic with underscore
+        elif char == '_':
+            end = finder.find('_', i + 1) if i + 1 < length else -1
+            if end != -1:
+                token = ("italic", text[i + 1:end], None)
+                next_i = end + 1
+            elif strict:
+                raise ValueError("No closing delimiter found for _")
+
+        if token is None:
+            i += 1
+            continue
+
+        # Emit the text before the element, then the element itself
+        if i > start:
+            tokens.append(("text", text[start:i], None))
+        tokens.append(token)
+        start = i = next_i
+
+    # Add any remaining text
+    if start < length:
+        tokens.append(("text", text[start:], None))
+
+    return tokens
@@ -0,0 +1,81 @@
+from collections import OrderedDict
+
+from manifest import load_versioned_json, save_versioned_json
+
+DEFAULT_INLINE_CACHE_SIZE = 4096
+# Bump when the shape of the cached values changes, so a saved cache from an
+# older build is ignored instead of misread
+INLINE_CACHE_FORMAT = 2
+
+
+class InlineCache:
+    def __init__(self, maxsize=DEFAULT_INLINE_CACHE_SIZE, eviction="lru", track_new=False):
+        if eviction not in ("lru", "fifo"):
+            raise ValueError(f"Unknown eviction policy: {eviction}")
+        self.maxsize = maxsize
+        self.eviction = eviction
+        # Oldest entries first; with LRU a hit moves the entry to the end
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Keys added since the last call to take_new, when tracked, so worker
+        # processes can hand their new entries back to the parent
+        self.new_keys = [] if track_new else None
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self.eviction == "lru":
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self.entries[key] = value
+        # Replacing a value keeps its place in the queue under FIFO, so an
+        # entry a worker also computed doesn't outlive newer ones
+        if self.eviction == "lru":
+            self.entries.move_to_end(key)
+        if self.new_keys is not None:
+            self.new_keys.append(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def take_new(self):
+        # Entries added since the last call that are still cached
+        new = [(key, self.entries[key]) for key in self.new_keys or [] if key in self.entries]
+        if self.new_keys is not None:
+            self.new_keys = []
+        return new
+
+    def merge(self, entries, hits=0, misses=0, evictions=0):
+        # Fold in the entries and counters from a worker's cache
+        for key, value in entries:
+            self.put(key, value)
+        self.hits += hits
+        self.misses += misses
+        self.evictions += evictions
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups * 100 if lookups else 0.0
+        return (f"Inline cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate), "
+                f"{self.evictions} evictions, {len(self.entries)}/{self.maxsize} entries")
+
+    def load(self, path):
+        # No usable cache file means a cold cache
+        data = load_versioned_json(path, INLINE_CACHE_FORMAT)
+        if data is None:
+            return
+        for key, value in data.get("entries", [])[-self.maxsize:]:
+            self.entries[key] = value
+
+    def save(self, path):
+        # Entries are stored oldest first so eviction order survives a reload
+        save_versioned_json(path, INLINE_CACHE_FORMAT, {"entries": list(self.entries.items())}, indent=None)
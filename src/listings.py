@@ -0,0 +1,184 @@
+import os
+import re
+from xml.sax.saxutils import escape
+
+from markdown import render_html, open_output
+from htmlnode import LeafNode, ParentNode
+from references import record_reference, collect_references
+
+# Where the generated listings go, relative to the output directory
+TAGS_DIR = "tags"
+FEED_PATH = "atom.xml"
+
+# How many of the newest posts the feed carries
+DEFAULT_FEED_SIZE = 20
+
+
+def slugify(text):
+    # "Mutant Powers" -> "mutant-powers", for tag directories
+    return re.sub(r"[^a-z0-9_-]+", "-", text.lower()).strip("-") or "tag"
+
+
+def posts(entries):
+    # Pages with a date are posts, newest first
+    return sorted((entry for entry in entries if entry.date), key=lambda entry: (entry.date, entry.url), reverse=True)
+
+
+def listing_node(title, links):
+    # Listings are built as HTML nodes rather than written as markdown, so
+    # titles and tags show up exactly as written ("Foo [draft]", "snake_case
+    # *notes*") instead of being parsed as links or emphasis. links are
+    # (text, url, text after the link) for each list item; the page looks
+    # like "# title" followed by a "- [text](url) after" list would
+    items = []
+    for text, url, after in links:
+        record_reference("link", url)
+        items.append(ParentNode("li", [LeafNode("a", text, {"href": url}), LeafNode(None, after)]))
+    return ParentNode("div", [LeafNode("h1", title), ParentNode("ul", items)])
+
+
+def entry_links(entries):
+    return [(entry.title, entry.url, f" {entry.date}") for entry in entries]
+
+
+def listing_pages(entries, content_dir, output_dir):
+    # (dest, layout source, title, links) for every listing page (see
+    # listing_node): an index of
+    # each section's posts (unless the section has its own index page), an
+    # index of tags and a page per tag. The layout source is the path a page
+    # at that spot would have, so section layouts apply to listings too
+    pages = []
+    all_posts = posts(entries)
+    if not all_posts:
+        return pages
+    existing = {entry.dest for entry in entries}
+
+    sections = {}
+    for entry in all_posts:
+        parts = entry.url.strip("/").split("/")
+        if len(parts) > 1:
+            sections.setdefault(parts[0], []).append(entry)
+    for section, section_posts in sorted(sections.items()):
+        dest = os.path.join(output_dir, section, "index.html")
+        if dest not in existing:
+            source = os.path.join(content_dir, section, "index.md")
+            pages.append((dest, source, section.replace("-", " ").title(), entry_links(section_posts)))
+
+    # Tags that differ only in case or punctuation share a page, named after
+    # the first spelling seen
+    tags = {}
+    for entry in all_posts:
+        for tag in entry.tags:
+            name, tag_posts = tags.setdefault(slugify(tag), (tag, []))
+            # Posts come in order, so a repeated tag on one post is always
+            # the last one added
+            if not tag_posts or tag_posts[-1] is not entry:
+                tag_posts.append(entry)
+    if tags:
+        links = [(name, f"/{TAGS_DIR}/{slug}", f" ({len(tag_posts)})")
+                 for slug, (name, tag_posts) in sorted(tags.items())]
+        pages.append((os.path.join(output_dir, TAGS_DIR, "index.html"),
+                      os.path.join(content_dir, TAGS_DIR, "index.md"), "Tags", links))
+    for slug, (name, tag_posts) in sorted(tags.items()):
+        pages.append((os.path.join(output_dir, TAGS_DIR, slug, "index.html"),
+                      os.path.join(content_dir, TAGS_DIR, slug, "index.md"), f"Tagged: {name}", entry_links(tag_posts)))
+    return pages
+
+
+def _updated(date):
+    # Atom wants a full timestamp; a bare date means midnight UTC
+    return f"{date}T00:00:00Z" if len(date) == 10 else date
+
+
+def atom_feed(entries, title, site_url, basepath='/', size=DEFAULT_FEED_SIZE):
+    # An Atom feed of the newest posts. Links are absolute when site_url is
+    # given, otherwise root-relative under the basepath
+    base = site_url.rstrip("/") + basepath.rstrip("/")
+    feed_posts = posts(entries)[:size]
+    lines = [
+        '<?xml version="1.0" encoding="utf-8"?>',
+        '<feed xmlns="http://www.w3.org/2005/Atom">',
+        f"  <title>{escape(title)}</title>",
+        f'  <link href="{escape(base)}/" />',
+        f'  <link rel="self" href="{escape(base)}/{FEED_PATH}" />',
+        f"  <id>{escape(base)}/</id>",
+        f"  <updated>{escape(_updated(feed_posts[0].date)) if feed_posts else ''}</updated>",
+        f"  <author><name>{escape(title)}</name></author>",
+    ]
+    for entry in feed_posts:
+        link = escape(base + entry.url)
+        lines.append("  <entry>")
+        lines.append(f"    <title>{escape(entry.title)}</title>")
+        lines.append(f'    <link href="{link}" />')
+        lines.append(f"    <id>{link}</id>")
+        lines.append(f"    <updated>{escape(_updated(entry.date))}</updated>")
+        for tag in entry.tags:
+            lines.append(f'    <category term="{escape(tag)}" />')
+        lines.append("  </entry>")
+    lines.append("</feed>")
+    return "\n".join(lines) + "\n"
+
+
+def listing_outputs(entries, content_dir, output_dir):
+    # Every file generate_listings would write
+    outputs = [dest for dest, _, _, _ in listing_pages(entries, content_dir, output_dir)]
+    if posts(entries):
+        outputs.append(os.path.join(output_dir, FEED_PATH))
+    return outputs
+
+
+def entry_listings(entry, output_dir):
+    # The listing outputs that link to entry: its section's index, the tag
+    # pages and the feed. watch.py writes just these when a page's front
+    # matter changes
+    if not entry.date:
+        return []
+    outputs = [os.path.join(output_dir, FEED_PATH)]
+    parts = entry.url.strip("/").split("/")
+    if len(parts) > 1:
+        outputs.append(os.path.join(output_dir, parts[0], "index.html"))
+    if entry.tags:
+        outputs.append(os.path.join(output_dir, TAGS_DIR, "index.html"))
+    outputs.extend(os.path.join(output_dir, TAGS_DIR, slugify(tag), "index.html") for tag in entry.tags)
+    return outputs
+
+
+def _write_if_changed(path, text):
+    # Listings are regenerated on every build; leave unchanged files alone
+    # so their mtimes (and anything synced from them) stay put
+    try:
+        with open(path, "r") as f:
+            if f.read() == text:
+                return False
+    except FileNotFoundError:
+        pass
+    with open_output(path) as f:
+        f.write(text)
+    return True
+
+
+def generate_listings(entries, content_dir, template_path, output_dir, basepath='/', site_url="",
+                      feed_size=DEFAULT_FEED_SIZE, references=None, select=None):
+    # Write the post listings, tag pages and feed from the metadata index
+    # alone; no post is rendered again. select picks the outputs this build
+    # writes (see sharding.py). Returns every listing output written
+    outputs = []
+    for dest, source, title, links in listing_pages(entries, content_dir, output_dir):
+        if select is not None and not select(dest):
+            continue
+        with collect_references() as page_references:
+            content = listing_node(title, links)
+        html = render_html(title, content, source, template_path, basepath)
+        if references is not None:
+            references.add(dest, page_references)
+        if _write_if_changed(dest, html):
+            print(f"Generated: {dest}")
+        outputs.append(dest)
+
+    feed_path = os.path.join(output_dir, FEED_PATH)
+    if posts(entries) and (select is None or select(feed_path)):
+        home = [entry.title for entry in entries if entry.url == "/"]
+        if _write_if_changed(feed_path, atom_feed(entries, home[0] if home else "Posts", site_url, basepath, feed_size)):
+            print(f"Generated: {feed_path}")
+        outputs.append(feed_path)
+    return outputs
@@ -1,9 +1,38 @@
 import os
 import sys
 import shutil
-from markdown import generate_page
+import asyncio
+import argparse
+import cProfile
+from markdown import generate_page, set_inline_cache, set_render_cache, set_template_registry, get_template_registry
+from markdown import set_page_metadata
+from template import TemplateRegistry, DEFAULT_LAYOUTS_DIR
+from render_cache import RenderCache, DEFAULT_RENDER_CACHE_DIR, DEFAULT_RENDER_CACHE_BYTES
+from inline_cache import InlineCache, DEFAULT_INLINE_CACHE_SIZE
+from manifest import BuildManifest, DEFAULT_MANIFEST_PATH, GENERATOR_VERSION
+from discovery import ContentIndex, DEFAULT_INDEX_PATH, discover_pages, create_output_dirs
+from references import ReferenceIndex, DEFAULT_REFERENCE_INDEX_PATH, check_references, embedded_assets
+from dependencies import plan_rebuild
+from metadata import MetadataIndex, DEFAULT_METADATA_INDEX_PATH
+from listings import generate_listings, listing_outputs, DEFAULT_FEED_SIZE
+from precompress import precompress, available_formats, COMPRESSIBLE_EXTENSIONS, FORMAT_EXTENSIONS, DEFAULT_COMPRESS_JOBS
+from parallel import generate_pages_parallel
+from async_build import build_pages_async, DEFAULT_READ_CONCURRENCY, DEFAULT_WRITE_CONCURRENCY, DEFAULT_WRITE_QUEUE_SIZE
+from profiler import BuildProfiler, NULL_PROFILER
+from static_sync import sync_static, scan_static, minify_file, DEFAULT_SYNC_JOBS
+from minify import minifier_for
+from assets import fingerprint_assets, asset_output_path, write_asset_manifest, css_asset_references, ASSET_MANIFEST_PATH
+from images import ImageIndex, Image, write_variants, DEFAULT_IMAGE_INDEX_PATH, DEFAULT_IMAGE_CACHE_DIR, DEFAULT_IMAGE_JOBS
+from sharding import parse_shard, owns, write_shard_manifest
+
+def copy_static(src, dst, manifest=None, compare="mtime", link=False, jobs=DEFAULT_SYNC_JOBS, minify=False,
+                rename=None, select=None):
+    # Incremental builds sync instead: only changed files are copied.
+    # Fingerprinted assets are renamed, and a shard copies only its share of
+    # the files, both of which the sync does as it copies
+    if manifest is not None or rename is not None or select is not None:
+        return sync_static(src, dst, manifest or BuildManifest(), compare, link, jobs, minify, rename, select)
 
-def copy_static(src, dst):
     # Create the destination directory if it doesn't exist
     if not os.path.exists(dst):
         os.mkdir(dst)
@@ -17,71 +46,477 @@ def copy_static(src, dst):
         src_path = os.path.join(src, item)
         dst_path = os.path.join(dst, item)
 
-        # If the item is a file, copy it
+        # If the item is a file, copy it (minified, if it's HTML or CSS and
+        # minify is on)
         if os.path.isfile(src_path):
-            shutil.copy(src_path, dst_path)
-            print(f"Copied file: {src_path} to {dst_path}")
+            minifier = minifier_for(src_path) if minify else None
+            if minifier is not None:
+                minify_file(src_path, dst_path, minifier)
+                print(f"Minified file: {src_path} to {dst_path}")
+            else:
+                shutil.copy(src_path, dst_path)
+                print(f"Copied file: {src_path} to {dst_path}")
         else:
             # If it's a directory, recursively copy it
-            copy_static(src_path, dst_path)
-
-def generate_pages_recursive(dir_path_content, template_path, dest_dir_path, basepath='/'):
-    # Get all entries in the content directory
-    entries = os.listdir(dir_path_content)
+            copy_static(src_path, dst_path, minify=minify)
 
+def generate_pages_recursive(dir_path_content, template_path, dest_dir_path, basepath='/', manifest=None, jobs=1,
+                             profiler=NULL_PROFILER, pipeline=None, index=None, references=None, metadata=None,
+                             shard=None):
     # Create the destination directory if it doesn't exist
     os.makedirs(dest_dir_path, exist_ok=True)
 
-    # Process each entry
+    # Step 1: Find every page up front, and create each output directory
+    # once instead of once per page. A persisted index lets unchanged
+    # content directories skip being listed again
+    with profiler.stage("discovery"):
+        found = discover_pages(dir_path_content, dest_dir_path, index)
+        # A shard builds (and makes directories for) only the pages it owns
+        owned = [page for page in found if owns(shard, page.dest, dest_dir_path)]
+        create_output_dirs(owned)
+    pages = [(page.source, page.dest) for page in owned]
+
+    # Read every page's front matter (only for pages that changed, with a
+    # persisted index) for layouts and listings
+    if metadata is not None:
+        with profiler.stage("metadata"):
+            metadata.scan(found, dest_dir_path)
+
+    # Pages that are gone take their links with them. The manifest needs
+    # every rebuilt page's references to record the assets it embeds
+    if references is None and manifest is not None:
+        references = ReferenceIndex()
+    if references is not None:
+        references.retain(dest_file_path for _, dest_file_path in pages)
+
+    return build_pages(pages, template_path, dest_dir_path, basepath, manifest, jobs, profiler, pipeline, references,
+                       metadata)
+
+
+def build_pages(pages, template_path, dest_dir_path, basepath='/', manifest=None, jobs=1, profiler=NULL_PROFILER,
+                pipeline=None, references=None, metadata=None):
+    # Build the given (source, dest) pages: skip the ones the manifest says
+    # are current, generate the rest and record what they were built from.
+    # generate_pages_recursive passes every page it found; watch.py passes
+    # just the pages a change affects. Returns (dest_path, message) for
+    # every page that failed
+
+    # Each page's layout, so the manifest records the template it really uses
+    registry = get_template_registry()
+    minify = registry is not None and registry.minify
+    images = registry is not None and bool(registry.images)
+    asset_map = registry.assets if registry is not None else None
+    layout_errors = []
+    if registry is not None:
+        layouts = {}
+        resolved = []
+        for source_path, dest_file_path in pages:
+            # A page asking for a layout that doesn't exist fails on its own,
+            # like one with broken front matter, and the rest are still built
+            try:
+                layouts[dest_file_path] = registry.layout_path(
+                    source_path, metadata.metadata_for(source_path) if metadata else None)
+            except ValueError as e:
+                layout_errors.append((dest_file_path, f"{type(e).__name__}: {e}"))
+                if manifest is not None:
+                    manifest.mark_failed(dest_file_path)
+                continue
+            resolved.append((source_path, dest_file_path))
+        pages = resolved
+        # A page also depends on the fingerprinted assets its layout links
+        # to, whose names change along with their contents
+        layout_assets = {
+            path: [os.path.join(dest_dir_path, *url.lstrip("/").split("/")) for url in template.asset_urls]
+            for path, template in registry.templates.items()
+        }
+    else:
+        layouts = {dest_file_path: template_path for _, dest_file_path in pages}
+        layout_assets = {}
+
+    # Step 2: In incremental mode, drop pages whose inputs haven't changed.
+    # That includes the images a page embeds, so this runs after the static
+    # sync has brought the output's copies up to date
+    if manifest is not None:
+        pending = []
+        for source_path, dest_file_path in pages:
+            layout = layouts[dest_file_path]
+            assets = sorted(set(manifest.previous_assets(dest_file_path, source_path, layout) +
+                                layout_assets.get(layout, [])))
+            inputs = manifest.page_inputs(source_path, layout, basepath, assets, minify, images)
+            manifest.record(dest_file_path, inputs)
+            if not manifest.is_fresh(dest_file_path, inputs):
+                pending.append((source_path, dest_file_path))
+        pages = pending
+
+    # Step 3: Generate the pages, fanning out to worker processes if asked to.
+    # pipeline is (read concurrency, write concurrency, write queue size) for
+    # the asyncio driver, which overlaps reading and writing with rendering.
+    # Pages take their front matter and title from the metadata scan instead
+    # of reading them again
+    set_page_metadata(metadata.current if metadata is not None else None)
+    try:
+        if pipeline is not None:
+            errors = asyncio.run(build_pages_async(pages, template_path, basepath, jobs, *pipeline,
+                                                   references=references, profiler=profiler))
+        elif jobs > 1:
+            errors = generate_pages_parallel(pages, template_path, basepath, jobs, profiler=profiler,
+                                             references=references)
+        else:
+            errors = []
+            for source_path, dest_file_path in pages:
+                # Generate the HTML page - pass the basepath! A page that fails is
+                # reported at the end, like with -j and --async, and the rest of
+                # the build carries on
+                try:
+                    page_references = generate_page(source_path, template_path, dest_file_path, basepath, profiler)
+                except Exception as e:
+                    errors.append((dest_file_path, f"{type(e).__name__}: {e}"))
+                    continue
+                if references is not None:
+                    references.add(dest_file_path, page_references)
+                print(f"Generated: {dest_file_path}")
+    finally:
+        set_page_metadata(None)
+    errors = layout_errors + errors
+
+    # Record what each rebuilt page was built from, now that its embedded
+    # assets are known. Failed pages must be rebuilt next time, but their old
+    # output is kept
+    if manifest is not None:
+        failed = {dest_file_path for dest_file_path, _ in errors}
+        for source_path, dest_file_path in pages:
+            if dest_file_path in failed:
+                manifest.mark_failed(dest_file_path)
+                continue
+            assets = embedded_assets(dest_file_path, references.outgoing.get(dest_file_path, ()), dest_dir_path,
+                                     asset_map)
+            assets = sorted(set(assets + layout_assets.get(layouts[dest_file_path], [])))
+            manifest.record(dest_file_path, manifest.page_inputs(source_path, layouts[dest_file_path], basepath, assets,
+                                                                 minify, images))
+
+    return errors
+
+
+def planned_outputs(entries, content_dir, output_dir, registry=None, compress_formats=None):
+    # Every output the build produces, mapped to its kind ("page", "static",
+    # ...). entries are the metadata index's PageMeta for every page
+    outputs = {}
+    asset_map = registry.assets if registry is not None else None
+    if os.path.exists("static"):
+        for _, dst_path in scan_static("static", output_dir):
+            if asset_map:
+                dst_path = asset_output_path(dst_path, output_dir, asset_map)
+            outputs[dst_path] = "static"
+    if asset_map:
+        outputs[os.path.join(output_dir, ASSET_MANIFEST_PATH)] = "asset manifest"
+    for info in (registry.images or {}).values() if registry is not None else ():
+        for _, url, _ in info.variants:
+            outputs[os.path.join(output_dir, *url.lstrip("/").split("/"))] = "image variant"
     for entry in entries:
-        # Create full paths
-        entry_path = os.path.join(dir_path_content, entry)
+        outputs[entry.dest] = "page"
+    for path in listing_outputs(entries, content_dir, output_dir):
+        outputs[path] = "listing"
+    for path in [path for path in outputs if path.endswith(COMPRESSIBLE_EXTENSIONS)]:
+        for compression in compress_formats or []:
+            outputs[path + FORMAT_EXTENSIONS[compression]] = "compressed"
+    return outputs
+
+
+def dry_run(manifest, content_dir, output_dir, basepath, index=None, registry=None, metadata=None,
+            compress_formats=None):
+    # List what an incremental build would rebuild or remove, and why,
+    # without touching the output directory
+    pages = discover_pages(content_dir, output_dir, index)
+    metadata = metadata or MetadataIndex()
+    metadata.scan(pages, output_dir)
+    outputs = planned_outputs(metadata.entries, content_dir, output_dir, registry, compress_formats)
+    layouts = {}
+    if registry is not None:
+        for page in pages:
+            try:
+                layouts[page.dest] = registry.layout_path(page.source, metadata.metadata_for(page.source))
+            except ValueError as e:
+                print(f"Would fail: {page.dest} ({e})")
+
+    rebuild, stale = plan_rebuild(manifest, outputs, basepath, layouts, registry is not None and registry.minify,
+                                  registry is not None and bool(registry.images))
+    for path in sorted(rebuild):
+        print(f"Would rebuild: {path} ({', '.join(rebuild[path])})")
+    for path in stale:
+        print(f"Would remove: {path}")
+    print(f"{len(rebuild)} of {len(outputs)} outputs would be rebuilt, {len(stale)} removed")
+    return rebuild, stale
+
 
-        # If it's a file and has .md extension
-        if os.path.isfile(entry_path) and entry.endswith('.md'):
-            # Create the destination path, changing .md to .html
-            rel_path = os.path.relpath(entry_path, dir_path_content)
-            dest_file_path = os.path.join(dest_dir_path, rel_path.replace('.md', '.html'))
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Build the static site into docs/")
+    # Basepath stays positional so `main.py /StaticSiteGenerator/` keeps working
+    parser.add_argument("basepath", nargs="?", default="/")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only rebuild outputs whose inputs changed since the last build")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST_PATH,
+                        help="where the incremental build manifest is stored")
+    parser.add_argument("--content-index", default=DEFAULT_INDEX_PATH,
+                        help="where incremental builds keep the listing of the content directories")
+    parser.add_argument("--layouts", default=DEFAULT_LAYOUTS_DIR,
+                        help="directory of section and named layouts (layouts/blog.html is used for content/blog/)")
+    parser.add_argument("--metadata-index", default=DEFAULT_METADATA_INDEX_PATH,
+                        help="where incremental builds keep every page's front matter")
+    parser.add_argument("--site-url", default="",
+                        help="absolute URL of the site, used for links in the Atom feed")
+    parser.add_argument("--feed-size", type=int, default=DEFAULT_FEED_SIZE,
+                        help="how many of the newest posts the Atom feed lists")
+    parser.add_argument("--minify", action="store_true",
+                        help="minify the template, layouts and static HTML and CSS files (<pre> is left as is)")
+    parser.add_argument("--fingerprint", action="store_true",
+                        help="copy static assets to content-hashed names (index.<hash>.css) and link to those")
+    parser.add_argument("--images", action="store_true",
+                        help="give every <img> of a static image its width, height and loading=\"lazy\"")
+    parser.add_argument("--image-widths", type=lambda value: [int(width) for width in value.split(",")], default=[],
+                        help="with --images, comma separated widths of downscaled variants offered through srcset "
+                             "(needs Pillow)")
+    parser.add_argument("--image-index", default=DEFAULT_IMAGE_INDEX_PATH,
+                        help="where incremental builds keep every image's dimensions")
+    parser.add_argument("--image-cache", default=DEFAULT_IMAGE_CACHE_DIR,
+                        help="where downscaled variants are cached by image hash")
+    parser.add_argument("--image-jobs", type=int, default=DEFAULT_IMAGE_JOBS,
+                        help="threads used to measure and resize images")
+    parser.add_argument("--precompress", action="store_true",
+                        help="write .gz (and .br, if brotli is installed) variants of every text output")
+    parser.add_argument("--precompress-formats", type=lambda value: value.split(","),
+                        help=f"comma separated formats to write (default: {','.join(available_formats())})")
+    parser.add_argument("--precompress-jobs", type=int, default=DEFAULT_COMPRESS_JOBS,
+                        help="threads used to compress outputs")
+    parser.add_argument("--shard", type=parse_shard,
+                        help="build only shard i of N (e.g. 2/4) of the outputs; merge the shards with sharding.py")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="list what an incremental build would rebuild, and why, without building")
+    parser.add_argument("--reference-index", default=DEFAULT_REFERENCE_INDEX_PATH,
+                        help="where incremental builds keep every page's links and images")
+    parser.add_argument("--check-links", action="store_true",
+                        help="fail the build if a page links to a missing page, image or static file")
+    parser.add_argument("--static-compare", choices=["mtime", "hash"], default="mtime",
+                        help="how incremental builds decide a static file changed (size+mtime or content hash)")
+    parser.add_argument("--static-link", action="store_true",
+                        help="hardlink static files into the output instead of copying them where possible")
+    parser.add_argument("--static-jobs", type=int, default=DEFAULT_SYNC_JOBS,
+                        help="threads used to sync static files in incremental builds")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="number of worker processes used to generate pages (0 = one per CPU)")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="prefetch sources and write outputs concurrently with rendering")
+    parser.add_argument("--read-concurrency", type=int, default=DEFAULT_READ_CONCURRENCY,
+                        help="with --async, how many sources are read at once")
+    parser.add_argument("--write-concurrency", type=int, default=DEFAULT_WRITE_CONCURRENCY,
+                        help="with --async, how many outputs are written at once")
+    parser.add_argument("--write-queue", type=int, default=DEFAULT_WRITE_QUEUE_SIZE,
+                        help="with --async, how many rendered pages may wait for a writer")
+    parser.add_argument("--inline-cache-size", type=int, default=0,
+                        help=f"cache up to this many rendered inline fragments (0 = off, e.g. {DEFAULT_INLINE_CACHE_SIZE})")
+    parser.add_argument("--inline-cache-eviction", choices=["lru", "fifo"], default="lru",
+                        help="which fragment to drop when the inline cache is full")
+    parser.add_argument("--inline-cache-file",
+                        help="load the inline cache from this file and save it back after the build")
+    parser.add_argument("--render-cache", nargs="?", const=DEFAULT_RENDER_CACHE_DIR,
+                        help=f"reuse rendered page bodies from this directory (default {DEFAULT_RENDER_CACHE_DIR})")
+    parser.add_argument("--render-cache-size", type=int, default=DEFAULT_RENDER_CACHE_BYTES // (1024 * 1024),
+                        help="evict least recently used render cache entries beyond this many MB")
+    parser.add_argument("--profile", action="store_true",
+                        help="time each build stage and page and print a summary at the end")
+    parser.add_argument("--profile-top", type=int, default=10,
+                        help="how many of the slowest pages the profile summary lists")
+    parser.add_argument("--profile-output",
+                        help="with --profile, also write a Chrome trace (*.json) or a cProfile dump (anything else)")
+    return parser.parse_args(argv)
 
-            # Ensure the destination directory exists
-            os.makedirs(os.path.dirname(dest_file_path), exist_ok=True)
 
-            # Generate the HTML page - pass the basepath!
-            generate_page(entry_path, template_path, dest_file_path, basepath)
-            print(f"Generated: {dest_file_path}")
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    basepath = args.basepath
+    jobs = args.jobs or os.cpu_count() or 1
 
-        # If it's a directory, recursively process it
-        elif os.path.isdir(entry_path):
-            # Create the corresponding directory in the destination
-            dest_subdir = os.path.join(dest_dir_path, entry)
+    # Memoize rendered inline fragments across pages (and builds, if persisted)
+    inline_cache = None
+    if args.inline_cache_size > 0:
+        inline_cache = InlineCache(args.inline_cache_size, args.inline_cache_eviction)
+        if args.inline_cache_file:
+            inline_cache.load(args.inline_cache_file)
+        set_inline_cache(inline_cache)
 
-            # Recursively process the subdirectory - pass the basepath!
-            generate_pages_recursive(entry_path, template_path, dest_subdir, basepath)
+    # Skip parsing entirely for pages whose markdown was rendered before
+    render_cache = None
+    if args.render_cache:
+        render_cache = RenderCache(args.render_cache, args.render_cache_size * 1024 * 1024)
+        set_render_cache(render_cache)
 
+    profiler = BuildProfiler() if args.profile else NULL_PROFILER
+    trace_output = args.profile and args.profile_output and args.profile_output.endswith(".json")
 
-def main():
-    # Get basepath from command line args, default to '/' if not provided
-    basepath = sys.argv[1] if len(sys.argv) > 1 else '/'
+    # A cProfile dump covers the whole build in this process
+    cprofile = None
+    if args.profile and args.profile_output and not trace_output:
+        cprofile = cProfile.Profile()
+        cprofile.enable()
 
     # Change output directory from public to docs
     output_dir = "docs"
 
+    # Incremental builds keep the output directory and consult the manifest
+    manifest = BuildManifest.load(args.manifest) if args.incremental or args.dry_run else None
+    # A shard records what it built, for the merge to check
+    if manifest is None and args.shard is not None:
+        manifest = BuildManifest()
+    if args.shard is not None and args.check_links:
+        print("A shard can't check links on its own; use --check-links when merging", file=sys.stderr)
+        sys.exit(2)
+    index = ContentIndex.load(args.content_index) if args.incremental or args.dry_run else None
+    # Every page's links and images, collected while parsing. Incremental
+    # builds carry over the references of pages they didn't regenerate
+    references = ReferenceIndex.load(args.reference_index) if args.incremental else ReferenceIndex()
+    # Every page's front matter, for layouts, listings and the feed
+    metadata = MetadataIndex.load(args.metadata_index) if args.incremental or args.dry_run else MetadataIndex()
+
+    content_dir = "content"
+    template_path = "template.html"
+
+    # Name every static asset after its contents, so pages and templates can
+    # link to the fingerprinted copies
+    asset_map = None
+    css_references = []
+    if args.fingerprint and os.path.exists("static"):
+        asset_map = fingerprint_assets("static", args.minify, args.static_jobs, manifest)
+        # Stylesheets are copied as they are, so a url(...) of a renamed
+        # asset is left pointing at a file that isn't written
+        css_references = css_asset_references("static", asset_map)
+        for css_path, url in css_references:
+            print(f"Warning: {css_path}: url({url}) points at a fingerprinted asset, which only exists under its "
+                  f"fingerprinted name", file=sys.stderr)
+
+    # Every static image's dimensions (and resized variants), read once and
+    # cached by content hash
+    image_index = ImageIndex.load(args.image_index) if args.incremental or args.dry_run else ImageIndex()
+    images = None
+    if args.images and os.path.exists("static"):
+        if args.image_widths and Image is None:
+            print("Resized image variants need the Pillow package", file=sys.stderr)
+            sys.exit(2)
+        # A dry run only works out which variants the build would make
+        with profiler.stage("images"):
+            images = image_index.scan("static", args.image_widths, args.image_cache, args.image_jobs,
+                                      not args.dry_run)
+        resized = "would be resized" if args.dry_run else "resized"
+        print(f"Images: {len(images)} found, {image_index.measured} measured, {image_index.resized} {resized}")
+
+    # Compile the default template and every layout once for the whole build
+    registry = TemplateRegistry(template_path, basepath, content_dir, args.layouts, args.minify, asset_map, images)
+    set_template_registry(registry)
+
+    compress_formats = None
+    if args.precompress:
+        compress_formats = args.precompress_formats or available_formats()
+        for compression in compress_formats:
+            if compression not in available_formats():
+                print(f"Unavailable compression format: {compression}", file=sys.stderr)
+                sys.exit(2)
+
+    if args.dry_run:
+        dry_run(manifest, content_dir, output_dir, basepath, index, registry, metadata, compress_formats)
+        return
+
     # Step 1: Delete anything in the output directory
-    if os.path.exists(output_dir):
+    if not args.incremental and os.path.exists(output_dir):
         shutil.rmtree(output_dir)
 
     # Step 2: Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
 
+    # Each shard writes only the outputs it owns
+    select = (lambda path: owns(args.shard, path, output_dir)) if args.shard is not None else None
+
     # Step 3: Copy all static files from static to output directory
     if os.path.exists("static"):
-        copy_static("static", output_dir)
+        with profiler.stage("static"):
+            rename = (lambda path: asset_output_path(path, output_dir, asset_map)) if asset_map else None
+            copy_static("static", output_dir, manifest, args.static_compare, args.static_link, args.static_jobs,
+                        args.minify, rename, select)
+        if asset_map and owns(args.shard, os.path.join(output_dir, ASSET_MANIFEST_PATH), output_dir):
+            path = write_asset_manifest(asset_map, output_dir)
+            if manifest is not None:
+                manifest.record(path, {"inputs": {}, "generator": GENERATOR_VERSION})
+        if images:
+            write_variants(images, output_dir, manifest, select)
 
     # Step 4: Generate pages with the provided basepath
-    content_dir = "content"
-    template_path = "template.html"
+    pipeline = None
+    if args.use_async:
+        pipeline = (max(1, args.read_concurrency), max(1, args.write_concurrency), max(1, args.write_queue))
+
+    errors = generate_pages_recursive(content_dir, template_path, output_dir, basepath, manifest, jobs, profiler,
+                                      pipeline, index, references, metadata, args.shard)
+
+    # Step 5: Write post listings, tag pages and the feed from the front
+    # matter alone. They're recorded so they get pruned once no longer needed
+    with profiler.stage("listings"):
+        listings = generate_listings(metadata.entries, content_dir, template_path, output_dir, basepath,
+                                     args.site_url, args.feed_size, references, select)
+    if manifest is not None:
+        for path in listings:
+            manifest.record(path, {"inputs": {}, "generator": GENERATOR_VERSION})
+
+    # Compressed variants of every text output, skipping ones whose source
+    # hasn't changed since they were written
+    if compress_formats:
+        with profiler.stage("compress"):
+            precompress(output_dir, manifest, compress_formats, args.precompress_jobs)
+
+    # What a shard built, and what the whole site consists of, for the merge
+    if args.shard is not None:
+        write_shard_manifest(args.shard, output_dir, manifest.current,
+                             planned_outputs(metadata.entries, content_dir, output_dir, registry, compress_formats),
+                             references, basepath, args.static_jobs)
+
+    # Step 6: Remove outputs whose sources are gone and remember what we built
+    if args.incremental:
+        for path in manifest.prune(output_dir):
+            print(f"Removed: {path}")
+        manifest.save(args.manifest)
+        index.save(args.content_index)
+        references.save(args.reference_index)
+        metadata.save(args.metadata_index)
+        image_index.save(args.image_index)
+
+    if inline_cache is not None:
+        print(inline_cache.stats())
+        if args.inline_cache_file:
+            inline_cache.save(args.inline_cache_file)
+
+    if render_cache is not None:
+        print(render_cache.stats())
+        render_cache.evict()
+
+    # Print the timing summary and write any requested profile dumps
+    if cprofile is not None:
+        cprofile.disable()
+        cprofile.dump_stats(args.profile_output)
+    if args.profile:
+        print(profiler.report(args.profile_top))
+        if trace_output:
+            profiler.write_trace(args.profile_output)
+
+    # Check internal links against what is now in the output directory
+    broken = []
+    if args.check_links:
+        broken = check_references(references, output_dir, asset_map)
+        broken += [(css_path, "stylesheet url", url) for css_path, url in css_references]
+    for dest_file_path, kind, url in broken:
+        print(f"Broken {kind}: {dest_file_path}: {url}", file=sys.stderr)
 
-    generate_pages_recursive(content_dir, template_path, output_dir, basepath)
+    # Report pages that failed without stopping the rest of the build
+    if errors:
+        for dest_file_path, message in errors:
+            print(f"Failed: {dest_file_path}: {message}", file=sys.stderr)
+    if errors or broken:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,179 @@
+import os
+import json
+import hashlib
+
+from atomic import AtomicFile
+
+# Bump this whenever a change to the generator alters the HTML it produces,
+# so every page is rebuilt on the next incremental build
+GENERATOR_VERSION = "2"
+
+# Where the manifest lives by default (kept outside the output directory so
+# it never gets published)
+DEFAULT_MANIFEST_PATH = ".build_manifest.json"
+
+
+def load_versioned_json(path, fmt=None):
+    # The data of a file written by save_versioned_json, or None when there
+    # is nothing to start from: the file is missing or unreadable, or it was
+    # written by another generator version or in another format. Every
+    # persisted index treats None as "start from scratch"
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get("version") != GENERATOR_VERSION or data.get("format") != fmt:
+        return None
+    return data
+
+
+def save_versioned_json(path, fmt, payload, indent=1):
+    # Write payload's keys along with the generator version (and fmt, when
+    # the file has its own format number) through a temporary file, so an
+    # interrupted build never leaves a half-written file behind
+    data = dict(payload, version=GENERATOR_VERSION)
+    if fmt is not None:
+        data["format"] = fmt
+    with AtomicFile(path) as f:
+        json.dump(data, f, indent=indent, sort_keys=True)
+
+
+def hash_file(path):
+    # Hash the file in chunks so large sources don't have to fit in memory
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stat_fingerprint(stat):
+    # A cheap stand-in for a content hash, used where size and mtime are
+    # trusted to tell a file changed (static files by default)
+    return f"stat:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class BuildManifest:
+    def __init__(self, previous=None, hashes=None):
+        # Inputs recorded by the last build, keyed by output path
+        self.previous = previous or {}
+        # Inputs recorded by the current build, keyed by output path
+        self.current = {}
+        # File hashes computed during this build (the template is shared by
+        # every page, so we only want to hash it once)
+        self._hashes = {}
+        # {"mtime", "size", "hash"} of the files stat_hash looked at, from the
+        # last build and from this one
+        self.previous_hashes = hashes or {}
+        self.hashes = {}
+
+    @classmethod
+    def load(cls, path=DEFAULT_MANIFEST_PATH):
+        # No usable manifest means a full build
+        data = load_versioned_json(path)
+        if data is None:
+            return cls()
+        return cls(data.get("outputs", {}), data.get("hashes", {}))
+
+    def save(self, path=DEFAULT_MANIFEST_PATH):
+        save_versioned_json(path, None, {"outputs": self.current, "hashes": self.hashes})
+
+    def file_hash(self, path):
+        # None for a file that doesn't exist (e.g. an asset that was deleted)
+        if path not in self._hashes:
+            try:
+                self._hashes[path] = hash_file(path)
+            except FileNotFoundError:
+                self._hashes[path] = None
+        return self._hashes[path]
+
+    def stat_hash(self, path):
+        # file_hash for files that are only ever replaced along with their
+        # mtime, like the static copies in the output (the sync keeps the
+        # source's mtime). The hash is reused while the size and mtime match
+        # the ones it was computed for, and only computed again when they don't
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        record = self.previous_hashes.get(path)
+        if record is None or record["mtime"] != stat.st_mtime_ns or record["size"] != stat.st_size:
+            record = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "hash": self.file_hash(path)}
+        self.hashes[path] = record
+        return record["hash"]
+
+    def fingerprint(self, path, like=None):
+        # Fingerprint path the same way as the recorded fingerprint like
+        if like is not None and like.startswith("stat:"):
+            try:
+                return stat_fingerprint(os.stat(path))
+            except FileNotFoundError:
+                return None
+        return self.file_hash(path)
+
+    def page_inputs(self, source_path, template_path, basepath, assets=(), minify=False, images=False):
+        # Every file the page is built from, by path, with its content hash:
+        # the markdown source, the template and the images it embeds. The
+        # paths are what the dependency graph (see dependencies.py) is made of.
+        # The images are static copies, so only new or recopied ones are hashed
+        files = {path: self.file_hash(path) for path in (source_path, template_path)}
+        files.update((path, self.stat_hash(path)) for path in assets)
+        inputs = {
+            "inputs": files,
+            "basepath": basepath,
+            "generator": GENERATOR_VERSION,
+        }
+        if minify:
+            inputs["minify"] = True
+        if images:
+            inputs["images"] = True
+        return inputs
+
+    def previous_assets(self, output_path, source_path, template_path):
+        # The assets a page embedded when it was last built. While its source
+        # is unchanged it still embeds the same ones, so they can be checked
+        # before the page is parsed again. Assets the last build produced but
+        # this one doesn't (a fingerprinted copy replaced by one with a new
+        # name) are left out, so the page's inputs differ and it's rebuilt
+        inputs = self.previous.get(output_path, {}).get("inputs", {})
+        return sorted(
+            path for path in inputs
+            if path not in (source_path, template_path) and not (path in self.previous and path not in self.current)
+        )
+
+    def is_fresh(self, output_path, inputs):
+        # An output is fresh when it still exists and was built from exactly
+        # the same inputs last time
+        return self.previous.get(output_path) == inputs and os.path.exists(output_path)
+
+    def record(self, output_path, inputs):
+        self.current[output_path] = inputs
+
+    def mark_failed(self, output_path):
+        # Record an input set that can never match, so the page is retried on
+        # the next build but its previous output isn't pruned
+        self.current[output_path] = {"failed": True}
+
+    def stale_outputs(self):
+        # Outputs from the last build whose sources are gone
+        return sorted(path for path in self.previous if path not in self.current)
+
+    def prune(self, output_dir):
+        removed = []
+        for path in self.stale_outputs():
+            if os.path.exists(path):
+                os.remove(path)
+                removed.append(path)
+            _remove_empty_dirs(os.path.dirname(path), output_dir)
+        return removed
+
+
+def _remove_empty_dirs(path, stop_dir):
+    # Walk up from path removing directories that became empty, but never
+    # remove the output directory itself
+    stop_dir = os.path.abspath(stop_dir)
+    path = os.path.abspath(path)
+    while path.startswith(stop_dir + os.sep) and os.path.isdir(path) and not os.listdir(path):
+        os.rmdir(path)
+        path = os.path.dirname(path)
@@ -0,0 +1,104 @@
+import os
+import mmap
+import locale
+
+from textnode import classify_block_lines, strip_block_lines
+from frontmatter import front_matter_span, parse_header
+
+# Sources at least this big are memory-mapped instead of read into a str
+MMAP_THRESHOLD = 1024 * 1024
+
+
+class MappedMarkdown:
+    # A markdown file mapped into memory. The title and the block boundaries
+    # are found by searching the mapped bytes, and only one block at a time
+    # is decoded into a str
+    def __init__(self, path):
+        self.path = path
+        self.encoding = locale.getpreferredencoding(False)
+        self._file = open(path, "rb")
+        try:
+            self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # Empty files (and some special files) can't be mapped
+            self._file.close()
+            raise
+
+        # The markdown body starts after the front matter, if there is any
+        self.metadata = {}
+        self.start = 0
+        span = front_matter_span(self.data)
+        if span is not None:
+            header_start, header_end, self.start = span
+            try:
+                self.metadata = parse_header(self.data[header_start:header_end].decode(self.encoding).split("\n"))
+            except ValueError:
+                self.close()
+                raise
+
+    @classmethod
+    def open(cls, path):
+        # Returns None when the file is better read the normal way: it can't
+        # be mapped, or it has \r line endings that text mode would translate
+        try:
+            source = cls(path)
+        except (ValueError, OSError):
+            # Includes invalid front matter; reading it normally reports that
+            return None
+        if source.data.find(b"\r") != -1:
+            source.close()
+            return None
+        return source
+
+    def close(self):
+        self.data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def body(self):
+        # The bytes the page is rendered from, as a view of the mapping so
+        # leaving out the front matter doesn't copy the file. The mapping
+        # can't be closed while the view exists, so use it in a with block
+        return memoryview(self.data)[self.start:]
+
+    def title(self):
+        # Jump from one "# " line start to the next without splitting the
+        # document into lines; stop at the first h1
+        data = self.data
+        if data[self.start:self.start + 2] == b"# ":
+            start = self.start
+        else:
+            start = data.find(b"\n# ", self.start)
+            if start == -1:
+                raise Exception("No h1 header found in markdown")
+            start += 1
+        end = data.find(b"\n", start)
+        if end == -1:
+            end = len(data)
+        return data[start:end].decode(self.encoding).lstrip('# ').strip()
+
+    def iter_blocks(self):
+        # Yield (block_type, block_text) like textnode.iter_blocks, finding
+        # the blank-line boundaries in the mapped bytes and decoding one block
+        # at a time
+        data = self.data
+        position = self.start
+        length = len(data)
+        while position < length:
+            end = data.find(b"\n\n", position)
+            if end == -1:
+                end = length
+            if end > position:
+                lines = strip_block_lines(data[position:end].decode(self.encoding).split("\n"))
+                if lines:
+                    yield classify_block_lines(lines), "\n".join(lines)
+            position = end + 2
+
+
+def should_map(path):
+    return os.path.getsize(path) >= MMAP_THRESHOLD
@@ -1,7 +1,14 @@
-import os
+import time
 
-from textnode import TextNode, markdown_to_blocks, block_to_block_type, text_to_textnodes
+from textnode import TextNode, markdown_to_blocks, block_to_block_type, text_to_textnodes, iter_blocks, iter_lines
 from htmlnode import HTMLNode, LeafNode, ParentNode
+from template import load_template, rewrite_paths
+from inline import tokenize_inline
+from profiler import NULL_PROFILER, TimedWriter
+from mapped_source import MappedMarkdown, should_map
+from references import record_reference, record_references, collect_references
+from frontmatter import split_front_matter, read_front_matter
+from atomic import AtomicFile
 
 
 def split_markdown_into_blocks(markdown):
@@ -12,7 +19,95 @@ def determine_block_type(block):
     return block_to_block_type(block)
 
 
+# Optional cache of rendered inline fragments, keyed by their markdown source
+_inline_cache = None
+
+
+def set_inline_cache(cache):
+    global _inline_cache
+    _inline_cache = cache
+
+
+def get_inline_cache():
+    return _inline_cache
+
+
+# Optional on-disk cache of rendered page bodies, keyed by markdown hash
+_render_cache = None
+
+
+def set_render_cache(cache):
+    global _render_cache
+    _render_cache = cache
+
+
+def get_render_cache():
+    return _render_cache
+
+
+# Optional registry of layouts; without one every page uses the template it
+# is given
+_template_registry = None
+
+
+def set_template_registry(registry):
+    global _template_registry
+    _template_registry = registry
+
+
+def get_template_registry():
+    return _template_registry
+
+
+# Front matter and titles the build's metadata scan already read, keyed by
+# source path (MetadataIndex.current), so pages don't read them again
+_page_metadata = None
+
+
+def set_page_metadata(records):
+    global _page_metadata
+    _page_metadata = records
+
+
+def get_page_metadata():
+    return _page_metadata
+
+
+def _scanned_front_matter(from_path):
+    # (metadata, title) from the metadata scan, or None when the page wasn't
+    # scanned or has no title (reading it again reports the missing h1)
+    record = _page_metadata.get(from_path) if _page_metadata is not None else None
+    if record is None or record["title"] is None:
+        return None
+    return record["metadata"], record["title"]
+
+
+def select_template(source_path, template_path, basepath='/', metadata=None):
+    # The page's layout from the registry, or the compiled template_path
+    if _template_registry is not None:
+        return _template_registry.select(source_path, metadata)
+    return load_template(template_path, basepath)
+
+
 def text_to_children(text_or_nodes):
+    # Repeated fragments (nav items, footers, link lists) are rendered once
+    # and then reused as a single pre-rendered leaf. The fragment's links and
+    # images are cached with it, so a hit still reports them
+    if isinstance(text_or_nodes, str) and _inline_cache is not None:
+        cached = _inline_cache.get(text_or_nodes)
+        if cached is None:
+            with collect_references() as references:
+                children = _text_to_children(text_or_nodes)
+            _inline_cache.put(text_or_nodes, ("".join(child.to_html() for child in children), references))
+            return children
+        html, references = cached
+        record_references(references)
+        return [LeafNode(None, html)]
+
+    return _text_to_children(text_or_nodes)
+
+
+def _text_to_children(text_or_nodes):
     children = []
 
     # If it's a string, convert it to TextNodes using inline_markdown_to_textnodes
@@ -44,126 +139,31 @@ def text_to_children(text_or_nodes):
     return children
 
 def inline_markdown_to_textnodes(text):
+    # Tokenize the whole string in one linear scan (see inline.py), noting
+    # every link and image for the site's reference index on the way
     nodes = []
-    i = 0
-
-    while i < len(text):
-
-        # Handle inline code with backticks
-        if text[i] == '`' and i + 1 < len(text):
-            end = text.find('`', i + 1)
-            if end != -1:
-                # If there's text before the code, add it as regular text
-                if i > 0:
-                    nodes.append(TextNode(text[:i], "text"))
-
-                # Add the code text
-                nodes.append(TextNode(text[i + 1:end], "code"))
-
-                # Continue processing the rest of the text
-                text = text[end + 1:]
-                i = 0
-                continue
-
-        # Handle links [text](url)
-        if text[i] == '[':
-            closing_bracket = text.find(']', i)
-            if closing_bracket != -1 and closing_bracket + 1 < len(text) and text[closing_bracket + 1] == '(':
-                opening_paren = closing_bracket + 1
-                closing_paren = text.find(')', opening_paren)
-                if closing_paren != -1:
-                    # If there's text before the link, add it as regular text
-                    if i > 0:
-                        nodes.append(TextNode(text[:i], "text"))
-
-                    # Add the link
-                    link_text = text[i + 1:closing_bracket]
-                    url = text[opening_paren + 1:closing_paren]
-                    nodes.append(TextNode(link_text, "link", url))
-
-                    # Continue processing the rest of the text
-                    text = text[closing_paren + 1:]
-                    i = 0
-                    continue
-
-        if text[i:i + 2] == '![' and i + 2 < len(text):
-            closing_bracket = text.find(']', i)
-            if closing_bracket != -1 and closing_bracket + 1 < len(text) and text[closing_bracket + 1] == '(':
-                opening_paren = closing_bracket + 1
-                closing_paren = text.find(')', opening_paren)
-                if closing_paren != -1:
-                    # If there's text before the image, add it as regular text
-                    if i > 0:
-                        nodes.append(TextNode(text[:i], "text"))
-
-                    # Add the image
-                    alt_text = text[i + 2:closing_bracket]
-                    url = text[opening_paren + 1:closing_paren]
-                    nodes.append(TextNode(alt_text, "image", url))
-
-                    # Continue processing the rest of the text
-                    text = text[closing_paren + 1:]
-                    i = 0
-                    continue
-
-        # Handle bold with double asterisks
-        if text[i:i+2] == '**' and i + 2 < len(text):
-            end = text.find('**', i + 2)
-            if end != -1:
-                # If there's text before the bold, add it as regular text
-                if i > 0:
-                    nodes.append(TextNode(text[:i], "text"))
-
-                # Add the bold text
-                nodes.append(TextNode(text[i + 2:end], "bold"))
-
-                # Continue processing the rest of the text
-                text = text[end + 2:]
-                i = 0
-                continue
-
-        # Handle italic with underscore
-        if text[i] == '_' and i + 1 < len(text):
-            end = text.find('_', i + 1)
-            if end != -1:
-                # If there's text before the italic, add it as regular text
-                if i > 0:
-                    nodes.append(TextNode(text[:i], "text"))
-
-                # Add the italic text
-                nodes.append(TextNode(text[i + 1:end], "italic"))
-
-                # Continue processing the rest of the text
-                text = text[end + 1:]
-                i = 0
-                continue
-
-        # Handle other inline elements similarly...
-        i += 1
-
-    # Add any remaining text
-    if text:
-        nodes.append(TextNode(text, "text"))
-
+    for kind, token_text, url in tokenize_inline(text):
+        if url is not None:
+            record_reference(kind, url)
+        nodes.append(TextNode(token_text, kind, url))
     return nodes
 
 def paragraph_to_html_node(paragraph):
-    text_nodes = inline_markdown_to_textnodes(paragraph)
-    children = text_to_children(text_nodes)
+    children = text_to_children(paragraph)
     return ParentNode("p", children)
 
 def markdown_to_html_node(markdown):
-    # Create a parent div node
-    parent = ParentNode("div", [])
+    # markdown is either a string or an iterable of lines (e.g. an open file)
+    lines = iter_lines(markdown) if isinstance(markdown, str) else markdown
+    return blocks_to_html_node(iter_blocks(lines))
 
-    # Split markdown into blocks
-    blocks = split_markdown_into_blocks(markdown)
 
-    # Process each block
-    for block in blocks:
-        # Determine block type
-        block_type = determine_block_type(block)
+def blocks_to_html_node(blocks):
+    # Create a parent div node
+    parent = ParentNode("div", [])
 
+    # Process each (block_type, block) as the scanner reads and classifies it
+    for block_type, block in blocks:
         if block_type == "paragraph":
             # Create paragraph node
             paragraph_node = paragraph_to_html_node(block)
@@ -190,8 +190,8 @@ def markdown_to_html_node(markdown):
             # Code blocks don't process markdown
             # Remove the ``` markers and preserve the content
             code_text = block.strip('`').strip()
-            # Create a LeafNode instead of using a TextNode directly
-            leaf_node = LeafNode("text", code_text)
+            # A tagless leaf, so the code goes out exactly as written
+            leaf_node = LeafNode(None, code_text)
             code_node = ParentNode("code", [leaf_node])
             pre_node = ParentNode("pre", [code_node])
             parent.children.append(pre_node)
@@ -242,8 +242,8 @@ def markdown_to_html_node(markdown):
 
 
 def extract_title(markdown):
-    # Split the markdown into lines
-    lines = markdown.split('\n')
+    # Read the markdown line by line (string or file), stopping at the title
+    lines = iter_lines(markdown) if isinstance(markdown, str) else markdown
 
     # Loop through each line
     for line in lines:
@@ -256,65 +256,182 @@ def extract_title(markdown):
     raise Exception("No h1 header found in markdown")
 
 
-def generate_page(from_path, template_path, dest_path, basepath='/'):
+def open_output(dest_path):
+    # The page is streamed into a temporary file that only replaces
+    # dest_path once it's complete, so a page that fails halfway leaves its
+    # previous output as it was. Builds create the output directories up
+    # front (see discovery.py), so the directory is only made when creating
+    # the file finds it missing
+    return AtomicFile(dest_path, makedirs=True)
+
+
+def write_page(template, dest_path, title, content, basepath='/', profiler=NULL_PROFILER):
+    # Stream the page into the destination: the template's literal segments
+    # and the content's HTML chunks go straight to the file, so the complete
+    # document is never held in memory as one string. The page's own links
+    # are pointed at the basepath for GitHub Pages chunk by chunk (the
+    # template's links were rewritten when it compiled). content is either an
+    # HTML node or already rendered HTML
+    assets = template.assets
+    images = template.images
+    if isinstance(content, str):
+        content_chunks = rewrite_paths(content, basepath, assets, images)
+    else:
+        content_chunks = (rewrite_paths(chunk, basepath, assets, images) for chunk in content.iter_html())
+
+    if profiler is NULL_PROFILER:
+        with open_output(dest_path) as f:
+            template.write(f, Title=rewrite_paths(title, basepath, assets, images), Content=content_chunks)
+        return
+
+    # When profiling, serialization and writing are interleaved, so time the
+    # whole stream and subtract the time spent inside write() calls
+    start = time.perf_counter_ns()
+    cpu_start = time.process_time_ns()
+    with profiler.stage("write", dest_path):
+        f = open_output(dest_path)
+    with f:
+        writer = TimedWriter(f)
+        stream_start = time.perf_counter_ns()
+        stream_cpu_start = time.process_time_ns()
+        template.write(writer, Title=rewrite_paths(title, basepath, assets, images), Content=content_chunks)
+        stream_wall = time.perf_counter_ns() - stream_start
+        stream_cpu = time.process_time_ns() - stream_cpu_start
+        close_start = time.perf_counter_ns()
+    profiler.add("render", dest_path, stream_start, stream_wall - writer.wall, stream_cpu - writer.cpu)
+    profiler.add("write", dest_path, close_start, writer.wall + time.perf_counter_ns() - close_start, writer.cpu)
+
+
+def generate_page(from_path, template_path, dest_path, basepath='/', profiler=NULL_PROFILER):
+    # Returns the (kind, url) of every link and image on the page
+    with collect_references() as references:
+        _generate_page(from_path, template_path, dest_path, basepath, profiler)
+    return references
+
+
+def _page_template(from_path, template_path, dest_path, basepath, metadata, profiler):
+    # Pick the page's layout, which can depend on its front matter
+    if _template_registry is not None:
+        template_path = _template_registry.layout_path(from_path, metadata)
     print(f"Generating page from {from_path} to {dest_path} using {template_path}")
 
-    # Read markdown content
-    with open(from_path, "r") as f:
-        markdown_content = f.read()
-
-    # Read template
-    with open(template_path, "r") as f:
-        template_content = f.read()
-
-    # Convert markdown to HTML
-    html_node = markdown_to_html_node(markdown_content)
-    html_content = html_node.to_html()
-
-    # Extract title
-    title = extract_title(markdown_content)
-
-    # Replace placeholders
-    final_html = template_content.replace("{{ Title }}", title)
-    final_html = final_html.replace("{{ Content }}", html_content)
-
-    # Replace paths for GitHub Pages
-    final_html = final_html.replace('href="/', f'href="{basepath}')
-    final_html = final_html.replace('src="/', f'src="{basepath}')
-
-    # Create destination directory if it doesn't exist
-    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-
-    # Write to destination
-    with open(dest_path, "w") as f:
-        f.write(final_html)
-
-
-def generate_pages_recursive(dir_path_content, template_path, dest_dir_path, basepath='/'):
-    # Step 1: Get all entries in the current directory
-    entries = os.listdir(dir_path_content)
-
-    # Step 2: Process each entry
-    for entry in entries:
-        # Create full paths
-        content_path = os.path.join(dir_path_content, entry)
-
-        # Step 3: Check if it's a file or directory
-        if os.path.isfile(content_path):
-            # If it's a markdown file
-            if content_path.endswith('.md'):
-                # Create corresponding path in dest directory
-                # We need to preserve the relative path structure
-                rel_path = os.path.relpath(content_path, dir_path_content)
-                # Change extension from .md to .html
-                dest_path = os.path.join(dest_dir_path, rel_path.replace('.md', '.html'))
-
-                # Generate the page - pass the basepath!
-                generate_page(content_path, template_path, dest_path, basepath)
+    # Load the compiled template (read and parsed once, then reused)
+    with profiler.stage("template", dest_path):
+        return select_template(from_path, template_path, basepath, metadata)
+
+
+def page_title(metadata, markdown):
+    # A title in the front matter wins over the page's first h1
+    return metadata.get("title") or extract_title(markdown)
+
+
+def _generate_page(from_path, template_path, dest_path, basepath, profiler):
+    template, title, content = prepare_page(from_path, template_path, dest_path, basepath, profiler)
+    write_page(template, dest_path, title, content, basepath, profiler)
+
+
+def prepare_page(from_path, template_path, dest_path, basepath='/', profiler=NULL_PROFILER, markdown=None):
+    # Everything write_page needs for a page: (template, title, content).
+    # markdown is the source's text when the caller has already read it (see
+    # async_build.py); otherwise the source is read here
+    if markdown is None:
+        # Very large sources are memory-mapped, so only the blocks being
+        # rendered are ever decoded
+        source = MappedMarkdown.open(from_path) if should_map(from_path) else None
+        if source is not None:
+            with source:
+                template = _page_template(from_path, template_path, dest_path, basepath, source.metadata, profiler)
+                with profiler.stage("parse", dest_path):
+                    title = source.metadata.get("title") or source.title()
+                    if _render_cache is not None:
+                        with source.body() as body:
+                            cache_key = _render_cache.key(body)
+                        content = _render_cache.get(cache_key)
+                        if content is None:
+                            with collect_references() as references:
+                                content = blocks_to_html_node(source.iter_blocks()).to_html()
+                            _render_cache.put(cache_key, content, references)
+                    else:
+                        content = blocks_to_html_node(source.iter_blocks())
+            return template, title, content
+
+    if markdown is None and _render_cache is None:
+        scanned = _scanned_front_matter(from_path)
+        if scanned is not None:
+            metadata, title = scanned
         else:
-            # It's a directory, so recursively process it
-            # Create corresponding destination directory
-            new_dest_dir = os.path.join(dest_dir_path, entry)
-
-            # Recursive call - pass the basepath!
-            generate_pages_recursive(content_path, template_path, new_dest_dir, basepath)
\ No newline at end of file
+            with profiler.stage("parse", dest_path):
+                # Read the front matter and find the title, reading only as
+                # far as the first h1
+                with open(from_path, "r") as f:
+                    metadata, lines = read_front_matter(f)
+                    title = page_title(metadata, lines)
+
+        template = _page_template(from_path, template_path, dest_path, basepath, metadata, profiler)
+
+        with profiler.stage("parse", dest_path):
+            # Stream the file's body through the block scanner, so the whole
+            # source is never held in memory next to its blocks
+            with open(from_path, "r") as f:
+                _, lines = read_front_matter(f)
+                content = markdown_to_html_node(lines)
+        return template, title, content
+
+    # The render cache is keyed by the full body, so read it all
+    if markdown is None:
+        with profiler.stage("read", dest_path):
+            with open(from_path, "r") as f:
+                markdown = f.read()
+    metadata, markdown_content = split_front_matter(markdown)
+
+    template = _page_template(from_path, template_path, dest_path, basepath, metadata, profiler)
+    title, content = render_content(markdown_content, dest_path, profiler, metadata)
+    return template, title, content
+
+
+def render_content(markdown_content, dest_path=None, profiler=NULL_PROFILER, metadata=None):
+    # Turn a markdown body (without its front matter) into (title, content),
+    # going through the render cache when one is set; content is an HTML
+    # node, or rendered HTML from the cache
+    with profiler.stage("parse", dest_path):
+        # Extract title
+        title = page_title(metadata or {}, markdown_content)
+
+        if _render_cache is None:
+            return title, markdown_to_html_node(markdown_content)
+
+        # Reuse the rendered body when this exact markdown has been rendered
+        # before, otherwise parse it and store the result
+        cache_key = _render_cache.key(markdown_content)
+        content = _render_cache.get(cache_key)
+        if content is None:
+            with collect_references() as references:
+                html_node = markdown_to_html_node(markdown_content)
+
+    if content is None:
+        # Cached pages are stored rendered, so serialize the tree up front
+        with profiler.stage("render", dest_path):
+            content = html_node.to_html()
+            _render_cache.put(cache_key, content, references)
+
+    return title, content
+
+
+def render_page(markdown_content, source_path, template_path, basepath='/'):
+    # Render a whole page to a string; used where the page has to be handed
+    # to another process or task instead of being streamed into a file.
+    # Returns (html, references) like generate_page
+    metadata, body = split_front_matter(markdown_content)
+    with collect_references() as references:
+        title, content = render_content(body, metadata=metadata)
+    return render_html(title, content, source_path, template_path, basepath, metadata), references
+
+
+def render_html(title, content, source_path, template_path, basepath='/', metadata=None):
+    # A whole page as one string, from its title and content (an HTML node
+    # or rendered HTML), in the layout the page at source_path would get
+    template = select_template(source_path, template_path, basepath, metadata)
+    if not isinstance(content, str):
+        content = content.to_html()
+    return template.render(Title=rewrite_paths(title, basepath, template.assets, template.images),
+                           Content=rewrite_paths(content, basepath, template.assets, template.images))
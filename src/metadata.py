@@ -0,0 +1,123 @@
+import os
+from collections import namedtuple
+
+from manifest import load_versioned_json, save_versioned_json
+from frontmatter import read_front_matter
+from markdown import page_title
+
+# Where incremental builds keep the metadata index by default
+DEFAULT_METADATA_INDEX_PATH = ".metadata_index.json"
+
+# What listings need to know about a page. url is the page's root-relative
+# link ("/blog/powers"), metadata the page's whole front matter
+PageMeta = namedtuple("PageMeta", ["source", "dest", "url", "title", "date", "tags", "slug", "metadata"])
+
+
+def read_page_metadata(path):
+    # The metadata fast path: read the front matter and, when it has no
+    # title, read on only as far as the first h1. The body is never parsed
+    with open(path, "r") as f:
+        metadata, lines = read_front_matter(f)
+        try:
+            title = page_title(metadata, lines)
+        except Exception:
+            # generate_page reports the missing title for the page itself
+            title = None
+    return metadata, title
+
+
+def page_url(dest, output_dir):
+    # docs/blog/powers/index.html -> /blog/powers, docs/index.html -> /
+    rel_path = os.path.relpath(dest, output_dir).replace(os.sep, "/")
+    if rel_path == "index.html":
+        return "/"
+    if rel_path.endswith("/index.html"):
+        rel_path = rel_path[:-len("/index.html")]
+    return "/" + rel_path
+
+
+def page_slug(source):
+    # content/blog/powers/index.md -> powers, content/contact.md -> contact
+    directory, name = os.path.split(source)
+    stem = os.path.splitext(name)[0]
+    return os.path.basename(directory) if stem == "index" else stem
+
+
+class MetadataIndex:
+    # Title, date, tags and slug of every page, from its front matter only.
+    # Entries are kept between builds with the source's mtime and size, so
+    # pages that haven't changed aren't even opened
+    def __init__(self, previous=None):
+        # Source path -> {"mtime", "size", "metadata", "title"}
+        self.previous = previous or {}
+        self.current = {}
+        # PageMeta for every page found by the last scan, sorted by source
+        self.entries = []
+        # How many sources the last scan had to read
+        self.read = 0
+
+    @classmethod
+    def load(cls, path=DEFAULT_METADATA_INDEX_PATH):
+        # No usable index means reading every page's front matter again
+        data = load_versioned_json(path)
+        if data is None:
+            return cls()
+        return cls(data.get("pages", {}))
+
+    def save(self, path=DEFAULT_METADATA_INDEX_PATH):
+        save_versioned_json(path, None, {"pages": self.current})
+
+    def scan(self, pages, output_dir):
+        # pages are discovery.Page tuples; returns a PageMeta for each
+        self.entries = []
+        self.read = 0
+        for page in pages:
+            self.entries.append(self._entry(page, self.previous.get(page.source), output_dir))
+        return self.entries
+
+    def refresh(self, pages, removed, output_dir):
+        # Like scan, for just the pages that were added or changed since it
+        # (watch.py knows which from the file watcher), which are read again
+        # even if their mtime and size look the same. Entries of removed
+        # sources are dropped and every other one is kept as it is
+        self.read = 0
+        entries = {entry.source: entry for entry in self.entries}
+        for source in removed:
+            entries.pop(source, None)
+            self.current.pop(source, None)
+        for page in pages:
+            entries[page.source] = self._entry(page, None, output_dir)
+        self.entries = [entries[source] for source in sorted(entries)]
+        return self.entries
+
+    def _entry(self, page, record, output_dir):
+        # Reuse the page's record while its mtime and size match
+        if record is None or record["mtime"] != page.mtime or record["size"] != page.size:
+            try:
+                metadata, title = read_page_metadata(page.source)
+            except ValueError:
+                # Invalid front matter; the page itself reports it
+                metadata, title = {}, None
+            record = {"mtime": page.mtime, "size": page.size, "metadata": metadata, "title": title}
+            self.read += 1
+        self.current[page.source] = record
+
+        metadata = record["metadata"]
+        tags = metadata.get("tags") or []
+        if isinstance(tags, str):
+            tags = [tags]
+        slug = metadata.get("slug") or page_slug(page.source)
+        return PageMeta(
+            page.source,
+            page.dest,
+            page_url(page.dest, output_dir),
+            record["title"] or slug,
+            metadata.get("date") or None,
+            tags,
+            slug,
+            metadata,
+        )
+
+    def metadata_for(self, source):
+        record = self.current.get(source)
+        return record["metadata"] if record is not None else {}
@@ -0,0 +1,101 @@
+import re
+
+# Elements whose contents are copied byte for byte: whitespace is
+# significant in <pre> and <textarea>, and scripts are left to their own
+# tooling. <style> contents are minified as CSS
+_RAW_ELEMENTS = ("pre", "textarea", "script", "style")
+
+# One pass over the document: each match is a raw element, a comment or a
+# run of whitespace, and everything between matches is copied unchanged
+_HTML_TOKEN = re.compile(
+    r"(<(pre|textarea|script|style)\b[^>]*>)(.*?)(</\2\s*>)"
+    r"|<!--(?!\[if).*?-->"
+    r"|\s+",
+    re.S | re.I,
+)
+
+# Tags that never render the whitespace around them, so it can be dropped
+# instead of collapsed to one space
+_BLOCK_TAG = re.compile(
+    r"</?(?:html|head|body|meta|link|title|base|script|style|noscript|article|aside|div|header|footer|main|nav|"
+    r"section|p|ul|ol|li|dl|dt|dd|h[1-6]|blockquote|figure|figcaption|hr|br|pre|table|thead|tbody|tfoot|tr|th|td|"
+    r"form|fieldset|!doctype)\b",
+    re.I,
+)
+
+
+def _next_to_block_tag(html, start, end):
+    # Does the whitespace at html[start:end] touch a block-level tag?
+    if _BLOCK_TAG.match(html, end):
+        return True
+    if start > 0 and html[start - 1] == ">":
+        tag_start = html.rfind("<", 0, start)
+        return tag_start != -1 and _BLOCK_TAG.match(html, tag_start) is not None
+    return False
+
+
+def minify_html(html):
+    # Strip comments, collapse whitespace to a single space and drop it next
+    # to block-level tags, leaving <pre>, <textarea> and <script> contents
+    # exactly as they were
+    def replace(match):
+        if match.group(1) is not None:
+            if match.group(2).lower() == "style":
+                return match.group(1) + minify_css(match.group(3)) + match.group(4)
+            return match.group(0)
+        text = match.group(0)
+        if text.startswith("<!--"):
+            return ""
+        if _next_to_block_tag(html, match.start(), match.end()):
+            return ""
+        return " "
+
+    return _HTML_TOKEN.sub(replace, html).strip()
+
+
+# Strings are copied as they are; comments are dropped; whitespace is
+# dropped next to punctuation and collapsed to one space elsewhere (it
+# separates selectors and values like "margin: 0 auto")
+_CSS_TOKEN = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|/\*.*?\*/|\s+|;(?=\s*})""", re.S)
+_CSS_PUNCTUATION = "{};:,>~"
+
+
+def minify_css(css):
+    def replace(match):
+        if match.group(1) is not None:
+            return match.group(1)
+        text = match.group(0)
+        if text == ";":
+            # The last declaration in a block doesn't need its semicolon
+            return ""
+        if text.startswith("/*"):
+            return ""
+        before = css[match.start() - 1] if match.start() > 0 else ""
+        after = css[match.end()] if match.end() < len(css) else ""
+        if not before or not after or before in _CSS_PUNCTUATION or after in _CSS_PUNCTUATION:
+            # Keep the space in "a :hover"-style descendant selectors
+            if after == ":" and before not in _CSS_PUNCTUATION and _in_selector(css, match.start()):
+                return " "
+            return ""
+        return " "
+
+    return _CSS_TOKEN.sub(replace, css).strip()
+
+
+def _in_selector(css, position):
+    # True when position is outside any declaration block, i.e. in a
+    # selector, where "a :hover" and "a:hover" mean different things
+    opening = css.rfind("{", 0, position)
+    closing = css.rfind("}", 0, position)
+    return opening <= closing
+
+
+# Static files the sync can minify, by extension
+MINIFIERS = {".html": minify_html, ".htm": minify_html, ".css": minify_css}
+
+
+def minifier_for(path):
+    for extension, minifier in MINIFIERS.items():
+        if path.endswith(extension):
+            return minifier
+    return None
@@ -0,0 +1,137 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from markdown import generate_page
+from profiler import BuildProfiler, NULL_PROFILER
+from markdown import set_inline_cache, get_inline_cache, set_render_cache, get_render_cache
+from markdown import set_template_registry, get_template_registry, set_page_metadata, get_page_metadata
+from inline_cache import InlineCache
+from render_cache import RenderCache
+
+# How many pages each worker task handles; batching keeps the per-task
+# pickling and scheduling overhead small compared to the parsing work
+DEFAULT_BATCH_SIZE = 64
+
+
+def init_worker(inline_cache_settings, render_cache_settings, template_registry=None, page_metadata=None):
+    # Use the parent's precompiled layouts and scanned front matter rather
+    # than reading them again
+    if template_registry is not None:
+        set_template_registry(template_registry)
+    if page_metadata is not None:
+        set_page_metadata(page_metadata)
+
+    # Point each worker at the same on-disk render cache as the parent
+    if render_cache_settings is not None:
+        set_render_cache(RenderCache(*render_cache_settings))
+
+    # Give each worker process its own inline cache, warmed with the entries
+    # the parent already has
+    if inline_cache_settings is not None:
+        maxsize, eviction, entries = inline_cache_settings
+        cache = InlineCache(maxsize, eviction, track_new=True)
+        cache.entries.update(entries)
+        set_inline_cache(cache)
+
+
+def worker_initargs():
+    # What init_worker needs to recreate this process's caches and layouts in
+    # a worker
+    cache = get_inline_cache()
+    cache_settings = None
+    if cache is not None:
+        cache_settings = (cache.maxsize, cache.eviction, list(cache.entries.items()))
+    render_cache = get_render_cache()
+    render_cache_settings = None
+    if render_cache is not None:
+        render_cache_settings = (render_cache.directory, render_cache.max_bytes)
+    return cache_settings, render_cache_settings, get_template_registry(), get_page_metadata()
+
+
+def _generate_batch(batch, template_path, basepath, profile=False):
+    # Runs inside a worker process: generate every page in the batch and
+    # report failures instead of raising, so one bad page can't sink the rest.
+    # Profiling records and new inline cache entries are sent back so the
+    # parent can merge them (see merge_batch_result)
+    profiler = BuildProfiler() if profile else NULL_PROFILER
+    cache = get_inline_cache()
+    hits, misses, evictions = (cache.hits, cache.misses, cache.evictions) if cache is not None else (0, 0, 0)
+    render_cache = get_render_cache()
+    render_hits, render_misses = (render_cache.hits, render_cache.misses) if render_cache is not None else (0, 0)
+
+    errors = []
+    references = {}
+    for source_path, dest_path in batch:
+        try:
+            references[dest_path] = generate_page(source_path, template_path, dest_path, basepath, profiler)
+        except Exception as e:
+            errors.append((dest_path, f"{type(e).__name__}: {e}"))
+
+    result = {"errors": errors, "references": references, "records": profiler.records if profile else []}
+    if cache is not None:
+        result["cache"] = (cache.take_new(), cache.hits - hits, cache.misses - misses, cache.evictions - evictions)
+    if render_cache is not None:
+        result["render_cache"] = (render_cache.hits - render_hits, render_cache.misses - render_misses)
+    return result
+
+
+def merge_batch_result(batch, result, references=None, profiler=NULL_PROFILER):
+    # Fold what a worker sent back for a batch into this process: the pages'
+    # references, profiling records and cache activity. Returns the batch's
+    # errors
+    if references is not None:
+        for dest_path, page_references in result["references"].items():
+            references.add(dest_path, page_references)
+    if result["records"]:
+        profiler.merge(result["records"])
+    if "cache" in result:
+        get_inline_cache().merge(*result["cache"])
+    if "render_cache" in result:
+        render_cache = get_render_cache()
+        render_cache.hits += result["render_cache"][0]
+        render_cache.misses += result["render_cache"][1]
+    failed = {dest_path for dest_path, _ in result["errors"]}
+    for _, dest_path in batch:
+        if dest_path not in failed:
+            print(f"Generated: {dest_path}")
+    return result["errors"]
+
+
+def batch_failed(batch, e):
+    # The worker itself died (e.g. killed or unpicklable result), so every
+    # page in its batch counts as failed
+    return [(dest_path, f"{type(e).__name__}: {e}") for _, dest_path in batch]
+
+
+def make_batches(pages, jobs, batch_size=DEFAULT_BATCH_SIZE):
+    # Use smaller batches for small sites so every worker gets something to do
+    size = max(1, min(batch_size, -(-len(pages) // jobs)))
+    return [pages[i:i + size] for i in range(0, len(pages), size)]
+
+
+def generate_pages_parallel(pages, template_path, basepath='/', jobs=None, batch_size=DEFAULT_BATCH_SIZE,
+                            profiler=NULL_PROFILER, references=None):
+    if not pages:
+        return []
+
+    jobs = jobs or os.cpu_count() or 1
+    batches = make_batches(pages, jobs, batch_size)
+
+    errors = []
+    with ProcessPoolExecutor(max_workers=min(jobs, len(batches)), initializer=init_worker,
+                             initargs=worker_initargs()) as executor:
+        futures = {
+            executor.submit(_generate_batch, batch, template_path, basepath, profiler is not NULL_PROFILER): batch
+            for batch in batches
+        }
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                errors.extend(batch_failed(batch, e))
+                continue
+            errors.extend(merge_batch_result(batch, result, references, profiler))
+
+    # Report failures in a stable order regardless of completion order
+    return sorted(errors)
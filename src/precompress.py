@@ -0,0 +1,113 @@
+import os
+import gzip
+from concurrent.futures import ThreadPoolExecutor
+
+from atomic import AtomicFile
+from manifest import hash_file, GENERATOR_VERSION
+
+# Brotli isn't in the standard library; use it when one of the usual
+# bindings is installed and emit only gzip otherwise
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+# Text formats worth compressing; images are already compressed
+COMPRESSIBLE_EXTENSIONS = (".html", ".css", ".js", ".mjs", ".json", ".xml", ".svg", ".txt", ".map")
+
+# Variant suffix for each format
+FORMAT_EXTENSIONS = {"gzip": ".gz", "br": ".br"}
+
+# zlib and brotli release the GIL while compressing, so threads keep every
+# core busy without pickling file contents to worker processes
+DEFAULT_COMPRESS_JOBS = os.cpu_count() or 1
+
+
+def available_formats():
+    return ["gzip", "br"] if brotli is not None else ["gzip"]
+
+
+def compress(data, compression):
+    if compression == "gzip":
+        # mtime=0 so the same input always gives byte-identical output
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if compression == "br":
+        if brotli is None:
+            raise ValueError("Brotli output needs the brotli package")
+        return brotli.compress(data, quality=11)
+    raise ValueError(f"Unknown compression format: {compression}")
+
+
+def compressible_files(output_dir):
+    # Every text output under output_dir, not counting existing variants
+    files = []
+    stack = [output_dir]
+    while stack:
+        for entry in os.scandir(stack.pop()):
+            if entry.is_dir():
+                stack.append(entry.path)
+            elif entry.name.endswith(COMPRESSIBLE_EXTENSIONS):
+                files.append(entry.path)
+    return sorted(files)
+
+
+def variant_inputs(path, content_hash, compression):
+    # What the manifest remembers about a compressed variant: the hash of the
+    # file it was compressed from
+    return {"inputs": {path: content_hash}, "compression": compression, "generator": GENERATOR_VERSION}
+
+
+def _write_variant(variant_path, data):
+    with AtomicFile(variant_path, "wb") as f:
+        f.write(data)
+
+
+def _precompress_file(path, formats, previous):
+    # Returns ({variant path: inputs}, variants written); runs on the pool.
+    # previous maps each variant to what the manifest recorded for it
+    content_hash = hash_file(path)
+    records = {}
+    stale = []
+    for compression in formats:
+        variant_path = path + FORMAT_EXTENSIONS[compression]
+        inputs = variant_inputs(path, content_hash, compression)
+        records[variant_path] = inputs
+        if previous.get(variant_path) != inputs or not os.path.exists(variant_path):
+            stale.append((variant_path, compression))
+
+    if stale:
+        with open(path, "rb") as f:
+            data = f.read()
+        for variant_path, compression in stale:
+            _write_variant(variant_path, compress(data, compression))
+    return records, len(stale)
+
+
+def precompress(output_dir, manifest=None, formats=None, jobs=DEFAULT_COMPRESS_JOBS):
+    # Write a compressed variant next to every text output, so the origin can
+    # serve index.html.gz / index.html.br as-is. With a manifest, variants
+    # whose source hash hasn't changed are left alone, and every variant is
+    # recorded so pruning removes it along with its source
+    formats = formats or available_formats()
+    files = compressible_files(output_dir)
+    previous = {}
+    if manifest is not None:
+        # Outputs about to be pruned don't get variants, so theirs are pruned
+        # with them
+        files = [path for path in files if path in manifest.current]
+        previous = manifest.previous
+
+    written = 0
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        results = executor.map(lambda path: _precompress_file(path, formats, previous), files)
+        for records, count in results:
+            written += count
+            if manifest is not None:
+                for variant_path, inputs in records.items():
+                    manifest.record(variant_path, inputs)
+
+    print(f"Precompressed outputs: {written} written, {len(files) * len(formats) - written} unchanged")
+    return written
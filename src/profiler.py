@@ -0,0 +1,112 @@
+import os
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class BuildProfiler:
+    def __init__(self):
+        # One record per timed stage:
+        # (stage, page, start_ns, wall_ns, cpu_ns, pid)
+        self.records = []
+
+    @contextmanager
+    def stage(self, name, page=None):
+        # Time a block of work as one stage, optionally for a specific page
+        start = time.perf_counter_ns()
+        cpu_start = time.process_time_ns()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter_ns() - start
+            cpu = time.process_time_ns() - cpu_start
+            self.records.append((name, page, start, wall, cpu, os.getpid()))
+
+    def add(self, name, page, start, wall, cpu):
+        # Record a stage that was timed by hand (e.g. interleaved work)
+        self.records.append((name, page, start, wall, cpu, os.getpid()))
+
+    def merge(self, records):
+        # Fold in records collected by a worker process
+        self.records.extend(records)
+
+    def stage_totals(self):
+        totals = {}
+        for name, _, _, wall, cpu, _ in self.records:
+            total = totals.setdefault(name, [0, 0])
+            total[0] += wall
+            total[1] += cpu
+        return totals
+
+    def page_totals(self):
+        totals = {}
+        for _, page, _, wall, _, _ in self.records:
+            if page is not None:
+                totals[page] = totals.get(page, 0) + wall
+        return totals
+
+    def report(self, top=10):
+        lines = ["", "Build profile", f"{'stage':<12} {'wall s':>10} {'cpu s':>10}"]
+        for name, (wall, cpu) in sorted(self.stage_totals().items(), key=lambda item: -item[1][0]):
+            lines.append(f"{name:<12} {wall / 1e9:>10.3f} {cpu / 1e9:>10.3f}")
+
+        slowest = sorted(self.page_totals().items(), key=lambda item: -item[1])[:top]
+        if slowest:
+            lines.append("")
+            lines.append(f"Slowest {len(slowest)} pages")
+            for page, wall in slowest:
+                lines.append(f"{wall / 1e9:>10.3f}s  {page}")
+        return "\n".join(lines)
+
+    def write_trace(self, path):
+        # Chrome trace-event format (load it in chrome://tracing or Perfetto).
+        # perf_counter is a system-wide monotonic clock on the platforms we
+        # build on, so timestamps from worker processes line up
+        if not self.records:
+            return
+        origin = min(record[2] for record in self.records)
+        events = []
+        for name, page, start, wall, cpu, pid in self.records:
+            event = {
+                "name": name,
+                "ph": "X",
+                "ts": (start - origin) / 1000,
+                "dur": wall / 1000,
+                "pid": pid,
+                "tid": pid,
+                "args": {"cpu_ms": cpu / 1e6},
+            }
+            if page is not None:
+                event["args"]["page"] = page
+            events.append(event)
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+class NullProfiler:
+    # Stand-in used when profiling is off, so callers never have to check
+    def stage(self, name, page=None):
+        return nullcontext()
+
+    def add(self, name, page, start, wall, cpu):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class TimedWriter:
+    # Wraps a file object and adds up the time spent inside write(), so the
+    # time spent producing streamed chunks can be told apart from the writes
+    def __init__(self, fp):
+        self.fp = fp
+        self.wall = 0
+        self.cpu = 0
+
+    def write(self, data):
+        start = time.perf_counter_ns()
+        cpu_start = time.process_time_ns()
+        result = self.fp.write(data)
+        self.wall += time.perf_counter_ns() - start
+        self.cpu += time.process_time_ns() - cpu_start
+        return result
@@ -0,0 +1,125 @@
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from urllib.parse import urlsplit, unquote
+
+from manifest import load_versioned_json, save_versioned_json
+
+# Where incremental builds keep the reference index by default
+DEFAULT_REFERENCE_INDEX_PATH = ".reference_index.json"
+
+# The list that links and images are being recorded into, if any. A context
+# variable rather than a plain global, so threads and asyncio tasks that
+# render pages at the same time each get their own list
+_sink = ContextVar("reference_sink", default=None)
+
+
+def record_reference(kind, url):
+    # Called by the inline parser for every link and image it finds
+    sink = _sink.get()
+    if sink is not None:
+        sink.append((kind, url))
+
+
+def record_references(references):
+    # Replay references that were stored with a cached fragment or page
+    sink = _sink.get()
+    if sink is not None:
+        sink.extend(references)
+
+
+@contextmanager
+def collect_references():
+    # Collect every reference recorded inside the block into a fresh list.
+    # Collections can nest: what the inner one saw is passed on to the outer
+    # one when it ends
+    references = []
+    token = _sink.set(references)
+    try:
+        yield references
+    finally:
+        _sink.reset(token)
+        record_references(references)
+
+
+class ReferenceIndex:
+    def __init__(self, outgoing=None):
+        # Output page -> list of (kind, url) it links to, in document order
+        self.outgoing = outgoing or {}
+
+    @classmethod
+    def load(cls, path=DEFAULT_REFERENCE_INDEX_PATH):
+        # No usable index means starting out empty
+        data = load_versioned_json(path)
+        if data is None:
+            return cls()
+        return cls({page: [tuple(ref) for ref in refs] for page, refs in data.get("pages", {}).items()})
+
+    def save(self, path=DEFAULT_REFERENCE_INDEX_PATH):
+        save_versioned_json(path, None, {"pages": self.outgoing})
+
+    def add(self, page, references):
+        self.outgoing[page] = list(references)
+
+    def retain(self, pages):
+        # Forget pages that are no longer part of the site. Pages an
+        # incremental build skipped keep the references from their last build
+        pages = set(pages)
+        for page in list(self.outgoing):
+            if page not in pages:
+                del self.outgoing[page]
+
+    def incoming(self):
+        # The reverse index: url -> sorted pages that reference it
+        referrers = {}
+        for page, references in self.outgoing.items():
+            for _, url in references:
+                referrers.setdefault(url, set()).add(page)
+        return {url: sorted(pages) for url, pages in referrers.items()}
+
+
+def resolve_reference(page, url, output_dir, assets=None):
+    # Map a link or image URL from a page to the output file it should hit,
+    # or None for anything outside the site (other hosts, mailto:, #anchors).
+    # Root-relative URLs of fingerprinted assets hit the fingerprinted copy
+    parts = urlsplit(url)
+    if parts.scheme or parts.netloc or not parts.path:
+        return None
+    path = unquote(parts.path)
+    if assets and parts.path in assets:
+        path = assets[parts.path]
+    if path.startswith("/"):
+        return os.path.normpath(os.path.join(output_dir, path.lstrip("/")))
+    return os.path.normpath(os.path.join(os.path.dirname(page), path))
+
+
+def embedded_assets(page, references, output_dir, assets=None):
+    # Output files of the images a page embeds, for the dependency graph.
+    # Missing images are left out; check_references reports those
+    embedded = []
+    for kind, url in references:
+        if kind != "image":
+            continue
+        target = resolve_reference(page, url, output_dir, assets)
+        if target is not None and os.path.isfile(target):
+            embedded.append(target)
+    return sorted(set(embedded))
+
+
+def check_references(index, output_dir, assets=None):
+    # Returns (page, kind, url) for every internal link or image whose target
+    # is missing from the output. A directory counts as a page when it has an
+    # index.html, like it would on GitHub Pages. Each target is only checked
+    # once however many pages point at it
+    exists = {}
+    broken = []
+    for page in sorted(index.outgoing):
+        for kind, url in index.outgoing[page]:
+            target = resolve_reference(page, url, output_dir, assets)
+            if target is None:
+                continue
+            if target not in exists:
+                exists[target] = os.path.isfile(target) or os.path.isfile(os.path.join(target, "index.html"))
+            if not exists[target]:
+                broken.append((page, kind, url))
+    return broken
@@ -0,0 +1,94 @@
+import os
+import json
+import zlib
+import hashlib
+
+from atomic import AtomicFile
+from manifest import GENERATOR_VERSION
+from references import record_references
+
+DEFAULT_RENDER_CACHE_DIR = ".render_cache"
+DEFAULT_RENDER_CACHE_BYTES = 512 * 1024 * 1024
+# Bump when the layout of an entry changes, so old entries are never misread
+RENDER_CACHE_FORMAT = "2"
+
+
+class RenderCache:
+    # Content-addressed store of rendered page bodies. Each entry is a JSON
+    # line listing the page's links and images followed by the HTML of
+    # markdown_to_html_node(...).to_html(), zlib-compressed and stored at
+    # <directory>/<first two hex digits>/<rest of the hash>
+    def __init__(self, directory=DEFAULT_RENDER_CACHE_DIR, max_bytes=DEFAULT_RENDER_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, markdown):
+        # The parser version is part of the key, so a generator upgrade never
+        # serves HTML rendered by the old parser. markdown can be a str or the
+        # raw bytes of the source (e.g. a memory-mapped file)
+        digest = hashlib.sha256(GENERATOR_VERSION.encode())
+        digest.update(b"\0" + RENDER_CACHE_FORMAT.encode() + b"\0")
+        digest.update(markdown.encode() if isinstance(markdown, str) else markdown)
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key[2:])
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                header, html = zlib.decompress(f.read()).decode().split("\n", 1)
+            references = [tuple(ref) for ref in json.loads(header)]
+        except (OSError, zlib.error, ValueError):
+            self.misses += 1
+            return None
+
+        # Bump the mtime so eviction drops the least recently used entries
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        # A hit skips the parser, so report the page's links and images here
+        record_references(references)
+        return html
+
+    def put(self, key, html, references=()):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # AtomicFile picks a unique temporary name, so worker processes sharing
+        # the directory never write over each other's half-written entries
+        with AtomicFile(path, "wb") as f:
+            f.write(zlib.compress((json.dumps(list(references)) + "\n" + html).encode(), 6))
+
+    def evict(self):
+        # Remove the least recently used entries until the store fits
+        if not os.path.isdir(self.directory):
+            return 0
+        entries = []
+        total = 0
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                total += stat.st_size
+
+        removed = 0
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups * 100 if lookups else 0.0
+        return f"Render cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate)"
@@ -0,0 +1,225 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from atomic import AtomicFile
+from manifest import hash_file, GENERATOR_VERSION
+from static_sync import copy_file, DEFAULT_SYNC_JOBS
+from precompress import FORMAT_EXTENSIONS
+from references import ReferenceIndex, check_references
+from assets import ASSET_MANIFEST_PATH
+
+# Each shard leaves this in its output directory, listing what it built
+SHARD_MANIFEST_NAME = ".shard_manifest.json"
+
+# Shard index (1-based, like CI matrix jobs) out of count
+Shard = namedtuple("Shard", ["index", "count"])
+
+
+def parse_shard(text):
+    # "2/4" -> Shard(2, 4); used as an argparse type
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {text!r}")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard index must be between 1 and {count}, got {index}")
+    return Shard(index, count)
+
+
+def shard_key(path, output_dir):
+    # What decides an output's shard: its path relative to the output
+    # directory, which for a page follows from its source path. A compressed
+    # variant goes wherever the file it's compressed from does, since only
+    # the shard that wrote a file compresses it
+    rel_path = os.path.relpath(path, output_dir).replace(os.sep, "/")
+    for extension in FORMAT_EXTENSIONS.values():
+        if rel_path.endswith(extension):
+            return rel_path[:-len(extension)]
+    return rel_path
+
+
+def shard_of(key, count):
+    # A stable hash, unlike hash(), which is salted per process
+    return int(hashlib.sha256(key.encode()).hexdigest()[:16], 16) % count + 1
+
+
+def owns(shard, path, output_dir):
+    return shard is None or shard_of(shard_key(path, output_dir), shard.count) == shard.index
+
+
+def write_shard_manifest(shard, output_dir, outputs, expected, references, basepath, jobs=DEFAULT_SYNC_JOBS):
+    # Record what this shard built (each output with its content hash), what
+    # the whole site consists of and the links of the shard's pages, so the
+    # merge can check the shards against each other
+    outputs = sorted(path for path in outputs if os.path.isfile(path))
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        hashes = list(executor.map(hash_file, outputs))
+    data = {
+        "version": GENERATOR_VERSION,
+        "shard": [shard.index, shard.count],
+        "basepath": basepath,
+        "outputs": {os.path.relpath(path, output_dir).replace(os.sep, "/"): digest
+                    for path, digest in zip(outputs, hashes)},
+        "expected": sorted(os.path.relpath(path, output_dir).replace(os.sep, "/") for path in expected),
+        "references": {os.path.relpath(page, output_dir).replace(os.sep, "/"): refs
+                       for page, refs in references.outgoing.items()},
+    }
+    path = os.path.join(output_dir, SHARD_MANIFEST_NAME)
+    with AtomicFile(path) as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    return path
+
+
+def load_shard_manifest(shard_dir):
+    with open(os.path.join(shard_dir, SHARD_MANIFEST_NAME), "r") as f:
+        return json.load(f)
+
+
+def _shard_files(shard_dir):
+    # Every file in a shard's output directory, relative to it
+    files = set()
+    stack = [shard_dir]
+    while stack:
+        for entry in os.scandir(stack.pop()):
+            if entry.is_dir():
+                stack.append(entry.path)
+            elif entry.name != SHARD_MANIFEST_NAME:
+                files.add(os.path.relpath(entry.path, shard_dir).replace(os.sep, "/"))
+    return files
+
+
+def _verify_file(shard_dir, rel_path, digest):
+    path = os.path.join(shard_dir, *rel_path.split("/"))
+    if not os.path.isfile(path):
+        return f"Missing file: {path}"
+    if hash_file(path) != digest:
+        return f"Changed since its shard built it: {path}"
+    return None
+
+
+def verify_shards(shard_dirs, jobs=DEFAULT_SYNC_JOBS):
+    # Returns (problems, {output: shard directory}). The shards must be one
+    # complete set built by the same generator for the same site, and between
+    # them build every output exactly once
+    problems = []
+    manifests = []
+    for shard_dir in shard_dirs:
+        try:
+            manifests.append((shard_dir, load_shard_manifest(shard_dir)))
+        except (OSError, ValueError) as e:
+            problems.append(f"Not a shard output: {shard_dir} ({e})")
+    if problems or not manifests:
+        return problems or ["No shards to merge"], {}
+
+    for field in ("version", "basepath"):
+        values = sorted({str(manifest.get(field)) for _, manifest in manifests})
+        if len(values) > 1:
+            problems.append(f"Shards were built with different {field}s: {', '.join(values)}")
+    counts = {manifest["shard"][1] for _, manifest in manifests}
+    if len(counts) > 1:
+        problems.append(f"Shards disagree on the shard count: {', '.join(map(str, sorted(counts)))}")
+    indexes = Counter(manifest["shard"][0] for _, manifest in manifests)
+    for index in sorted(indexes):
+        if indexes[index] > 1:
+            problems.append(f"Shard {index} given {indexes[index]} times")
+    for index in range(1, max(counts) + 1):
+        if index not in indexes:
+            problems.append(f"Shard {index}/{max(counts)} is missing")
+
+    expected = set(manifests[0][1]["expected"])
+    for shard_dir, manifest in manifests[1:]:
+        if set(manifest["expected"]) != expected:
+            problems.append(f"{shard_dir} planned a different set of outputs than {manifests[0][0]}; "
+                            "were the shards built from the same sources?")
+
+    owners = {}
+    for shard_dir, manifest in manifests:
+        for rel_path in manifest["outputs"]:
+            if rel_path in owners:
+                problems.append(f"Duplicated: {rel_path} (built by {owners[rel_path]} and {shard_dir})")
+            else:
+                owners[rel_path] = shard_dir
+    for rel_path in sorted(expected - set(owners)):
+        problems.append(f"Missing: {rel_path}")
+    for rel_path in sorted(set(owners) - expected):
+        problems.append(f"Unexpected: {rel_path} (built by {owners[rel_path]})")
+
+    # The files themselves must be exactly what the manifests describe
+    checks = []
+    for shard_dir, manifest in manifests:
+        for rel_path in sorted(_shard_files(shard_dir) - set(manifest["outputs"])):
+            problems.append(f"Stray file: {os.path.join(shard_dir, rel_path)}")
+        checks.extend((shard_dir, rel_path, digest) for rel_path, digest in manifest["outputs"].items())
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        problems.extend(problem for problem in executor.map(lambda check: _verify_file(*check), checks) if problem)
+    return problems, owners
+
+
+def merge_shards(shard_dirs, output_dir, jobs=DEFAULT_SYNC_JOBS):
+    # Combine the shards' outputs into output_dir, which ends up exactly as
+    # a single build would leave it. Nothing is written unless every check
+    # passes. Returns the list of problems found
+    problems, owners = verify_shards(shard_dirs, jobs)
+    if problems:
+        return problems
+
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+
+    def copy(item):
+        rel_path, shard_dir = item
+        dst_path = os.path.join(output_dir, *rel_path.split("/"))
+        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+        copy_file(os.path.join(shard_dir, *rel_path.split("/")), dst_path)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        list(executor.map(copy, sorted(owners.items())))
+    return []
+
+
+def merged_references(shard_dirs, output_dir):
+    # Every page's links, from all the shards, for checking the merged site
+    index = ReferenceIndex()
+    for shard_dir in shard_dirs:
+        for page, refs in load_shard_manifest(shard_dir)["references"].items():
+            index.add(os.path.join(output_dir, *page.split("/")), [tuple(ref) for ref in refs])
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge the output directories of a sharded build")
+    parser.add_argument("shards", nargs="+", help="output directory of each shard (built with --shard i/N)")
+    parser.add_argument("--output", default="docs", help="where the merged site is written")
+    parser.add_argument("--check-links", action="store_true",
+                        help="fail if a page of the merged site links to a missing page, image or static file")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_SYNC_JOBS, help="threads used to verify and copy files")
+    args = parser.parse_args(argv)
+
+    problems = merge_shards(args.shards, args.output, args.jobs)
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    if problems:
+        sys.exit(1)
+    print(f"Merged {len(args.shards)} shards into {args.output}")
+
+    if args.check_links:
+        assets = None
+        asset_manifest = os.path.join(args.output, ASSET_MANIFEST_PATH)
+        if os.path.exists(asset_manifest):
+            with open(asset_manifest, "r") as f:
+                assets = {"/" + url: "/" + fingerprinted for url, fingerprinted in json.load(f).items()}
+        broken = check_references(merged_references(args.shards, args.output), args.output, assets)
+        for page, kind, url in broken:
+            print(f"Broken {kind}: {page}: {url}", file=sys.stderr)
+        if broken:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
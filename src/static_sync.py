@@ -0,0 +1,158 @@
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from atomic import AtomicFile, temp_path, discard
+from manifest import hash_file, stat_fingerprint, GENERATOR_VERSION
+from minify import minifier_for
+
+# Copying is I/O bound, so a thread pool is enough to keep the disk busy
+DEFAULT_SYNC_JOBS = 8
+
+
+def scan_static(src, dst):
+    # Collect (source, destination) pairs for every file under src, mirroring
+    # the directory layout under dst
+    pairs = []
+    for entry in os.scandir(src):
+        dst_path = os.path.join(dst, entry.name)
+        if entry.is_dir():
+            pairs.extend(scan_static(entry.path, dst_path))
+        else:
+            pairs.append((entry.path, dst_path))
+    return pairs
+
+
+def _copy_file_range(src, dst):
+    # Let the kernel copy the bytes (or share extents on filesystems that
+    # support reflinks) without bouncing them through Python
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        remaining = os.fstat(fsrc.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+            if copied == 0:
+                break
+            remaining -= copied
+
+
+def copy_file(src, dst, link=False):
+    # Copy (or hardlink) src to dst, replacing dst atomically. The source's
+    # mtime is preserved so the next sync can compare size and mtime
+    if link:
+        tmp_path = temp_path(dst)
+        try:
+            # os.link won't replace the empty file reserving the name
+            os.remove(tmp_path)
+            os.link(src, tmp_path)
+            os.replace(tmp_path, dst)
+            return
+        except OSError:
+            # Different filesystem or no hardlink support, so copy instead
+            discard(tmp_path)
+
+    # copystat gives the copy the source's permissions as well, so it needs
+    # no fixing up before the replace
+    tmp_path = temp_path(dst)
+    try:
+        if hasattr(os, "copy_file_range"):
+            try:
+                _copy_file_range(src, tmp_path)
+            except OSError:
+                shutil.copyfile(src, tmp_path)
+        else:
+            shutil.copyfile(src, tmp_path)
+        shutil.copystat(src, tmp_path)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        discard(tmp_path)
+        raise
+
+
+def minify_file(src, dst, minifier):
+    # Write the minified contents of src to dst, replacing dst atomically
+    with open(src, "r") as f:
+        text = minifier(f.read())
+    with AtomicFile(dst) as f:
+        f.write(text)
+
+
+def static_inputs(src_path, src_stat, compare, minify=False):
+    # What the manifest remembers about a static file: its source path with
+    # the size and mtime by default, or the content hash when comparing by
+    # content, and whether the output was minified
+    if compare == "hash":
+        fingerprint = hash_file(src_path)
+    else:
+        fingerprint = stat_fingerprint(src_stat)
+    inputs = {"inputs": {src_path: fingerprint}, "generator": GENERATOR_VERSION}
+    if minify:
+        inputs["minify"] = True
+    return inputs
+
+
+def _sync_file(src_path, dst_path, previous, compare, link, minify=False):
+    # Returns (inputs, copied) for one file; runs on the thread pool
+    src_stat = os.stat(src_path)
+    minifier = minifier_for(src_path) if minify else None
+    inputs = static_inputs(src_path, src_stat, compare, minifier is not None)
+
+    if minifier is not None:
+        # A minified output never matches its source's size or hash, so only
+        # the manifest's record of the last build says whether it's current
+        if previous == inputs and os.path.exists(dst_path):
+            return inputs, False
+        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+        minify_file(src_path, dst_path, minifier)
+        return inputs, True
+
+    try:
+        dst_stat = os.stat(dst_path)
+    except FileNotFoundError:
+        dst_stat = None
+
+    if dst_stat is not None and dst_stat.st_size == src_stat.st_size:
+        if compare == "hash":
+            # Trust the manifest's record of the last copy, and only hash the
+            # output when there is no record of it
+            if previous == inputs or (previous is None and hash_file(dst_path) == inputs["inputs"][src_path]):
+                return inputs, False
+        elif dst_stat.st_mtime_ns == src_stat.st_mtime_ns:
+            return inputs, False
+
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    copy_file(src_path, dst_path, link)
+    return inputs, True
+
+
+def sync_static(src, dst, manifest, compare="mtime", link=False, jobs=DEFAULT_SYNC_JOBS, minify=False, rename=None,
+                select=None):
+    # Copy only the static files that changed since the last build. Every
+    # file is recorded in the manifest, so assets deleted from src are pruned
+    # from the output along with other stale outputs. With minify, HTML and
+    # CSS files are written minified instead of copied. rename maps an output
+    # path to the one the file is really written to (see assets.py), and
+    # select picks the outputs this build writes (see sharding.py)
+    pairs = scan_static(src, dst)
+    if rename is not None:
+        pairs = [(src_path, rename(dst_path)) for src_path, dst_path in pairs]
+    if select is not None:
+        pairs = [(src_path, dst_path) for src_path, dst_path in pairs if select(dst_path)]
+    return sync_files(pairs, manifest, compare, link, jobs, minify)
+
+
+def sync_files(pairs, manifest, compare="mtime", link=False, jobs=DEFAULT_SYNC_JOBS, minify=False):
+    # Bring the outputs of the given (source, destination) pairs up to date
+    # and record them in the manifest. sync_static passes every static
+    # file; watch.py passes just the ones that changed
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        results = executor.map(
+            lambda pair: _sync_file(pair[0], pair[1], manifest.previous.get(pair[1]), compare, link, minify),
+            pairs,
+        )
+        copied = 0
+        for (_, dst_path), (inputs, was_copied) in zip(pairs, results):
+            manifest.record(dst_path, inputs)
+            copied += was_copied
+
+    print(f"Synced static files: {copied} copied, {len(pairs) - copied} unchanged")
+    return copied
@@ -0,0 +1,175 @@
+import os
+import re
+
+from minify import minify_html
+from images import image_attributes
+
+# Placeholders look like {{ Title }} or {{ Content }}
+SLOT_PATTERN = re.compile(r"\{\{ (\w+) \}\}")
+
+# Root-relative links and assets that need the basepath for GitHub Pages
+PATH_PATTERN = re.compile(r'(href|src)="/')
+
+# The whole attribute, capturing the path so it can be looked up in the
+# asset map and the image index
+ASSET_PATTERN = re.compile(r'(href|src)="(/[^"?#]*)([^"]*)"')
+
+
+def _image_tag_needs_attributes(html, start, end):
+    # Is the src attribute at html[start:end] on an <img> that doesn't give
+    # its own dimensions?
+    tag_start = html.rfind("<", 0, start)
+    if tag_start == -1 or html[tag_start:tag_start + 4].lower() != "<img":
+        return False
+    tag_end = html.find(">", end)
+    return " width=" not in html[tag_start:tag_end if tag_end != -1 else len(html)]
+
+
+def rewrite_paths(html, basepath='/', assets=None, images=None):
+    # Point root-relative href/src attributes at the basepath in one pass.
+    # With an asset map ({"/index.css": "/index.3f2a9c01b7.css"}) the same
+    # pass points them at the fingerprinted copies too, and with an image
+    # index ({"/images/a.png": ImageInfo}) it adds the image's dimensions,
+    # lazy loading and srcset to every <img> of it
+    if assets or images:
+        def replace(match):
+            attribute, path, rest = match.groups()
+            rewritten = f'{attribute}="{basepath}{(assets.get(path, path) if assets else path)[1:]}{rest}"'
+            if attribute == "src" and images and path in images and \
+                    _image_tag_needs_attributes(html, match.start(), match.end()):
+                rewritten += image_attributes(images[path], basepath, assets)
+            return rewritten
+
+        return ASSET_PATTERN.sub(replace, html)
+    if basepath == '/':
+        return html
+    return PATH_PATTERN.sub(lambda match: f'{match.group(1)}="{basepath}', html)
+
+
+class Template:
+    def __init__(self, source, basepath='/', minify=False, assets=None, images=None):
+        self.basepath = basepath
+        self.minify = minify
+        # Pages rendered with the template use the same asset map and image
+        # index
+        self.assets = assets
+        self.images = images
+
+        # Fingerprinted URLs of the assets the template itself links to, so
+        # pages can be rebuilt when one of them changes
+        self.asset_urls = sorted({assets[path] for _, path, _ in ASSET_PATTERN.findall(source) if path in assets}) \
+            if assets else []
+
+        # The template's own links are rewritten once, here, instead of on
+        # every rendered page. Minifying here too means the indentation and
+        # comments are stripped once, not from every page built with it
+        source = rewrite_paths(source, basepath, assets, images)
+        if minify:
+            source = minify_html(source)
+
+        # Split the template into literal text and placeholder slots. The
+        # segments alternate: literal, slot, literal, slot, ..., literal
+        self.segments = []
+        self.slots = []
+        position = 0
+        for match in SLOT_PATTERN.finditer(source):
+            self.segments.append(source[position:match.start()])
+            self.slots.append((match.group(1), match.group(0)))
+            position = match.end()
+        self.segments.append(source[position:])
+
+    def render(self, **values):
+        # Interleave the literal segments with the slot values; slots without
+        # a value are left exactly as they appeared in the template
+        parts = [self.segments[0]]
+        for (name, placeholder), segment in zip(self.slots, self.segments[1:]):
+            parts.append(values.get(name, placeholder))
+            parts.append(segment)
+        return "".join(parts)
+
+    def write(self, fp, **values):
+        # Like render, but streams into a writable file object. A slot value
+        # can be a string or an iterable of string chunks, so a page's content
+        # can be serialized straight into the file without being joined first
+        fp.write(self.segments[0])
+        for (name, placeholder), segment in zip(self.slots, self.segments[1:]):
+            value = values.get(name, placeholder)
+            if isinstance(value, str):
+                fp.write(value)
+            else:
+                for chunk in value:
+                    fp.write(chunk)
+            fp.write(segment)
+
+
+# Compiled templates, keyed by path, basepath, minification, asset map and
+# the file's mtime and size so an edited template is picked up without
+# restarting the process
+_template_cache = {}
+
+
+def load_template(template_path, basepath='/', minify=False, assets=None, images=None):
+    stat = os.stat(template_path)
+    assets_key = tuple(sorted(assets.items())) if assets else None
+    images_key = tuple(sorted(images.items())) if images else None
+    key = (os.path.abspath(template_path), basepath, minify, assets_key, images_key, stat.st_mtime_ns, stat.st_size)
+
+    template = _template_cache.get(key)
+    if template is None:
+        with open(template_path, "r") as f:
+            template = Template(f.read(), basepath, minify, assets, images)
+        _template_cache[key] = template
+    return template
+
+
+# Where section and named layouts live
+DEFAULT_LAYOUTS_DIR = "layouts"
+
+
+class TemplateRegistry:
+    # Every layout the site uses, compiled once up front. A page gets, in
+    # order of preference: the layout its metadata names ("layout": "post"
+    # -> layouts/post.html), the layout of its nearest section
+    # (content/blog/news/... -> layouts/blog/news.html, then
+    # layouts/blog.html), or the default template. The registry holds only
+    # compiled templates, so it can be pickled and handed to worker processes
+    # instead of each of them reading the layouts from disk
+    def __init__(self, default_path, basepath='/', content_dir="content", layouts_dir=DEFAULT_LAYOUTS_DIR,
+                 minify=False, assets=None, images=None):
+        self.default_path = default_path
+        self.basepath = basepath
+        self.minify = minify
+        self.assets = assets
+        self.images = images
+        self.content_dir = content_dir
+        self.layouts_dir = layouts_dir
+        # Template path -> compiled Template
+        self.templates = {default_path: load_template(default_path, basepath, minify, assets, images)}
+        if os.path.isdir(layouts_dir):
+            stack = [layouts_dir]
+            while stack:
+                for entry in os.scandir(stack.pop()):
+                    if entry.is_dir():
+                        stack.append(entry.path)
+                    elif entry.name.endswith(".html"):
+                        self.templates[entry.path] = load_template(entry.path, basepath, minify, assets, images)
+
+    def layout_path(self, source_path, metadata=None):
+        # Path of the template a page is rendered with
+        if metadata and metadata.get("layout"):
+            path = os.path.join(self.layouts_dir, metadata["layout"] + ".html")
+            if path not in self.templates:
+                raise ValueError(f"Unknown layout: {metadata['layout']}")
+            return path
+
+        directory = os.path.relpath(os.path.dirname(source_path), self.content_dir)
+        parts = [] if directory == "." else directory.split(os.sep)
+        while parts:
+            path = os.path.join(self.layouts_dir, *parts) + ".html"
+            if path in self.templates:
+                return path
+            parts.pop()
+        return self.default_path
+
+    def select(self, source_path, metadata=None):
+        return self.templates[self.layout_path(source_path, metadata)]
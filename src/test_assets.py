@@ -0,0 +1,86 @@
+import os
+import json
+import tempfile
+import unittest
+
+from assets import fingerprint_assets, fingerprinted_name, asset_output_path, write_asset_manifest, css_asset_references
+from manifest import BuildManifest
+from template import Template, rewrite_paths
+
+
+class TestAssets(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static = os.path.join(self.tmp.name, "static")
+        os.makedirs(os.path.join(self.static, "images"))
+        for name, text in (("index.css", "body {}"), ("images/a.png", "png"), ("robots.txt", "")):
+            with open(os.path.join(self.static, name), "w") as f:
+                f.write(text)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_names_follow_contents(self):
+        self.assertEqual(fingerprinted_name("/images/a.png", "0123456789abcdef"), "/images/a.0123456789.png")
+        assets = fingerprint_assets(self.static)
+        self.assertEqual(sorted(assets), ["/images/a.png", "/index.css"])
+        self.assertRegex(assets["/index.css"], r"^/index\.[0-9a-f]{10}\.css$")
+        # Minified files are different bytes, so they get a different name
+        self.assertNotEqual(fingerprint_assets(self.static, minify=True)["/index.css"], assets["/index.css"])
+        self.assertEqual(fingerprint_assets(self.static, minify=True)["/images/a.png"], assets["/images/a.png"])
+
+        with open(os.path.join(self.static, "index.css"), "w") as f:
+            f.write("body { margin: 0 }")
+        self.assertNotEqual(fingerprint_assets(self.static)["/index.css"], assets["/index.css"])
+
+    def test_unchanged_files_are_not_hashed_again(self):
+        manifest = BuildManifest()
+        assets = fingerprint_assets(self.static, manifest=manifest)
+        css = os.path.join(self.static, "index.css")
+        self.assertIn(css, manifest.hashes)
+
+        # Same size and mtime, so the hash recorded last time is used
+        stat = os.stat(css)
+        with open(css, "w") as f:
+            f.write("table{}")
+        os.utime(css, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(fingerprint_assets(self.static, manifest=BuildManifest(hashes=manifest.hashes)), assets)
+        os.utime(css, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        self.assertNotEqual(fingerprint_assets(self.static, manifest=BuildManifest(hashes=manifest.hashes)), assets)
+
+    def test_stylesheet_urls_of_fingerprinted_assets(self):
+        with open(os.path.join(self.static, "index.css"), "w") as f:
+            f.write('a { background: url("images/a.png") } b { background: url(/images/a.png?v=1) } '
+                    'i { background: url(data:image/png;base64,xyz) } q { background: url(https://x/images/a.png) }')
+        assets = fingerprint_assets(self.static)
+        css = os.path.join(self.static, "index.css")
+        self.assertEqual(css_asset_references(self.static, assets), [(css, "images/a.png"), (css, "/images/a.png?v=1")])
+
+    def test_output_paths_and_manifest(self):
+        docs = os.path.join(self.tmp.name, "docs")
+        os.makedirs(docs)
+        assets = {"/images/a.png": "/images/a.0123456789.png"}
+        self.assertEqual(asset_output_path(os.path.join(docs, "images", "a.png"), docs, assets),
+                         os.path.join(docs, "images", "a.0123456789.png"))
+        self.assertEqual(asset_output_path(os.path.join(docs, "robots.txt"), docs, assets),
+                         os.path.join(docs, "robots.txt"))
+        with open(write_asset_manifest(assets, docs)) as f:
+            self.assertEqual(json.load(f), {"images/a.png": "images/a.0123456789.png"})
+
+    def test_references_are_rewritten_with_the_basepath(self):
+        assets = {"/index.css": "/index.0123456789.css", "/a.png": "/a.abcdef0123.png"}
+        html = '<a href="/about">x</a><img src="/a.png" /><a href="/index.css#x">y</a><a href="https://x/a.png">'
+        self.assertEqual(
+            rewrite_paths(html, "/site/", assets),
+            '<a href="/site/about">x</a><img src="/site/a.abcdef0123.png" />'
+            '<a href="/site/index.0123456789.css#x">y</a><a href="https://x/a.png">',
+        )
+        self.assertEqual(rewrite_paths('<img src="/a.png" />', "/", assets), '<img src="/a.abcdef0123.png" />')
+
+        template = Template('<link href="/index.css" />{{ Content }}', "/site/", assets=assets)
+        self.assertEqual(template.asset_urls, ["/index.0123456789.css"])
+        self.assertEqual(template.render(Content=""), '<link href="/site/index.0123456789.css" />')
+
+
+if __name__ == "__main__":
+    unittest.main()
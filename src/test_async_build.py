@@ -0,0 +1,72 @@
+import os
+import asyncio
+import tempfile
+import unittest
+
+from async_build import build_pages_async
+from profiler import BuildProfiler
+
+
+class TestAsyncBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.template = os.path.join(self.tmp.name, "template.html")
+        with open(self.template, "w") as f:
+            f.write('<title>{{ Title }}</title><a href="/">home</a>{{ Content }}')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_pages(self, count):
+        pages = []
+        for i in range(count):
+            source = os.path.join(self.tmp.name, f"{i}.md")
+            with open(source, "w") as f:
+                f.write(f"# Page {i}\n\n[link](/x/{i})")
+            pages.append((source, os.path.join(self.tmp.name, "out", str(i), "index.html")))
+        return pages
+
+    def test_writes_every_page_through_a_small_queue(self):
+        # More pages than queue slots and writers, so the readers have to wait
+        pages = self.make_pages(20)
+        errors = asyncio.run(build_pages_async(pages, self.template, "/base/", 1, read_concurrency=2,
+                                               write_concurrency=1, queue_size=1))
+        self.assertEqual(errors, [])
+        with open(pages[7][1]) as f:
+            self.assertEqual(
+                f.read(),
+                '<title>Page 7</title><a href="/base/">home</a>'
+                '<div><h1>Page 7</h1><p><a href="/base/x/7">link</a></p></div>',
+            )
+
+    def test_errors_are_collected_per_page(self):
+        pages = self.make_pages(3)
+        with open(pages[1][0], "w") as f:
+            f.write("no title here")
+        errors = asyncio.run(build_pages_async(pages, self.template, "/", 2))
+        self.assertEqual([dest for dest, _ in errors], [pages[1][1]])
+        self.assertTrue(os.path.exists(pages[2][1]))
+
+    def test_profiles_every_stage(self):
+        pages = self.make_pages(3)
+        profiler = BuildProfiler()
+        errors = asyncio.run(build_pages_async(pages, self.template, "/", 1, profiler=profiler))
+        self.assertEqual(errors, [])
+        stages = {(name, page) for name, page, *_ in profiler.records}
+        for _, dest in pages:
+            for name in ("read", "template", "parse", "render", "write"):
+                self.assertIn((name, dest), stages)
+
+    def test_worker_processes_take_batches(self):
+        pages = self.make_pages(5)
+        profiler = BuildProfiler()
+        errors = asyncio.run(build_pages_async(pages, self.template, "/", 2, profiler=profiler, batch_size=2))
+        self.assertEqual(errors, [])
+        for _, dest in pages:
+            self.assertTrue(os.path.exists(dest))
+        # Records made in the workers come back to the parent's profiler
+        self.assertEqual({page for _, page, *_ in profiler.records}, {dest for _, dest in pages})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+
+from atomic import AtomicFile
+from markdown import write_page
+from template import Template
+
+
+class TestAtomicFile(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "page.html")
+        with open(self.path, "w") as f:
+            f.write("old")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read(self):
+        with open(self.path) as f:
+            return f.read()
+
+    def test_replaces_the_file_when_done(self):
+        with AtomicFile(self.path) as f:
+            f.write("new")
+            self.assertEqual(self.read(), "old")
+        self.assertEqual(self.read(), "new")
+        self.assertEqual(os.listdir(self.tmp.name), ["page.html"])
+        umask = os.umask(0)
+        os.umask(umask)
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o666 & ~umask)
+
+    def test_failure_keeps_the_old_file(self):
+        with self.assertRaises(ValueError):
+            with AtomicFile(self.path) as f:
+                f.write("half")
+                raise ValueError("render failed")
+        self.assertEqual(self.read(), "old")
+        self.assertEqual(os.listdir(self.tmp.name), ["page.html"])
+
+    def test_makes_missing_directories(self):
+        path = os.path.join(self.tmp.name, "a", "b.html")
+        with AtomicFile(path, makedirs=True) as f:
+            f.write("x")
+        with open(path) as f:
+            self.assertEqual(f.read(), "x")
+
+    def test_page_failing_mid_render_leaves_previous_output(self):
+        def chunks():
+            yield "<p>first</p>"
+            raise RuntimeError("broken block")
+
+        class Content:
+            def iter_html(self):
+                return chunks()
+
+        template = Template("<title>{{ Title }}</title>{{ Content }}")
+        with self.assertRaises(RuntimeError):
+            write_page(template, self.path, "Title", Content())
+        self.assertEqual(self.read(), "old")
+        self.assertEqual(os.listdir(self.tmp.name), ["page.html"])
+
+
+if __name__ == "__main__":
+    unittest.main()
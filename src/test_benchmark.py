@@ -0,0 +1,30 @@
+import unittest
+
+from benchmark import compare_to_baseline, run_benchmarks, CORPORA
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_compare_to_baseline_flags_slow_stages(self):
+        baseline = {"lists": {"to_html": 1.0, "write": 1.0}}
+        results = {"lists": {"to_html": 1.5, "write": 1.1, "template": 9.0}}
+        self.assertEqual(compare_to_baseline(results, baseline, threshold=0.25), [("lists", "to_html", 1.0, 1.5)])
+
+    def test_compare_to_baseline_ignores_timer_noise(self):
+        baseline = {"lists": {"to_html": 0.0001}}
+        results = {"lists": {"to_html": 0.0005}}
+        self.assertEqual(compare_to_baseline(results, baseline), [])
+
+    def test_run_benchmarks_times_every_stage(self):
+        results = run_benchmarks(["many_small_pages"], scale=1, repeat=1)
+        self.assertEqual(
+            sorted(results["many_small_pages"]),
+            sorted([
+                "markdown_to_blocks", "block_to_block_type", "inline_markdown_to_textnodes", "text_to_textnodes",
+                "markdown_to_html_node", "to_html", "template", "write",
+            ]),
+        )
+        self.assertIn("deep_lists", CORPORA)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import io
+import os
+import tempfile
+import unittest
+import contextlib
+
+from manifest import BuildManifest, GENERATOR_VERSION
+from dependencies import DependencyGraph, plan_rebuild
+from markdown import set_template_registry
+from main import main as build
+
+
+class TestDependencies(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.files = {}
+        for name in ("a.md", "b.md", "template.html", "pic.png", "docs/pic.png", "docs/a.html", "docs/b.html"):
+            self.files[name] = os.path.join(self.tmp.name, name)
+            os.makedirs(os.path.dirname(self.files[name]), exist_ok=True)
+            with open(self.files[name], "w") as f:
+                f.write(name)
+
+        # docs/pic.png is copied from pic.png; page a embeds the copy
+        f = self.files
+        manifest = BuildManifest()
+        manifest.record(f["docs/pic.png"], {"inputs": {f["pic.png"]: manifest.file_hash(f["pic.png"])},
+                                            "generator": GENERATOR_VERSION})
+        manifest.record(f["docs/a.html"], manifest.page_inputs(f["a.md"], f["template.html"], "/", [f["docs/pic.png"]]))
+        manifest.record(f["docs/b.html"], manifest.page_inputs(f["b.md"], f["template.html"], "/"))
+        self.records = manifest.current
+        self.outputs = {f["docs/pic.png"]: "static", f["docs/a.html"]: "page", f["docs/b.html"]: "page"}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_changes_propagate_through_outputs(self):
+        graph = DependencyGraph(self.records)
+        f = self.files
+        self.assertEqual(graph.affected([f["pic.png"]]), {f["docs/pic.png"], f["docs/a.html"]})
+        self.assertEqual(graph.affected([f["template.html"]]), {f["docs/a.html"], f["docs/b.html"]})
+        self.assertEqual(graph.affected([f["b.md"]]), {f["docs/b.html"]})
+
+    def test_plan_rebuild_lists_only_affected_outputs(self):
+        f = self.files
+        rebuild, stale = plan_rebuild(BuildManifest(self.records), self.outputs, "/")
+        self.assertEqual((rebuild, stale), ({}, []))
+
+        with open(f["pic.png"], "w") as out:
+            out.write("changed")
+        rebuild, _ = plan_rebuild(BuildManifest(self.records), self.outputs, "/")
+        self.assertEqual(sorted(rebuild), [f["docs/a.html"], f["docs/pic.png"]])
+        self.assertEqual(rebuild[f["docs/a.html"]], [f"{f['pic.png']} changed"])
+
+        # A new basepath rebuilds every page, and a dropped page is stale
+        del self.outputs[f["docs/b.html"]]
+        rebuild, stale = plan_rebuild(BuildManifest(self.records), self.outputs, "/blog/")
+        self.assertEqual(rebuild[f["docs/a.html"]], [f"{f['pic.png']} changed", "basepath changed"])
+        self.assertEqual(stale, [f["docs/b.html"]])
+
+
+class TestDryRunMatchesBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        os.makedirs(os.path.join("static", "images"))
+        os.makedirs("content")
+        self.write("template.html", "<title>{{ Title }}</title>{{ Content }}")
+        self.write(os.path.join("static", "images", "a.png"), "png")
+        self.write(os.path.join("content", "index.md"), "# Home\n\n![a](/images/a.png)")
+        self.write(os.path.join("content", "other.md"), "# Other")
+        self.run_build("--incremental")
+
+    def tearDown(self):
+        set_template_registry(None)
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def write(self, path, text):
+        with open(path, "w") as f:
+            f.write(text)
+
+    def run_build(self, *args):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            build(["/", *args])
+        return output.getvalue().splitlines()
+
+    def assert_dry_run_matches_build(self):
+        planned = {line.split()[2] for line in self.run_build("--dry-run")
+                   if line.startswith("Would rebuild: ") and line.split()[2].endswith(".html")}
+        generated = {line.split()[1] for line in self.run_build("--incremental") if line.startswith("Generated: ")}
+        self.assertEqual(planned, generated)
+        return generated
+
+    def test_touched_asset_rebuilds_no_pages(self):
+        # Copied again, but with the same contents
+        os.utime(os.path.join("static", "images", "a.png"), ns=(1, 1))
+        self.assertEqual(self.assert_dry_run_matches_build(), set())
+
+    def test_changed_asset_rebuilds_the_pages_embedding_it(self):
+        self.write(os.path.join("static", "images", "a.png"), "png, changed")
+        self.assertEqual(self.assert_dry_run_matches_build(), {os.path.join("docs", "index.html")})
+
+
+if __name__ == "__main__":
+    unittest.main()
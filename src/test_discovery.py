@@ -0,0 +1,64 @@
+import os
+import time
+import tempfile
+import unittest
+
+from discovery import ContentIndex, discover_pages, create_output_dirs
+
+
+class TestDiscovery(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.content = os.path.join(self.tmp.name, "content")
+        self.write("index.md", "# Home")
+        self.write(os.path.join("blog", "post", "index.md"), "# Post")
+        self.write(os.path.join("blog", "notes.txt"), "not a page")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, rel_path, text):
+        path = os.path.join(self.content, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def test_scan_returns_sorted_flat_manifest(self):
+        pages = ContentIndex().scan(self.content, "docs")
+        self.assertEqual(
+            [(page.source, page.dest) for page in pages],
+            [
+                (os.path.join(self.content, "blog", "post", "index.md"), os.path.join("docs", "blog", "post", "index.html")),
+                (os.path.join(self.content, "index.md"), os.path.join("docs", "index.html")),
+            ],
+        )
+        self.assertEqual(pages[1].size, len("# Home"))
+        # Without an index, discover_pages scans with a throwaway one
+        self.assertEqual(discover_pages(self.content, "docs"), pages)
+
+    def test_unchanged_directories_are_not_listed_again(self):
+        index_path = os.path.join(self.tmp.name, "index.json")
+        index = ContentIndex()
+        index.scan(self.content, "docs")
+        index.save(index_path)
+
+        # A new page changes its directory's mtime, but nothing else's
+        time.sleep(0.01)
+        self.write(os.path.join("blog", "post", "other.md"), "# Other")
+        index = ContentIndex.load(index_path)
+        pages = index.scan(self.content, "docs")
+
+        self.assertEqual(index.scanned, 1)
+        self.assertEqual(index.reused, 2)
+        self.assertEqual(len(pages), 3)
+
+    def test_create_output_dirs_once_each(self):
+        pages = ContentIndex().scan(self.content, os.path.join(self.tmp.name, "docs"))
+        directories = create_output_dirs(pages)
+        self.assertEqual(len(directories), 2)
+        self.assertTrue(all(os.path.isdir(directory) for directory in directories))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import io
+import unittest
+
+from frontmatter import split_front_matter, read_front_matter, front_matter_span
+from markdown import markdown_to_html_node
+
+DOCUMENT = "---\ntitle: Powers\ndate: 2024-05-01\ntags: gambit, \"mutant powers\"\nlayout: post\n---\n# Heading\n\nBody"
+
+
+class TestFrontMatter(unittest.TestCase):
+    def test_split_front_matter(self):
+        metadata, body = split_front_matter(DOCUMENT)
+        self.assertEqual(metadata, {"title": "Powers", "date": "2024-05-01", "tags": ["gambit", "mutant powers"],
+                                    "layout": "post"})
+        self.assertEqual(body, "# Heading\n\nBody")
+
+    def test_documents_without_front_matter_are_untouched(self):
+        for markdown in ("# Title\n\nBody", "---\nnot closed\n\nBody", "----\na: b\n---\n"):
+            self.assertEqual(split_front_matter(markdown), ({}, markdown))
+            metadata, lines = read_front_matter(io.StringIO(markdown))
+            self.assertEqual((metadata, "".join(lines)), ({}, markdown))
+
+    def test_read_front_matter_leaves_body_for_streaming(self):
+        metadata, lines = read_front_matter(io.StringIO(DOCUMENT))
+        self.assertEqual(metadata["tags"], ["gambit", "mutant powers"])
+        self.assertEqual(markdown_to_html_node(lines).to_html(), "<div><h1>Heading</h1><p>Body</p></div>")
+
+    def test_span_works_on_bytes(self):
+        span = front_matter_span(DOCUMENT.encode())
+        self.assertEqual(DOCUMENT.encode()[span[2]:], b"# Heading\n\nBody")
+        self.assertIsNone(front_matter_span(b"# Title"))
+
+    def test_invalid_line_raises(self):
+        with self.assertRaises(ValueError):
+            split_front_matter("---\nno separator\n---\n# Title")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,4 @@
+import io
 import unittest
 from src.htmlnode import HTMLNode, LeafNode, ParentNode
 
@@ -43,6 +44,39 @@ class TestHTMLNode(unittest.TestCase):
             "<div><span><b>grandchild</b></span></div>",
         )
 
+    def test_iter_html_streams_chunks(self):
+        parent_node = ParentNode("ul", [ParentNode("li", [LeafNode(None, "one")]), ParentNode("li", [LeafNode("b", "two")])])
+        chunks = list(parent_node.iter_html())
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), parent_node.to_html())
+        self.assertEqual(parent_node.to_html(), "<ul><li>one</li><li><b>two</b></li></ul>")
+
+    def test_write_html(self):
+        parent_node = ParentNode("a", [LeafNode(None, "link")], {"href": "/x"})
+        out = io.StringIO()
+        parent_node.write_html(out)
+        self.assertEqual(out.getvalue(), '<a href="/x">link</a>')
+
+    def test_nodes_without_attributes_share_a_read_only_map(self):
+        first = LeafNode(None, "one")
+        second = ParentNode("p", [first])
+        self.assertIs(first.attributes, second.attributes)
+        # Writing to the shared map would give every such node the attribute
+        with self.assertRaises(TypeError):
+            first.attributes["class"] = "x"
+        self.assertEqual(second.to_html(), "<p>one</p>")
+
+        # Nodes given attributes keep their own dict
+        node = LeafNode("a", "link", {"href": "/x"})
+        node.attributes["class"] = "x"
+        self.assertEqual(node.to_html(), '<a href="/x" class="x">link</a>')
+        self.assertEqual(LeafNode("a", "link").to_html(), "<a>link</a>")
+
+    def test_nodes_reject_unknown_attributes(self):
+        for node in (HTMLNode("p"), LeafNode("b", "x"), ParentNode("p", [])):
+            with self.assertRaises(AttributeError):
+                node.colour = "red"
+
 
 
 
@@ -0,0 +1,119 @@
+import io
+import os
+import struct
+import shutil
+import tempfile
+import unittest
+import contextlib
+from unittest import mock
+
+import main
+import images
+from images import ImageIndex, image_size, image_attributes, write_variants
+from manifest import BuildManifest
+from template import rewrite_paths
+from markdown import set_template_registry
+
+
+def png(width, height):
+    return b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR" + struct.pack(">II", width, height) + b"\x08\x06\x00\x00\x00"
+
+
+class TestImages(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static = os.path.join(self.tmp.name, "static")
+        self.cache = os.path.join(self.tmp.name, "cache")
+        os.makedirs(os.path.join(self.static, "images"))
+        self.write("images/a.png", png(903, 456))
+        self.write("index.css", b"body {}")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, data):
+        path = os.path.join(self.static, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_sizes_come_from_headers(self):
+        jpeg = (b"\xff\xd8\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + bytes(9) +
+                b"\xff\xc0" + struct.pack(">HBHH", 17, 8, 200, 600) + bytes(12))
+        webp = b"RIFF" + bytes(4) + b"WEBPVP8X" + bytes(8) + (639).to_bytes(3, "little") + (479).to_bytes(3, "little")
+        self.assertEqual(image_size(self.write("a.jpg", jpeg)), (600, 200))
+        self.assertEqual(image_size(self.write("a.gif", b"GIF89a" + struct.pack("<HH", 10, 20))), (10, 20))
+        self.assertEqual(image_size(self.write("a.webp", webp)), (640, 480))
+        self.assertEqual(image_size(os.path.join(self.static, "images", "a.png")), (903, 456))
+        self.assertIsNone(image_size(os.path.join(self.static, "index.css")))
+
+    def test_scan_reuses_measurements(self):
+        index = ImageIndex()
+        found = index.scan(self.static, cache_dir=self.cache, jobs=2)
+        self.assertEqual(list(found), ["/images/a.png"])
+        self.assertEqual((found["/images/a.png"].width, found["/images/a.png"].height), (903, 456))
+        self.assertEqual(index.measured, 1)
+
+        # A copy under another name has the same hash, so isn't measured again
+        shutil.copy(os.path.join(self.static, "images", "a.png"), os.path.join(self.static, "images", "b.png"))
+        found = index.scan(self.static, cache_dir=self.cache)
+        self.assertEqual((index.hashed, index.measured), (1, 0))
+        self.assertEqual(found["/images/b.png"].width, 903)
+
+    def test_variants_and_attributes(self):
+        # Resize by copying, so the test doesn't need Pillow
+        with mock.patch.object(images, "resize", lambda src, dst, width: shutil.copy(src, dst)):
+            found = ImageIndex().scan(self.static, [480, 2000], self.cache)
+        info = found["/images/a.png"]
+        self.assertEqual([(width, url) for width, url, _ in info.variants],
+                         [(480, f"/images/a-480w.{info.hash[:10]}.png")])
+
+        docs = os.path.join(self.tmp.name, "docs")
+        manifest = BuildManifest()
+        self.assertEqual(write_variants(found, docs, manifest), 1)
+        self.assertTrue(os.path.exists(os.path.join(docs, "images", f"a-480w.{info.hash[:10]}.png")))
+        self.assertEqual(write_variants(found, docs, BuildManifest(manifest.current)), 0)
+
+        self.assertEqual(
+            image_attributes(info, "/site/"),
+            f' width="903" height="456" loading="lazy" srcset="/site/images/a-480w.{info.hash[:10]}.png 480w, '
+            f'/site/images/a.png 903w" sizes="(max-width: 903px) 100vw, 903px"',
+        )
+
+    def test_rewrite_adds_attributes_to_img_tags(self):
+        info = ImageIndex().scan(self.static, cache_dir=self.cache)
+        self.assertEqual(
+            rewrite_paths('<img src="/images/a.png" alt="A"><a href="/images/a.png">', "/", images=info),
+            '<img src="/images/a.png" width="903" height="456" loading="lazy" alt="A"><a href="/images/a.png">',
+        )
+        # Dimensions given in the markup win
+        self.assertEqual(rewrite_paths('<img src="/images/a.png" width="10">', "/", images=info),
+                         '<img src="/images/a.png" width="10">')
+
+    def test_dry_run_makes_no_variants(self):
+        with open(os.path.join(self.tmp.name, "template.html"), "w") as f:
+            f.write("{{ Content }}")
+        os.makedirs(os.path.join(self.tmp.name, "content"))
+        with open(os.path.join(self.tmp.name, "content", "index.md"), "w") as f:
+            f.write("# Home\n\n![a](/images/a.png)")
+
+        cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        output = io.StringIO()
+        try:
+            # Pillow stands in for the check; resizing must not be reached
+            with mock.patch.object(main, "Image", object()), \
+                    mock.patch.object(images, "resize", side_effect=AssertionError("resized")), \
+                    contextlib.redirect_stdout(output):
+                main.main(["/", "--dry-run", "--images", "--image-widths", "480"])
+        finally:
+            set_template_registry(None)
+            os.chdir(cwd)
+
+        self.assertIn("Images: 1 found, 1 measured, 1 would be resized", output.getvalue())
+        self.assertRegex(output.getvalue(), r"Would rebuild: docs/images/a-480w\.\w+\.png \(new\)")
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ["content", "static", "template.html"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import sys
+import unittest
+
+from inline import tokenize_inline
+from textnode import TextNode, TextType, text_to_textnodes
+from textnode import extract_markdown_images, extract_markdown_links, split_nodes_image, split_nodes_link
+
+
+class TestTokenizeInline(unittest.TestCase):
+    def test_plain_text(self):
+        self.assertEqual(tokenize_inline("just text"), [("text", "just text", None)])
+        self.assertEqual(tokenize_inline(""), [])
+
+    def test_all_elements(self):
+        self.assertEqual(
+            tokenize_inline("**b** _i_ `c` [l](/u) ![a](/p.png)"),
+            [
+                ("bold", "b", None),
+                ("text", " ", None),
+                ("italic", "i", None),
+                ("text", " ", None),
+                ("code", "c", None),
+                ("text", " ", None),
+                ("link", "l", "/u"),
+                ("text", " ", None),
+                ("image", "a", "/p.png"),
+            ],
+        )
+
+    def test_delimiters_inside_code_are_literal(self):
+        self.assertEqual(tokenize_inline("`a_b**c`"), [("code", "a_b**c", None)])
+
+    def test_unclosed_delimiters(self):
+        self.assertEqual(tokenize_inline("a_b and **c"), [("text", "a_b and **c", None)])
+        with self.assertRaises(ValueError):
+            tokenize_inline("a_b", strict=True)
+        with self.assertRaises(ValueError):
+            tokenize_inline("a **b", strict=True)
+
+    def test_many_elements_do_not_recurse(self):
+        # Far more elements than the recursion limit
+        count = sys.getrecursionlimit() * 2
+        tokens = tokenize_inline("[x](/y) " * count)
+        self.assertEqual(len(tokens), count * 2)
+        self.assertEqual(tokens[-2], ("link", "x", "/y"))
+
+    def test_many_unclosed_delimiters(self):
+        text = "[a](b " * 10000
+        self.assertEqual(tokenize_inline(text), [("text", text, None)])
+
+
+# Texts where a separate link grammar would easily disagree with the
+# tokenizer: nested and unbalanced brackets, and links or images next to or
+# inside other delimiters
+EDGE_CASES = [
+    "[a [b](c)",
+    "[a](b [c](d)",
+    "![a [b](c)",
+    "![img](/i.png)[link](/l)",
+    "[link](/l)![img](/i.png)",
+    "`[code](/c)` and [link](/l)",
+    "**[bold](/b)** and ![img](/i.png)",
+    "_[italic](/i)_ [x](/y) `![not](/an/image)`",
+    "[a](b)(c) [d]e](f) [g](h",
+    "![](/empty.png) [](/empty)",
+]
+
+
+class TestLinkExtraction(unittest.TestCase):
+    # The extractors and splitters must find exactly the links and images
+    # the page is rendered with
+    def rendered(self, text, text_type):
+        return [(node.text, node.url) for node in text_to_textnodes(text) if node.text_type == text_type]
+
+    def test_extractors_match_the_tokenizer(self):
+        for text in EDGE_CASES:
+            with self.subTest(text=text):
+                self.assertEqual(extract_markdown_links(text), self.rendered(text, TextType.Links))
+                self.assertEqual(extract_markdown_images(text), self.rendered(text, TextType.Images))
+
+    def test_splitters_match_the_tokenizer(self):
+        for text in EDGE_CASES:
+            with self.subTest(text=text):
+                links = split_nodes_link([TextNode(text, TextType.Normal_text)])
+                self.assertEqual([(n.text, n.url) for n in links if n.text_type == TextType.Links],
+                                 self.rendered(text, TextType.Links))
+                images = split_nodes_image([TextNode(text, TextType.Normal_text)])
+                self.assertEqual([(n.text, n.url) for n in images if n.text_type == TextType.Images],
+                                 self.rendered(text, TextType.Images))
+                # Whatever isn't split out is kept as it was written
+                source = "".join(f"[{n.text}]({n.url})" if n.text_type == TextType.Links else n.text
+                                 for n in links)
+                self.assertEqual(source, text)
+
+    def test_nested_brackets(self):
+        self.assertEqual(extract_markdown_links("[a [b](c)"), [("a [b", "c")])
+        self.assertEqual(split_nodes_link([TextNode("x [a [b](c) y", TextType.Normal_text)]), [
+            TextNode("x ", TextType.Normal_text),
+            TextNode("a [b", TextType.Links, "c"),
+            TextNode(" y", TextType.Normal_text),
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+
+from inline_cache import InlineCache
+from markdown import markdown_to_html_node, set_inline_cache
+
+
+class TestInlineCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = InlineCache(maxsize=2)
+        cache.put("a", "A")
+        cache.put("b", "B")
+        self.assertEqual(cache.get("a"), "A")
+        cache.put("c", "C")
+        # "b" was least recently used
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "A")
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (2, 1, 1))
+
+    def test_fifo_eviction(self):
+        cache = InlineCache(maxsize=2, eviction="fifo")
+        cache.put("a", "A")
+        cache.put("b", "B")
+        cache.get("a")
+        cache.put("c", "C")
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), "B")
+
+    def test_fifo_replacing_a_value_keeps_its_place(self):
+        cache = InlineCache(maxsize=2, eviction="fifo")
+        cache.put("a", "A")
+        cache.put("b", "B")
+        # A worker computed "a" too; merging it back doesn't make it newer
+        cache.merge([("a", "A2")])
+        cache.put("c", "C")
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), "B")
+
+        lru = InlineCache(maxsize=2)
+        lru.put("a", "A")
+        lru.put("b", "B")
+        lru.merge([("a", "A2")])
+        lru.put("c", "C")
+        self.assertEqual(lru.get("a"), "A2")
+        self.assertIsNone(lru.get("b"))
+
+    def test_merge_adds_worker_counters(self):
+        worker = InlineCache(maxsize=1, track_new=True)
+        worker.put("a", "A")
+        worker.put("b", "B")
+        worker.get("b")
+        worker.get("a")
+        cache = InlineCache(maxsize=10)
+        cache.merge(worker.take_new(), worker.hits, worker.misses, worker.evictions)
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (1, 1, 1))
+        self.assertEqual(list(cache.entries), ["b"])
+
+    def test_save_and_load(self):
+        cache = InlineCache(maxsize=10)
+        cache.put("**a**", "<b>a</b>")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.json")
+            cache.save(path)
+            loaded = InlineCache(maxsize=10)
+            loaded.load(path)
+        self.assertEqual(loaded.get("**a**"), "<b>a</b>")
+
+    def test_cached_rendering_matches_uncached(self):
+        md = "- [Home](/)\n- **bold** and _italic_\n\n- [Home](/)\n- **bold** and _italic_"
+        expected = markdown_to_html_node(md).to_html()
+        cache = InlineCache(maxsize=10)
+        set_inline_cache(cache)
+        try:
+            self.assertEqual(markdown_to_html_node(md).to_html(), expected)
+        finally:
+            set_inline_cache(None)
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import tempfile
+import unittest
+
+from discovery import ContentIndex
+from metadata import MetadataIndex
+from listings import listing_pages, atom_feed, generate_listings
+from markdown import generate_page, set_page_metadata
+
+
+class TestListings(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.content = os.path.join(self.tmp.name, "content")
+        self.output = os.path.join(self.tmp.name, "docs")
+        self.template = os.path.join(self.tmp.name, "template.html")
+        with open(self.template, "w") as f:
+            f.write("{{ Content }}")
+        self.write("index.md", "# Home")
+        self.write(os.path.join("blog", "a", "index.md"), "---\ndate: 2024-01-01\ntags: [x]\n---\n# Post A")
+        self.write(os.path.join("blog", "b", "index.md"), "---\ntitle: Post B\ndate: 2024-02-01\ntags: [x, Y Z]\n---\nBody")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, rel_path, text):
+        path = os.path.join(self.content, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(text)
+
+    def scan(self, index=None):
+        index = index or MetadataIndex()
+        return index, index.scan(ContentIndex().scan(self.content, self.output), self.output)
+
+    def test_metadata_index_reads_only_changed_pages(self):
+        index, entries = self.scan()
+        self.assertEqual(index.read, 3)
+        post_b = [entry for entry in entries if entry.slug == "b"][0]
+        self.assertEqual((post_b.url, post_b.title, post_b.date, post_b.tags), ("/blog/b", "Post B", "2024-02-01", ["x", "Y Z"]))
+
+        path = os.path.join(self.tmp.name, "metadata.json")
+        index.save(path)
+        index, _ = self.scan(MetadataIndex.load(path))
+        self.assertEqual(index.read, 0)
+
+    def test_pages_reuse_the_scanned_front_matter(self):
+        index, _ = self.scan()
+        source = os.path.join(self.content, "blog", "a", "index.md")
+        # Changed behind the scan's back, to show the page doesn't read it
+        index.current[source]["title"] = "Scanned"
+        template = os.path.join(self.tmp.name, "titled.html")
+        with open(template, "w") as f:
+            f.write("<title>{{ Title }}</title>")
+        dest = os.path.join(self.output, "a.html")
+        set_page_metadata(index.current)
+        try:
+            generate_page(source, template, dest)
+        finally:
+            set_page_metadata(None)
+        with open(dest) as f:
+            self.assertEqual(f.read(), "<title>Scanned</title>")
+
+    def test_listings_and_feed(self):
+        _, entries = self.scan()
+        dests = [dest for dest, *_ in listing_pages(entries, self.content, self.output)]
+        self.assertEqual(dests, [os.path.join(self.output, *parts, "index.html")
+                                 for parts in (["blog"], ["tags"], ["tags", "x"], ["tags", "y-z"])])
+
+        feed = atom_feed(entries, "Home", "https://example.com", "/site/", size=1)
+        self.assertIn("<link href=\"https://example.com/site/blog/b\" />", feed)
+        self.assertNotIn("blog/a", feed)
+
+        outputs = generate_listings(entries, self.content, self.template, self.output)
+        with open(os.path.join(self.output, "blog", "index.html")) as f:
+            self.assertEqual(f.read(), '<div><h1>Blog</h1><ul><li><a href="/blog/b">Post B</a> 2024-02-01</li>'
+                                       '<li><a href="/blog/a">Post A</a> 2024-01-01</li></ul></div>')
+        self.assertEqual(len(outputs), 5)
+
+    def test_titles_and_tags_are_shown_as_written(self):
+        self.write(os.path.join("blog", "a", "index.md"),
+                   "---\ndate: 2024-01-01\ntags: [snake_case *notes*]\n---\n# Foo [draft](x)")
+        self.write(os.path.join("blog", "b", "index.md"), "---\ntitle: `b` _c_\ndate: 2024-02-01\n---\nBody")
+        _, entries = self.scan()
+        generate_listings(entries, self.content, self.template, self.output)
+        with open(os.path.join(self.output, "blog", "index.html")) as f:
+            self.assertEqual(f.read(), '<div><h1>Blog</h1><ul><li><a href="/blog/b">`b` _c_</a> 2024-02-01</li>'
+                                       '<li><a href="/blog/a">Foo [draft](x)</a> 2024-01-01</li></ul></div>')
+        with open(os.path.join(self.output, "tags", "index.html")) as f:
+            self.assertEqual(f.read(), '<div><h1>Tags</h1><ul><li><a href="/tags/snake_case-notes">'
+                                       'snake_case *notes*</a> (1)</li></ul></div>')
+        with open(os.path.join(self.output, "tags", "snake_case-notes", "index.html")) as f:
+            self.assertIn("<h1>Tagged: snake_case *notes*</h1>", f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import tempfile
+import unittest
+
+from manifest import BuildManifest, GENERATOR_VERSION, load_versioned_json, save_versioned_json
+
+
+class TestBuildManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        self.source = os.path.join(self.dir, "index.md")
+        self.template = os.path.join(self.dir, "template.html")
+        self.output = os.path.join(self.dir, "docs", "index.html")
+        self.manifest_path = os.path.join(self.dir, "manifest.json")
+        with open(self.source, "w") as f:
+            f.write("# Hello")
+        with open(self.template, "w") as f:
+            f.write("{{ Content }}")
+        os.makedirs(os.path.dirname(self.output))
+        with open(self.output, "w") as f:
+            f.write("<h1>Hello</h1>")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_unchanged_page_is_fresh(self):
+        manifest = BuildManifest()
+        inputs = manifest.page_inputs(self.source, self.template, "/")
+        manifest.record(self.output, inputs)
+        manifest.save(self.manifest_path)
+
+        reloaded = BuildManifest.load(self.manifest_path)
+        self.assertTrue(reloaded.is_fresh(self.output, reloaded.page_inputs(self.source, self.template, "/")))
+
+    def test_changed_inputs_are_not_fresh(self):
+        manifest = BuildManifest()
+        manifest.record(self.output, manifest.page_inputs(self.source, self.template, "/"))
+        manifest.save(self.manifest_path)
+
+        reloaded = BuildManifest.load(self.manifest_path)
+        # A different basepath must rebuild the page
+        self.assertFalse(reloaded.is_fresh(self.output, reloaded.page_inputs(self.source, self.template, "/blog/")))
+
+        with open(self.source, "w") as f:
+            f.write("# Changed")
+        reloaded = BuildManifest.load(self.manifest_path)
+        self.assertFalse(reloaded.is_fresh(self.output, reloaded.page_inputs(self.source, self.template, "/")))
+
+    def test_assets_no_longer_built_are_dropped(self):
+        # The page embedded a fingerprinted image that this build replaced
+        old_image = os.path.join(self.dir, "docs", "a.1111111111.png")
+        new_image = os.path.join(self.dir, "docs", "a.2222222222.png")
+        previous = BuildManifest()
+        previous.record(old_image, {"inputs": {}})
+        previous.record(self.output, previous.page_inputs(self.source, self.template, "/", [old_image]))
+
+        manifest = BuildManifest(previous.current)
+        self.assertEqual(manifest.previous_assets(self.output, self.source, self.template), [])
+        manifest.record(new_image, {"inputs": {}})
+        manifest.record(old_image, {"inputs": {}})
+        self.assertEqual(manifest.previous_assets(self.output, self.source, self.template), [old_image])
+
+    def test_asset_hashes_are_reused_while_size_and_mtime_match(self):
+        image = os.path.join(self.dir, "docs", "a.png")
+        with open(image, "w") as f:
+            f.write("png")
+        manifest = BuildManifest()
+        inputs = manifest.page_inputs(self.source, self.template, "/", [image])
+        manifest.save(self.manifest_path)
+
+        # Same size and mtime: the recorded hash is trusted without reading
+        # the file
+        stat = os.stat(image)
+        with open(image, "w") as f:
+            f.write("gif")
+        os.utime(image, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        reloaded = BuildManifest.load(self.manifest_path)
+        self.assertEqual(reloaded.page_inputs(self.source, self.template, "/", [image]), inputs)
+
+        os.utime(image, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        reloaded = BuildManifest.load(self.manifest_path)
+        self.assertNotEqual(reloaded.page_inputs(self.source, self.template, "/", [image]), inputs)
+
+    def test_missing_output_is_not_fresh(self):
+        manifest = BuildManifest()
+        inputs = manifest.page_inputs(self.source, self.template, "/")
+        manifest.record(self.output, inputs)
+        os.remove(self.output)
+        self.assertFalse(BuildManifest(manifest.current).is_fresh(self.output, inputs))
+
+    def test_version_mismatch_discards_manifest(self):
+        with open(self.manifest_path, "w") as f:
+            f.write('{"version": "old-%s", "outputs": {"a": {}}}' % GENERATOR_VERSION)
+        self.assertEqual(BuildManifest.load(self.manifest_path).previous, {})
+
+    def test_versioned_json(self):
+        save_versioned_json(self.manifest_path, 3, {"entries": [1, 2]})
+        self.assertEqual(load_versioned_json(self.manifest_path, 3),
+                         {"version": GENERATOR_VERSION, "format": 3, "entries": [1, 2]})
+        # Another format, a file without one, or no file at all: start over
+        self.assertIsNone(load_versioned_json(self.manifest_path, 4))
+        self.assertIsNone(load_versioned_json(self.manifest_path))
+        self.assertIsNone(load_versioned_json(os.path.join(self.dir, "missing.json")))
+        with open(self.manifest_path, "w") as f:
+            f.write("[1, 2")
+        self.assertIsNone(load_versioned_json(self.manifest_path, 3))
+        self.assertEqual(sorted(os.listdir(self.dir)), ["docs", "index.md", "manifest.json", "template.html"])
+
+    def test_prune_removes_outputs_without_sources(self):
+        manifest = BuildManifest({self.output: {"source": "gone"}})
+        removed = manifest.prune(os.path.join(self.dir, "docs"))
+        self.assertEqual(removed, [self.output])
+        self.assertFalse(os.path.exists(self.output))
+        # The emptied directory is the output directory itself, so it stays
+        self.assertTrue(os.path.isdir(os.path.join(self.dir, "docs")))
+
+
+if __name__ == "__main__":
+    unittest.main()
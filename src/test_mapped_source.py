@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+
+from mapped_source import MappedMarkdown
+from textnode import iter_blocks, iter_lines
+
+
+class TestMappedMarkdown(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, data):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_blocks_match_text_scanner(self):
+        md = "Intro\n\n\n# Título\n\n  - a\n- b  \n\n \n\n1. x\n2. y\n\n```\ncode\n```\n"
+        path = self.write("page.md", md.encode())
+        with MappedMarkdown.open(path) as source:
+            self.assertEqual(list(source.iter_blocks()), list(iter_blocks(iter_lines(md))))
+            self.assertEqual(source.title(), "Título")
+
+    def test_title_on_first_line(self):
+        path = self.write("page.md", b"# First\n\n# Second")
+        with MappedMarkdown.open(path) as source:
+            self.assertEqual(source.title(), "First")
+
+    def test_missing_title_raises(self):
+        path = self.write("page.md", b"no title\n#not one either")
+        with MappedMarkdown.open(path) as source:
+            with self.assertRaises(Exception):
+                source.title()
+
+    def test_body_is_a_view_past_the_front_matter(self):
+        path = self.write("page.md", b"---\ntitle: T\n---\n# Body\n\ntext")
+        with MappedMarkdown.open(path) as source:
+            with source.body() as body:
+                self.assertIsInstance(body, memoryview)
+                self.assertEqual(body.obj, source.data)
+                self.assertEqual(bytes(body), b"# Body\n\ntext")
+        # The view was released, so the mapping could be closed
+        self.assertTrue(source.data.closed)
+
+    def test_unmappable_files_fall_back(self):
+        self.assertIsNone(MappedMarkdown.open(self.write("empty.md", b"")))
+        self.assertIsNone(MappedMarkdown.open(self.write("crlf.md", b"# A\r\n\r\nb")))
+
+
+if __name__ == "__main__":
+    unittest.main()
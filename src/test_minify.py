@@ -0,0 +1,45 @@
+import unittest
+
+from minify import minify_html, minify_css, minifier_for
+from template import Template
+
+
+class TestMinifyHTML(unittest.TestCase):
+    def test_whitespace_is_collapsed_and_dropped_around_blocks(self):
+        html = "<div>\n    <p>Some  <b>bold</b>\n  text</p>\n</div>\n"
+        self.assertEqual(minify_html(html), "<div><p>Some <b>bold</b> text</p></div>")
+
+    def test_comments_are_stripped(self):
+        self.assertEqual(minify_html("<p>a</p><!-- note\n --><p>b</p>"), "<p>a</p><p>b</p>")
+        # Conditional comments mean something to old browsers
+        self.assertEqual(minify_html("<!--[if IE]><p>x</p><![endif]-->"), "<!--[if IE]><p>x</p><![endif]-->")
+
+    def test_pre_contents_are_preserved(self):
+        code = "<pre><code>  if x:\n\n      <!-- y -->  pass\n</code></pre>"
+        self.assertEqual(minify_html(f"<div>\n  {code}\n</div>"), f"<div>{code}</div>")
+
+    def test_style_contents_are_minified(self):
+        self.assertEqual(minify_html("<style>\n  p { color : red; }\n</style>"), "<style>p{color:red}</style>")
+
+    def test_template_slots_survive(self):
+        template = Template("<title>\n  {{ Title }}\n</title>\n<article>\n  {{ Content }}\n</article>\n", minify=True)
+        self.assertEqual(template.render(Title="Hi", Content="<p>x</p>"), "<title>Hi</title><article><p>x</p></article>")
+
+
+class TestMinifyCSS(unittest.TestCase):
+    def test_comments_whitespace_and_last_semicolon(self):
+        css = "/* theme */\nbody {\n  margin: 0 auto;\n  color : #fff;\n}\n\nh1, h2 > b {\n  color: red;\n}\n"
+        self.assertEqual(minify_css(css), "body{margin:0 auto;color:#fff}h1,h2>b{color:red}")
+
+    def test_strings_and_selectors_are_kept(self):
+        self.assertEqual(minify_css('a :hover { content: "a  ;  b" }'), 'a :hover{content:"a  ;  b"}')
+        self.assertEqual(minify_css("p { width: calc(1px + 2px) }"), "p{width:calc(1px + 2px)}")
+
+    def test_minifier_for(self):
+        self.assertIs(minifier_for("docs/index.css"), minify_css)
+        self.assertIs(minifier_for("docs/a.html"), minify_html)
+        self.assertIsNone(minifier_for("docs/a.png"))
+
+
+if __name__ == "__main__":
+    unittest.main()
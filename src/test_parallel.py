@@ -0,0 +1,87 @@
+import io
+import os
+import json
+import tempfile
+import unittest
+import contextlib
+
+from parallel import make_batches, generate_pages_parallel
+from main import generate_pages_recursive, main as build
+from markdown import set_template_registry
+
+
+class TestParallel(unittest.TestCase):
+    def test_make_batches_covers_every_page_once(self):
+        pages = [(f"{i}.md", f"{i}.html") for i in range(10)]
+        batches = make_batches(pages, jobs=4, batch_size=64)
+        self.assertEqual([page for batch in batches for page in batch], pages)
+        self.assertEqual(len(batches), 4)
+
+    def test_errors_are_collected_per_page(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            template = os.path.join(tmp, "template.html")
+            with open(template, "w") as f:
+                f.write("<title>{{ Title }}</title>{{ Content }}")
+            good = os.path.join(tmp, "good.md")
+            with open(good, "w") as f:
+                f.write("# Good page")
+            # No h1 header, so generating this page raises
+            bad = os.path.join(tmp, "bad.md")
+            with open(bad, "w") as f:
+                f.write("no title here")
+
+            pages = [(good, os.path.join(tmp, "out", "good.html")), (bad, os.path.join(tmp, "out", "bad.html"))]
+            errors = generate_pages_parallel(pages, template, "/", jobs=2)
+
+            self.assertEqual([dest for dest, _ in errors], [os.path.join(tmp, "out", "bad.html")])
+            with open(os.path.join(tmp, "out", "good.html")) as f:
+                self.assertEqual(f.read(), "<title>Good page</title><div><h1>Good page</h1></div>")
+
+    def test_serial_build_collects_errors_too(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            template = os.path.join(tmp, "template.html")
+            with open(template, "w") as f:
+                f.write("<title>{{ Title }}</title>{{ Content }}")
+            content = os.path.join(tmp, "content")
+            os.makedirs(content)
+            with open(os.path.join(content, "good.md"), "w") as f:
+                f.write("# Good page")
+            with open(os.path.join(content, "bad.md"), "w") as f:
+                f.write("no title here")
+
+            out = os.path.join(tmp, "out")
+            errors = generate_pages_recursive(content, template, out, "/", jobs=1)
+            self.assertEqual([dest for dest, _ in errors], [os.path.join(out, "bad.html")])
+            self.assertTrue(os.path.exists(os.path.join(out, "good.html")))
+
+    def test_unknown_layout_fails_only_its_page(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                os.makedirs("content")
+                with open("template.html", "w") as f:
+                    f.write("<title>{{ Title }}</title>{{ Content }}")
+                with open(os.path.join("content", "index.md"), "w") as f:
+                    f.write("# Home")
+                with open(os.path.join("content", "bad.md"), "w") as f:
+                    f.write("---\nlayout: nope\n---\n# Bad")
+
+                stderr = io.StringIO()
+                with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(stderr):
+                    with self.assertRaises(SystemExit) as raised:
+                        build(["/", "--incremental"])
+                self.assertEqual(raised.exception.code, 1)
+                self.assertIn("Failed: docs/bad.html: ValueError: Unknown layout: nope", stderr.getvalue())
+                self.assertTrue(os.path.exists(os.path.join("docs", "index.html")))
+                self.assertFalse(os.path.exists(os.path.join("docs", "bad.html")))
+                # Retried on the next build
+                with open(".build_manifest.json") as f:
+                    self.assertEqual(json.load(f)["outputs"][os.path.join("docs", "bad.html")], {"failed": True})
+            finally:
+                set_template_registry(None)
+                os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    unittest.main()
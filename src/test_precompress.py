@@ -0,0 +1,50 @@
+import os
+import gzip
+import tempfile
+import unittest
+
+from manifest import BuildManifest
+from precompress import precompress, compress
+
+
+class TestPrecompress(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        for name, data in (("index.html", b"<p>hello</p>" * 50), ("style.css", b"body {}"), ("pic.png", b"\x89PNG")):
+            with open(os.path.join(self.dir, name), "wb") as f:
+                f.write(data)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_writes_variants_of_text_outputs_only(self):
+        precompress(self.dir, formats=["gzip"])
+        self.assertEqual(sorted(os.listdir(self.dir)),
+                         ["index.html", "index.html.gz", "pic.png", "style.css", "style.css.gz"])
+        with gzip.open(os.path.join(self.dir, "index.html.gz")) as f:
+            self.assertEqual(f.read(), b"<p>hello</p>" * 50)
+
+    def test_output_is_reproducible(self):
+        self.assertEqual(compress(b"abc" * 100, "gzip"), compress(b"abc" * 100, "gzip"))
+
+    def test_unchanged_outputs_are_skipped(self):
+        def build(previous):
+            manifest = BuildManifest(previous)
+            for name in ("index.html", "style.css"):
+                manifest.record(os.path.join(self.dir, name), {})
+            return manifest, precompress(self.dir, manifest, ["gzip"])
+
+        manifest, written = build({})
+        self.assertEqual(written, 2)
+        manifest, written = build(manifest.current)
+        self.assertEqual(written, 0)
+
+        with open(os.path.join(self.dir, "style.css"), "wb") as f:
+            f.write(b"body { margin: 0 }")
+        _, written = build(manifest.current)
+        self.assertEqual(written, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
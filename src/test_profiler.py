@@ -0,0 +1,51 @@
+import io
+import os
+import json
+import tempfile
+import unittest
+
+from profiler import BuildProfiler, NULL_PROFILER, TimedWriter
+
+
+class TestBuildProfiler(unittest.TestCase):
+    def test_stage_totals_and_slowest_pages(self):
+        profiler = BuildProfiler()
+        profiler.add("parse", "a.html", 0, 3_000_000, 2_000_000)
+        profiler.add("parse", "b.html", 0, 1_000_000, 1_000_000)
+        profiler.add("write", "b.html", 0, 5_000_000, 0)
+        with profiler.stage("static"):
+            pass
+
+        self.assertEqual(profiler.stage_totals()["parse"], [4_000_000, 3_000_000])
+        self.assertEqual(profiler.page_totals(), {"a.html": 3_000_000, "b.html": 6_000_000})
+
+        report = profiler.report(top=1)
+        self.assertIn("Slowest 1 pages", report)
+        self.assertIn("b.html", report)
+        self.assertNotIn("a.html", report)
+
+    def test_write_trace(self):
+        profiler = BuildProfiler()
+        with profiler.stage("parse", "a.html"):
+            pass
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.json")
+            profiler.write_trace(path)
+            with open(path) as f:
+                events = json.load(f)["traceEvents"]
+        self.assertEqual(events[0]["name"], "parse")
+        self.assertEqual(events[0]["ph"], "X")
+        self.assertEqual(events[0]["args"]["page"], "a.html")
+
+    def test_null_profiler_and_timed_writer(self):
+        with NULL_PROFILER.stage("parse"):
+            pass
+        out = io.StringIO()
+        writer = TimedWriter(out)
+        writer.write("hello")
+        self.assertEqual(out.getvalue(), "hello")
+        self.assertGreaterEqual(writer.wall, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
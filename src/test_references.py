@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+
+from references import ReferenceIndex, collect_references, check_references
+from markdown import markdown_to_html_node, set_inline_cache, set_render_cache, render_content
+from inline_cache import InlineCache
+from render_cache import RenderCache
+
+MARKDOWN = "# Title\n\n[home](/) and ![pic](/images/pic.png)\n\n- [ext](https://example.com)"
+EXPECTED = [("link", "/"), ("image", "/images/pic.png"), ("link", "https://example.com")]
+
+
+class TestReferences(unittest.TestCase):
+    def tearDown(self):
+        set_inline_cache(None)
+        set_render_cache(None)
+
+    def test_parsing_records_links_and_images(self):
+        with collect_references() as references:
+            markdown_to_html_node(MARKDOWN)
+        self.assertEqual(references, EXPECTED)
+
+    def test_cache_hits_still_report_references(self):
+        set_inline_cache(InlineCache(16))
+        with tempfile.TemporaryDirectory() as tmp:
+            set_render_cache(RenderCache(os.path.join(tmp, "cache")))
+            for _ in range(2):
+                with collect_references() as references:
+                    render_content(MARKDOWN)
+                self.assertEqual(references, EXPECTED)
+            # The inline cache alone must also replay them
+            set_render_cache(None)
+            with collect_references() as references:
+                markdown_to_html_node(MARKDOWN)
+            self.assertEqual(references, EXPECTED)
+
+    def test_check_references_reports_missing_targets(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, "blog", "post"))
+            for path in ("index.html", os.path.join("blog", "post", "index.html"), "style.css"):
+                open(os.path.join(tmp, path), "w").close()
+            page = os.path.join(tmp, "blog", "post", "index.html")
+            index = ReferenceIndex()
+            index.add(page, [("link", "/"), ("link", "/blog/post"), ("link", "../../style.css"),
+                             ("link", "/missing"), ("image", "/images/gone.png"), ("link", "https://example.com"),
+                             ("link", "#top"), ("link", "mailto:me@example.com")])
+            broken = check_references(index, tmp)
+            self.assertEqual(broken, [(page, "link", "/missing"), (page, "image", "/images/gone.png")])
+            self.assertEqual(index.incoming()["/missing"], [page])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+
+from render_cache import RenderCache
+from markdown import generate_page, set_render_cache
+
+
+class TestRenderCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = RenderCache(os.path.join(self.tmp.name, "cache"))
+
+    def tearDown(self):
+        set_render_cache(None)
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        key = self.cache.key("# Hello")
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, "<div><h1>Hello</h1></div>")
+        self.assertEqual(self.cache.get(key), "<div><h1>Hello</h1></div>")
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.assertNotEqual(key, self.cache.key("# Hello!"))
+
+    def test_evict_keeps_store_under_limit(self):
+        cache = RenderCache(self.cache.directory, max_bytes=0)
+        cache.put(cache.key("a"), "x" * 1000)
+        cache.put(cache.key("b"), "y" * 1000)
+        self.assertEqual(cache.evict(), 2)
+        self.assertIsNone(cache.get(cache.key("a")))
+
+    def test_generate_page_uses_cache(self):
+        source = os.path.join(self.tmp.name, "index.md")
+        template = os.path.join(self.tmp.name, "template.html")
+        dest = os.path.join(self.tmp.name, "out", "index.html")
+        with open(source, "w") as f:
+            f.write("# Hello\n\n[home](/)")
+        with open(template, "w") as f:
+            f.write("<title>{{ Title }}</title>{{ Content }}")
+
+        set_render_cache(self.cache)
+        generate_page(source, template, dest, "/site/")
+        with open(dest) as f:
+            first = f.read()
+        generate_page(source, template, dest, "/site/")
+        with open(dest) as f:
+            second = f.read()
+
+        self.assertEqual(first, second)
+        self.assertIn('href="/site/"', second)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import argparse
+import tempfile
+import unittest
+
+from references import ReferenceIndex
+from sharding import Shard, parse_shard, shard_key, owns, write_shard_manifest, verify_shards, merge_shards
+
+
+class TestSharding(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.outputs = ["index.html", "index.html.gz", "blog/a/index.html", "blog/b/index.html", "index.css",
+                        "images/a.png", "atom.xml"]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build_shard(self, shard, outputs=None):
+        # Write the outputs a shard owns, as the build would, with its manifest
+        output_dir = os.path.join(self.tmp.name, f"shard{shard.index}")
+        built = []
+        for rel_path in outputs if outputs is not None else self.outputs:
+            path = os.path.join(output_dir, rel_path)
+            if outputs is None and not owns(shard, path, output_dir):
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(rel_path)
+            built.append(path)
+        os.makedirs(output_dir, exist_ok=True)
+        expected = [os.path.join(output_dir, rel_path) for rel_path in self.outputs]
+        write_shard_manifest(shard, output_dir, built, expected, ReferenceIndex(), "/")
+        return output_dir
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("2/4"), Shard(2, 4))
+        for text in ("0/4", "5/4", "2", "a/b"):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                parse_shard(text)
+
+    def test_every_output_has_exactly_one_owner(self):
+        for count in (1, 2, 3, 7):
+            for rel_path in self.outputs:
+                path = os.path.join("docs", rel_path)
+                owners = [index for index in range(1, count + 1) if owns(Shard(index, count), path, "docs")]
+                self.assertEqual(len(owners), 1)
+        # Compressed variants go with the file they're compressed from
+        self.assertEqual(shard_key(os.path.join("docs", "index.html.gz"), "docs"), "index.html")
+        for index in (1, 2, 3):
+            self.assertEqual(owns(Shard(index, 3), "docs/index.html.br", "docs"),
+                             owns(Shard(index, 3), "docs/index.html", "docs"))
+
+    def test_merge_combines_shards(self):
+        shards = [self.build_shard(Shard(index, 3)) for index in (1, 2, 3)]
+        output_dir = os.path.join(self.tmp.name, "docs")
+        self.assertEqual(merge_shards(shards, output_dir), [])
+        for rel_path in self.outputs:
+            with open(os.path.join(output_dir, rel_path)) as f:
+                self.assertEqual(f.read(), rel_path)
+
+    def test_problems_are_reported(self):
+        shards = [self.build_shard(Shard(index, 3)) for index in (1, 2)]
+        problems, _ = verify_shards(shards)
+        self.assertIn("Shard 3/3 is missing", problems)
+        self.assertTrue(any(problem.startswith("Missing: ") for problem in problems))
+
+        # A shard that built everything duplicates the others' outputs
+        everything = self.build_shard(Shard(3, 3), self.outputs)
+        problems, _ = verify_shards(shards + [everything])
+        self.assertTrue(any(problem.startswith("Duplicated: ") for problem in problems))
+
+        # Files that changed or appeared after the shard was built
+        with open(os.path.join(everything, "index.css"), "a") as f:
+            f.write("!")
+        with open(os.path.join(everything, "extra.html"), "w") as f:
+            f.write("")
+        problems, _ = verify_shards([everything])
+        self.assertTrue(any(problem.startswith("Changed since its shard built it: ") for problem in problems))
+        self.assertTrue(any(problem.startswith("Stray file: ") for problem in problems))
+        self.assertNotEqual(merge_shards([everything], os.path.join(self.tmp.name, "docs")), [])
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, "docs")))
+
+
+if __name__ == "__main__":
+    unittest.main()
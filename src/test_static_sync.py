@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+
+from manifest import BuildManifest
+from static_sync import sync_static
+
+
+class TestSyncStatic(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self.tmp.name, "static")
+        self.dst = os.path.join(self.tmp.name, "docs")
+        os.makedirs(os.path.join(self.src, "images"))
+        self.write(os.path.join(self.src, "index.css"), "body {}")
+        self.write(os.path.join(self.src, "images", "a.png"), "png")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, path, text):
+        with open(path, "w") as f:
+            f.write(text)
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def sync(self, manifest, **kwargs):
+        sync_static(self.src, self.dst, manifest, **kwargs)
+        return manifest
+
+    def test_copies_then_skips_unchanged(self):
+        manifest = self.sync(BuildManifest())
+        self.assertEqual(self.read(os.path.join(self.dst, "images", "a.png")), "png")
+        self.assertEqual(len(manifest.current), 2)
+
+        # Copies keep the source mtime, so the next sync sees them as current
+        css_out = os.path.join(self.dst, "index.css")
+        self.assertEqual(os.stat(css_out).st_mtime_ns, os.stat(os.path.join(self.src, "index.css")).st_mtime_ns)
+        copied = sync_static(self.src, self.dst, BuildManifest(manifest.current))
+        self.assertEqual(copied, 0)
+
+    def test_changed_file_is_copied(self):
+        manifest = self.sync(BuildManifest())
+        css = os.path.join(self.src, "index.css")
+        self.write(css, "body { color: red }")
+        copied = sync_static(self.src, self.dst, BuildManifest(manifest.current))
+        self.assertEqual(copied, 1)
+        self.assertEqual(self.read(os.path.join(self.dst, "index.css")), "body { color: red }")
+
+    def test_hash_compare_and_links(self):
+        manifest = self.sync(BuildManifest(), compare="hash", link=True)
+        self.assertEqual(self.read(os.path.join(self.dst, "index.css")), "body {}")
+        copied = sync_static(self.src, self.dst, BuildManifest(manifest.current), compare="hash")
+        self.assertEqual(copied, 0)
+
+    def test_minify_writes_minified_css(self):
+        self.write(os.path.join(self.src, "index.css"), "body {\n  margin: 0;\n}\n")
+        manifest = self.sync(BuildManifest(), minify=True)
+        self.assertEqual(self.read(os.path.join(self.dst, "index.css")), "body{margin:0}")
+        self.assertEqual(self.read(os.path.join(self.dst, "images", "a.png")), "png")
+        copied = sync_static(self.src, self.dst, BuildManifest(manifest.current), minify=True)
+        self.assertEqual(copied, 0)
+        # Turning minification off copies the file as written again
+        copied = sync_static(self.src, self.dst, BuildManifest(manifest.current))
+        self.assertEqual(copied, 1)
+        self.assertEqual(self.read(os.path.join(self.dst, "index.css")), "body {\n  margin: 0;\n}\n")
+
+    def test_outputs_named_like_temporary_files_survive(self):
+        # Writing index.css must not go through docs/index.css.tmp, which is
+        # another file's output here
+        self.write(os.path.join(self.src, "index.css.tmp"), "kept")
+        for options in ({}, {"link": True}, {"minify": True}):
+            with self.subTest(**options):
+                self.write(os.path.join(self.src, "index.css"), "body {}")
+                self.sync(BuildManifest(), **options)
+                self.assertEqual(self.read(os.path.join(self.dst, "index.css.tmp")), "kept")
+                self.assertEqual(self.read(os.path.join(self.dst, "index.css")),
+                                 "body{}" if options.get("minify") else "body {}")
+                self.assertEqual(sorted(os.listdir(self.dst)), ["images", "index.css", "index.css.tmp"])
+
+    def test_deleted_assets_are_pruned(self):
+        manifest = self.sync(BuildManifest())
+        os.remove(os.path.join(self.src, "images", "a.png"))
+        manifest = self.sync(BuildManifest(manifest.current))
+        manifest.prune(self.dst)
+        self.assertFalse(os.path.exists(os.path.join(self.dst, "images")))
+        self.assertTrue(os.path.exists(os.path.join(self.dst, "index.css")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import io
+import os
+import pickle
+import tempfile
+import unittest
+
+from template import Template, TemplateRegistry, load_template, rewrite_paths
+
+
+class TestTemplate(unittest.TestCase):
+    def test_render_fills_slots(self):
+        template = Template("<title>{{ Title }}</title><article>{{ Content }}</article>")
+        self.assertEqual(
+            template.render(Title="Hi", Content="<p>Body</p>"),
+            "<title>Hi</title><article><p>Body</p></article>",
+        )
+
+    def test_unknown_slots_are_left_alone(self):
+        template = Template("{{ Title }} {{ Footer }}")
+        self.assertEqual(template.render(Title="Hi"), "Hi {{ Footer }}")
+
+    def test_basepath_applied_at_compile_time(self):
+        template = Template('<link href="/index.css" /><img src="/a.png" />{{ Content }}', "/site/")
+        self.assertEqual(template.segments[0], '<link href="/site/index.css" /><img src="/site/a.png" />')
+        # Slot values are inserted as-is
+        self.assertEqual(template.render(Content='<a href="/x">'), '<link href="/site/index.css" /><img src="/site/a.png" /><a href="/x">')
+
+    def test_write_streams_chunked_slots(self):
+        template = Template("<title>{{ Title }}</title><article>{{ Content }}</article>")
+        out = io.StringIO()
+        template.write(out, Title="Hi", Content=iter(["<p>", "Body", "</p>"]))
+        self.assertEqual(out.getvalue(), template.render(Title="Hi", Content="<p>Body</p>"))
+
+    def test_rewrite_paths(self):
+        self.assertEqual(rewrite_paths('<a href="/x">', "/"), '<a href="/x">')
+        self.assertEqual(rewrite_paths('<a href="/x"><img src="/y">', "/b/"), '<a href="/b/x"><img src="/b/y">')
+        self.assertEqual(rewrite_paths('<a href="https://x">', "/b/"), '<a href="https://x">')
+
+    def test_load_template_is_cached(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "template.html")
+            with open(path, "w") as f:
+                f.write("{{ Content }}")
+            self.assertIs(load_template(path, "/"), load_template(path, "/"))
+            self.assertIsNot(load_template(path, "/"), load_template(path, "/other/"))
+
+    def test_registry_picks_named_then_section_then_default_layout(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            def write(rel_path, text):
+                path = os.path.join(tmp, rel_path)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w") as f:
+                    f.write(text)
+                return path
+
+            default = write("template.html", "{{ Content }}")
+            blog = write(os.path.join("layouts", "blog.html"), "<main>{{ Content }}</main>")
+            post = write(os.path.join("layouts", "post.html"), "<article>{{ Content }}</article>")
+            content = os.path.join(tmp, "content")
+            registry = TemplateRegistry(default, "/", content, os.path.join(tmp, "layouts"))
+
+            self.assertEqual(registry.layout_path(os.path.join(content, "index.md")), default)
+            self.assertEqual(registry.layout_path(os.path.join(content, "blog", "a", "index.md")), blog)
+            self.assertEqual(registry.layout_path(os.path.join(content, "index.md"), {"layout": "post"}), post)
+            with self.assertRaises(ValueError):
+                registry.layout_path(os.path.join(content, "index.md"), {"layout": "missing"})
+
+            # Compiled once, and still usable after a round trip to a worker
+            copy = pickle.loads(pickle.dumps(registry))
+            self.assertEqual(copy.select(os.path.join(content, "blog", "x.md")).render(Content="x"), "<main>x</main>")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,7 @@ import unittest
 
 from src.textnode import extract_markdown_images, text_to_textnodes, markdown_to_blocks, block_to_block_type, BlockType
 from textnode import TextNode, TextType, text_node_to_html_node, extract_markdown_links, extract_markdown_images, split_nodes_image
+from textnode import iter_blocks, iter_lines
 
 class TestTextNode(unittest.TestCase):
     def test_eq(self):
@@ -15,6 +16,11 @@ class TestTextNode(unittest.TestCase):
         node2 = TextNode("This is bold text", TextType.Bold_text)
         self.assertNotEqual(node, node2)
 
+    def test_rejects_unknown_attributes(self):
+        node = TextNode("text", TextType.Normal_text)
+        with self.assertRaises(AttributeError):
+            node.colour = "red"
+
     def test_text(self):
         node = TextNode("This is a text node", TextType.Normal_text)
         html_node = text_node_to_html_node(node)
@@ -208,4 +214,28 @@ class TestBlockToBlockType(unittest.TestCase):
         self.assertEqual(block_to_block_type("1. First item\nSecond line without number"), BlockType.Paragraph)
 
     if __name__ == "__main__":
-        unittest.main()
\ No newline at end of file
+        unittest.main()
+
+
+class TestIterBlocks(unittest.TestCase):
+    def test_blocks_are_typed_while_scanning(self):
+        md = "# Title\n\n  Some **text**\nmore text  \n\n\n- a\n- b\n\n1. one\n2. two\n\n> quote\n\n```\ncode\n```\n"
+        self.assertEqual(
+            list(iter_blocks(iter_lines(md))),
+            [
+                ("heading", "# Title"),
+                ("paragraph", "Some **text**\nmore text"),
+                ("unordered_list", "- a\n- b"),
+                ("ordered_list", "1. one\n2. two"),
+                ("quote", "> quote"),
+                ("code", "```\ncode\n```"),
+            ],
+        )
+
+    def test_reads_file_lines(self):
+        lines = iter(["# Title\n", "\n", "   \n", "para\n"])
+        self.assertEqual(list(iter_blocks(lines)), [("heading", "# Title"), ("paragraph", "para")])
+
+    def test_matches_markdown_to_blocks(self):
+        md = "\n\n a \n\n\n\nb\n \nc\n\n"
+        self.assertEqual([block for _, block in iter_blocks(iter_lines(md))], markdown_to_blocks(md))
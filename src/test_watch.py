@@ -0,0 +1,219 @@
+import io
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from watch import diff_snapshots, merge_changes, rebuild, watch, PollingWatcher, WatchSession
+from manifest import DEFAULT_MANIFEST_PATH
+from markdown import set_template_registry
+
+
+class TestWatch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        os.makedirs(os.path.join("content", "blog"))
+        os.makedirs("static")
+        self.write("template.html", "<title>{{ Title }}</title>{{ Content }}")
+        self.write(os.path.join("content", "index.md"), "# Home")
+        self.write(os.path.join("content", "blog", "post.md"), "# Post")
+        self.write(os.path.join("static", "index.css"), "body {}")
+
+    def tearDown(self):
+        set_template_registry(None)
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def write(self, path, text):
+        with open(path, "w") as f:
+            f.write(text)
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def test_diff_snapshots(self):
+        old = {"a": (1, 1), "b": (1, 1)}
+        new = {"a": (2, 1), "c": (1, 1)}
+        self.assertEqual(diff_snapshots(old, new), ({"a", "c"}, {"b"}))
+
+    def test_merge_changes_keeps_the_latest(self):
+        self.assertEqual(merge_changes({"a", "b"}, {"c"}, {"c"}, {"a"}), ({"b", "c"}, {"a"}))
+
+    def test_poller_lists_only_changed_directories(self):
+        watcher = PollingWatcher(full_scan=3600)
+        post = os.path.join("content", "blog", "post.md")
+        self.assertIn(post, watcher.snapshot())
+        new = os.path.join("content", "blog", "new.md")
+        self.write(new, "# New")
+        os.remove(os.path.join("static", "index.css"))
+        os.makedirs(os.path.join("content", "docs"))
+        self.write(os.path.join("content", "docs", "a.md"), "# A")
+        self.assertEqual(watcher.poll(0), ({new, os.path.join("content", "docs", "a.md")},
+                                           {os.path.join("static", "index.css")}))
+        self.assertEqual(watcher.poll(0), (set(), set()))
+
+        # Only directories whose mtime moved are listed again
+        scanned = []
+        scan = watcher._scan_directory
+        watcher._scan_directory = lambda directory, *args: (scanned.append(directory), scan(directory, *args))
+        self.write(os.path.join("content", "blog", "other.md"), "# Other")
+        watcher.poll(0)
+        self.assertEqual(scanned, [os.path.join("content", "blog")])
+
+    def test_poller_finds_edits_in_place_on_full_scans(self):
+        watcher = PollingWatcher(full_scan=0)
+        post = os.path.join("content", "blog", "post.md")
+        self.write(post, "# Post, edited")
+        self.write("template.html", "{{ Content }}")
+        self.assertEqual(watcher.poll(0), ({post, "template.html"}, set()))
+
+    def test_poller_forgets_removed_directories(self):
+        watcher = PollingWatcher(full_scan=3600)
+        post = os.path.join("content", "blog", "post.md")
+        os.remove(post)
+        os.rmdir(os.path.join("content", "blog"))
+        self.assertEqual(watcher.poll(0), (set(), {post}))
+        self.assertNotIn(os.path.join("content", "blog"), watcher.directories)
+
+    def test_rebuild_only_changed_page(self):
+        rebuild()
+        index = os.path.join("docs", "index.html")
+        before = os.stat(index).st_mtime_ns
+        self.write(os.path.join("content", "blog", "post.md"), "# Post, edited")
+        rebuild()
+        self.assertEqual(self.read(os.path.join("docs", "blog", "post.html")),
+                         "<title>Post, edited</title><div><h1>Post, edited</h1></div>")
+        self.assertEqual(os.stat(index).st_mtime_ns, before)
+
+    def test_front_matter_layout(self):
+        # Rebuilds go through the whole build, which reads the front matter
+        os.makedirs("layouts")
+        self.write(os.path.join("layouts", "post.html"), "<article>{{ Content }}</article>")
+        self.write(os.path.join("content", "index.md"), "---\nlayout: post\n---\n# Home")
+        rebuild()
+        self.assertEqual(self.read(os.path.join("docs", "index.html")), "<article><div><h1>Home</h1></div></article>")
+
+    def test_build_options_are_passed_on(self):
+        rebuild("/", ["--fingerprint"])
+        self.assertTrue(os.path.exists(os.path.join("docs", "asset-manifest.json")))
+
+    def test_removed_sources_remove_outputs(self):
+        css = os.path.join("static", "index.css")
+        rebuild()
+        self.assertEqual(self.read(os.path.join("docs", "index.css")), "body {}")
+        os.remove(css)
+        rebuild()
+        self.assertFalse(os.path.exists(os.path.join("docs", "index.css")))
+
+    def test_failed_build_keeps_watching(self):
+        self.write(os.path.join("content", "index.md"), "---\nlayout: missing\n---\n# Home")
+        self.assertFalse(rebuild())
+
+    def generated(self, session, changed=(), removed=()):
+        # The outputs one round of the session writes
+        out = io.StringIO()
+        with redirect_stdout(out):
+            self.assertTrue(session.update(set(changed), set(removed)))
+        return [line.split(": ", 1)[1] for line in out.getvalue().splitlines() if line.startswith("Generated: ")]
+
+    def test_session_rebuilds_only_dependent_pages(self):
+        os.makedirs("layouts")
+        self.write(os.path.join("layouts", "post.html"), "<article>{{ Content }}</article>")
+        post = os.path.join("content", "blog", "post.md")
+        self.write(post, "---\nlayout: post\n---\n# Post")
+        self.write(os.path.join("content", "about.md"), "# About")
+        session = WatchSession()
+        with redirect_stdout(io.StringIO()):
+            session.start()
+        saved = os.stat(DEFAULT_MANIFEST_PATH).st_mtime_ns
+
+        # A page edit rebuilds that page alone
+        self.write(post, "---\nlayout: post\n---\n# Post, edited")
+        self.assertEqual(self.generated(session, [post]), [os.path.join("docs", "blog", "post.html")])
+        self.assertEqual(self.read(os.path.join("docs", "blog", "post.html")),
+                         "<article><div><h1>Post, edited</h1></div></article>")
+
+        # A layout edit rebuilds the pages using it, and the default template
+        # the rest
+        self.write(os.path.join("layouts", "post.html"), "<main>{{ Content }}</main>")
+        self.assertEqual(self.generated(session, [os.path.join("layouts", "post.html")]),
+                         [os.path.join("docs", "blog", "post.html")])
+        self.write("template.html", "<h2>{{ Title }}</h2>{{ Content }}")
+        self.assertEqual(self.generated(session, ["template.html"]),
+                         [os.path.join("docs", "about.html"), os.path.join("docs", "index.html")])
+
+        # The indexes are written when the session saves, not every round
+        self.assertEqual(os.stat(DEFAULT_MANIFEST_PATH).st_mtime_ns, saved)
+        self.assertTrue(session.dirty)
+        session.save()
+        self.assertFalse(session.dirty)
+        # and leave nothing for the whole build to do
+        out = io.StringIO()
+        with redirect_stdout(out):
+            self.assertTrue(rebuild())
+        self.assertNotIn("Generated:", out.getvalue())
+
+    def test_session_adds_and_removes_sources(self):
+        session = WatchSession()
+        with redirect_stdout(io.StringIO()):
+            session.start()
+        new = os.path.join("content", "blog", "new", "index.md")
+        os.makedirs(os.path.dirname(new))
+        self.write(new, "# New")
+        self.assertEqual(self.generated(session, [os.path.dirname(new)]),
+                         [os.path.join("docs", "blog", "new", "index.html")])
+
+        css = os.path.join("static", "index.css")
+        os.remove(css)
+        self.assertEqual(self.generated(session, [], [os.path.join("content", "blog", "post.md"), css]), [])
+        self.assertFalse(os.path.exists(os.path.join("docs", "blog", "post.html")))
+        self.assertFalse(os.path.exists(os.path.join("docs", "index.css")))
+        self.write(css, "p {}")
+        self.generated(session, [css])
+        self.assertEqual(self.read(os.path.join("docs", "index.css")), "p {}")
+
+    def test_session_writes_only_listings_of_changed_posts(self):
+        post = os.path.join("content", "blog", "post.md")
+        self.write(post, "---\ndate: 2024-01-01\ntags: [a]\n---\n# Post")
+        os.makedirs(os.path.join("content", "news"))
+        self.write(os.path.join("content", "news", "item.md"), "---\ndate: 2024-01-02\ntags: [b]\n---\n# Item")
+        session = WatchSession()
+        with redirect_stdout(io.StringIO()):
+            session.start()
+        self.write(post, "---\ndate: 2024-01-01\ntags: [a]\n---\n# Post, renamed")
+        self.assertEqual(self.generated(session, [post]), [
+            os.path.join("docs", "blog", "post.html"),
+            os.path.join("docs", "blog", "index.html"),
+            os.path.join("docs", "tags", "a", "index.html"),
+            os.path.join("docs", "atom.xml"),
+        ])
+
+    def test_watch_saves_when_it_stops(self):
+        class Watcher:
+            def __init__(self, rounds):
+                self.rounds = rounds
+
+            def poll(self, interval):
+                return self.rounds.pop(0) if self.rounds else (set(), set())
+
+            def stop(self):
+                pass
+
+        session = WatchSession()
+        with redirect_stdout(io.StringIO()):
+            session.start()
+        index = os.path.join("content", "index.md")
+        self.write(index, "# Home, edited")
+        watcher = Watcher([({index}, set())])
+        with redirect_stdout(io.StringIO()):
+            watch(debounce=0, should_stop=lambda: not watcher.rounds, watcher=watcher, session=session,
+                  save_delay=3600)
+        self.assertFalse(session.dirty)
+        self.assertIn(os.path.join("content", "index.md"), self.read(DEFAULT_MANIFEST_PATH))
+
+
+if __name__ == "__main__":
+    unittest.main()
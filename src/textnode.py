@@ -1,7 +1,7 @@
 from enum import Enum
 
 from htmlnode import LeafNode
-import re
+from inline import tokenize_inline
 
 class BlockType(Enum):
     Paragraph = "paragraph"
@@ -21,6 +21,8 @@ class TextType(Enum):
     Images = "images"
 
 class TextNode:
+    __slots__ = ("text", "text_type", "url")
+
     def __init__(self, text, text_type, url=None):
         self.text = text
         self.text_type = text_type
@@ -76,35 +78,38 @@ def split_nodes_delimiter(old_nodes, delimiter, text_type):
             result.append(old_node)
             continue
 
-        # Find chunks that need to be processed
+        # Find chunks that need to be processed, walking the text by index
+        # instead of re-slicing the remainder after every delimiter
         chunks = []
-        remaining_text = text
+        position = 0
 
-        while delimiter in remaining_text:
-            # Find the first occurrence of delimiter
-            start_index = remaining_text.find(delimiter)
+        while True:
+            # Find the next opening delimiter
+            start_index = text.find(delimiter, position)
+            if start_index == -1:
+                break
 
             # Add text before delimiter as normal text if it exists
-            if start_index > 0:
-                chunks.append((remaining_text[:start_index], TextType.Normal_text))
+            if start_index > position:
+                chunks.append((text[position:start_index], TextType.Normal_text))
 
             # Find the closing delimiter
-            remaining_text = remaining_text[start_index + len(delimiter):]
-            end_index = remaining_text.find(delimiter)
+            content_start = start_index + len(delimiter)
+            end_index = text.find(delimiter, content_start)
 
             if end_index == -1:
                 # No closing delimiter found
                 raise ValueError(f"No closing delimiter found for {delimiter}")
 
             # Add the text between delimiters with the specified text type
-            chunks.append((remaining_text[:end_index], text_type))
+            chunks.append((text[content_start:end_index], text_type))
 
-            # Update remaining_text for next iteration
-            remaining_text = remaining_text[end_index + len(delimiter):]
+            # Continue after the closing delimiter
+            position = end_index + len(delimiter)
 
         # Add any remaining text as normal text
-        if remaining_text:
-            chunks.append((remaining_text, TextType.Normal_text))
+        if position < len(text):
+            chunks.append((text[position:], TextType.Normal_text))
 
         # Create TextNode objects from chunks and add to result
         for text_chunk, chunk_type in chunks:
@@ -113,20 +118,41 @@ def split_nodes_delimiter(old_nodes, delimiter, text_type):
     return result
 
 
+# Map the tokenizer's element kinds onto TextType
+TOKEN_TEXT_TYPES = {
+    "text": TextType.Normal_text,
+    "bold": TextType.Bold_text,
+    "italic": TextType.Italic_text,
+    "code": TextType.Code_text,
+    "link": TextType.Links,
+    "image": TextType.Images,
+}
+
+
+# How each kind of token is written in markdown, to put the tokens a split
+# doesn't handle back into plain text. Tokens are exact slices between their
+# delimiters, so this gives back the original text
+TOKEN_SOURCE = {
+    "text": "{}",
+    "bold": "**{}**",
+    "italic": "_{}_",
+    "code": "`{}`",
+    "link": "[{}]({})",
+    "image": "![{}]({})",
+}
+
+
+# Images and links are found by the same tokenizer the renderer uses (see
+# inline.py), so these agree with what ends up on the page: nothing inside
+# code spans or bold text, and "[a [b](c)" is one link with text "a [b"
 def extract_markdown_images(text):
-    pattern = r"!\[([^\[\]]*)\]\(([^\(\)]*)\)"
-    matches = re.findall(pattern, text)
-
-    return matches
+    return [(token_text, url) for kind, token_text, url in tokenize_inline(text) if kind == "image"]
 
 def extract_markdown_links(text):
-    pattern = r"(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)"
-    matches = re.findall(pattern, text)
+    return [(token_text, url) for kind, token_text, url in tokenize_inline(text) if kind == "link"]
 
-    return matches
 
-
-def split_nodes_image(old_nodes):
+def split_nodes_token(old_nodes, token_kind, text_type):
     result = []
 
     for old_node in old_nodes:
@@ -135,152 +161,159 @@ def split_nodes_image(old_nodes):
             result.append(old_node)
             continue
 
-        # Check if there's an image in this text node
-        images = extract_markdown_images(old_node.text)
-
-        # If no image found, keep the node as is
-        if not images:
+        # Every other kind of token goes back into the surrounding text
+        pending = []
+        found = False
+        for kind, token_text, url in tokenize_inline(old_node.text):
+            if kind != token_kind:
+                pending.append(TOKEN_SOURCE[kind].format(token_text, url))
+                continue
+            found = True
+            # Add the before text as a node if not empty
+            if pending:
+                result.append(TextNode("".join(pending), TextType.Normal_text))
+                pending = []
+            # Add the image or link as a node
+            result.append(TextNode(token_text, text_type, url))
+
+        # If nothing matched, keep the node as is
+        if not found:
             result.append(old_node)
-            continue
-
-        # If image found, get the first one
-        image_alt, image_url = images[0]
-        image_markdown = f"![{image_alt}]({image_url})"
-
-        # Split the text into before and after the image
-        sections = old_node.text.split(image_markdown, 1)
-        before_text = sections[0]
-
-        # Add the before text as a node if not empty
-        if before_text:
-            result.append(TextNode(before_text, TextType.Normal_text))
-
-        # Add the image as a node
-        result.append(TextNode(image_alt, TextType.Images, image_url))
-
-        # Handle the after text (which might contain more images)
-        if len(sections) > 1:
-            after_text = sections[1]
-            if after_text:
-                # Recursively check for more images in the after text
-                after_nodes = split_nodes_image([TextNode(after_text, TextType.Normal_text)])
-                result.extend(after_nodes)
+        elif pending:
+            result.append(TextNode("".join(pending), TextType.Normal_text))
 
     return result
 
-def split_nodes_link(old_nodes):
-    result = []
-
-    for old_node in old_nodes:
-        # If not a text node, just add it to results
-        if old_node.text_type != TextType.Normal_text:
-            result.append(old_node)
-            continue
-
-        # Check if there's a link in this text node
-        links = extract_markdown_links(old_node.text)
-
-        # If no link found, keep the node as is
-        if not links:
-            result.append(old_node)
-            continue
-
-        # If link found, get the first one
-        link_text, link_url = links[0]
-        link_markdown = f"[{link_text}]({link_url})"
-
-        # Split the text into before and after the link
-        sections = old_node.text.split(link_markdown, 1)
-        before_text = sections[0]
-
-        # Add the before text as a node if not empty
-        if before_text:
-            result.append(TextNode(before_text, TextType.Normal_text))
-
-        # Add the link as a node
-        result.append(TextNode(link_text, TextType.Links, link_url))
-
-        # Handle the after text (which might contain more links)
-        if len(sections) > 1:
-            after_text = sections[1]
-            if after_text:
-                # Recursively check for more links in the after text
-                after_nodes = split_nodes_link([TextNode(after_text, TextType.Normal_text)])
-                result.extend(after_nodes)
+def split_nodes_image(old_nodes):
+    return split_nodes_token(old_nodes, "image", TextType.Images)
 
-    return result
+def split_nodes_link(old_nodes):
+    return split_nodes_token(old_nodes, "link", TextType.Links)
 
 
 def text_to_textnodes(text):
-    # Start with the entire text as a single node
-    nodes = [TextNode(text, TextType.Normal_text)]
-    # Apply delimiter splitting for bold text
-    nodes = split_nodes_delimiter(nodes, "**", TextType.Bold_text)
-    # Apply delimiter splitting for italic text
-    nodes = split_nodes_delimiter(nodes, "_", TextType.Italic_text)
-    # Apply delimiter splitting for code blocks
-    nodes = split_nodes_delimiter(nodes, "`", TextType.Code_text)
-    # Apply image splitting
-    nodes = split_nodes_image(nodes)
-    # Apply link splitting
-    nodes = split_nodes_link(nodes)
-
-    return nodes
+    # One scan over the text handles bold, italic, code, images and links;
+    # strict mode keeps raising ValueError for unclosed delimiters
+    if not text:
+        return [TextNode(text, TextType.Normal_text)]
+    return [
+        TextNode(token_text, TOKEN_TEXT_TYPES[kind], url)
+        for kind, token_text, url in tokenize_inline(text, strict=True)
+    ]
+
+
+def iter_lines(text):
+    # Yield the lines of a string one at a time (like a file iterator, but
+    # without the line endings) instead of splitting it into a list
+    start = 0
+    while True:
+        end = text.find("\n", start)
+        if end == -1:
+            yield text[start:]
+            return
+        yield text[start:end]
+        start = end + 1
+
+
+def iter_block_lines(lines):
+    # Group lines into blocks separated by empty lines. Each block comes out
+    # as a list of lines, stripped the same way str.strip would strip the
+    # block's text. lines can be a file object or iter_lines(text)
+    block = []
+    for line in lines:
+        if line.endswith("\n"):
+            line = line[:-1]
+        if line:
+            block.append(line)
+            continue
+        if block:
+            block = strip_block_lines(block)
+            if block:
+                yield block
+            block = []
+
+    if block:
+        block = strip_block_lines(block)
+        if block:
+            yield block
+
+
+def strip_block_lines(lines):
+    # Drop whitespace-only lines at either end, then strip the first and last
+    # remaining lines - the line-wise equivalent of "\n".join(lines).strip()
+    start = 0
+    end = len(lines)
+    while start < end and not lines[start].strip():
+        start += 1
+    while end > start and not lines[end - 1].strip():
+        end -= 1
+    if start == end:
+        return []
+    lines = lines[start:end]
+    lines[0] = lines[0].lstrip()
+    lines[-1] = lines[-1].rstrip()
+    return lines
+
+
+def iter_blocks(lines):
+    # Yield (block_type, block_text) for every block, classifying each block
+    # as soon as its last line has been read
+    for block in iter_block_lines(lines):
+        yield classify_block_lines(block), "\n".join(block)
 
 
 def markdown_to_blocks(markdown):
-    # Split the markdown into blocks using double \n as the delimiter
-    blocks = markdown.split("\n\n")
+    # Split the markdown into blocks separated by blank lines, stripping each
+    # block and dropping empty ones
+    return ["\n".join(block) for block in iter_block_lines(iter_lines(markdown))]
 
-    #We need to clean up each block and remove empty ones
-    cleaned_blocks = []
-    for block in blocks:
-        cleaned_block = block.strip()
-        # Only add non-empty blocks to our list
-        if cleaned_block:
-            cleaned_blocks.append(cleaned_block)
 
-    return cleaned_blocks
+def _is_ordered_item(line, number):
+    # Same as line.startswith(f"{number}. ") without formatting a string for
+    # every line
+    end = line.find(". ")
+    if end <= 0 or end > 18:
+        return False
+    prefix = line[:end]
+    return prefix.isascii() and prefix.isdigit() and prefix[0] != "0" and int(prefix) == number
 
 
-def block_to_block_type(block):
-    # Check for heading
-    if block.startswith(("#", "##", "###", "####", "#####", "######")):
-        pound_count = 0
-        for char in block:
-            if char == '#':
-                pound_count += 1
-            else:
-                break
+def classify_block_lines(lines):
+    first = lines[0]
 
-        if pound_count <= 6 and pound_count > 0 and block[pound_count] == ' ':
+    # Check for heading: 1-6 #s followed by a space
+    if first.startswith("#"):
+        pound_count = len(first) - len(first.lstrip("#"))
+        if pound_count <= 6 and first[pound_count:pound_count + 1] == " ":
             return "heading"
 
     # Check for code block
-    if block.startswith("```") and block.endswith("```"):
+    if first.startswith("```") and lines[-1].endswith("```"):
         return "code"
 
-    # Split the block into lines
-    lines = block.split("\n")
-
-    # Check for quote block
-    if all(line.startswith(">") for line in lines) and lines:  # Make sure there's at least one line
+    # Check for quote blocks and both kinds of list in a single pass,
+    # stopping as soon as no candidate is left
+    is_quote = is_unordered = is_ordered = True
+    for number, line in enumerate(lines, 1):
+        if is_quote and not line.startswith(">"):
+            is_quote = False
+        if is_unordered and not line.startswith("- "):
+            is_unordered = False
+        if is_ordered and not _is_ordered_item(line, number):
+            is_ordered = False
+        if not (is_quote or is_unordered or is_ordered):
+            break
+
+    if is_quote:
         return "quote"
-
-    # Check for unordered list
-    if all(line.startswith("- ") for line in lines) and lines:  # Make sure there's at least one line
+    if is_unordered:
         return "unordered_list"
+    if is_ordered:
+        return "ordered_list"
 
-    # Check for ordered list
-    if lines:  # Make sure there's at least one line
-        is_ordered = True
-        for i, line in enumerate(lines):
-            if not line.startswith(f"{i + 1}. "):
-                is_ordered = False
-                break
+    # If none of the above conditions are met, it's a paragraph
+    return "paragraph"
 
-        if is_ordered:
-            return "ordered_list"
 
-    # If none of the above conditions are met, it's a paragraph
-    return "paragraph"
\ No newline at end of file
+def block_to_block_type(block):
+    return classify_block_lines(block.split("\n"))
@@ -0,0 +1,584 @@
+import os
+import sys
+import time
+import argparse
+import threading
+import functools
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+from main import main as build, parse_args as parse_build_args, build_pages
+from manifest import BuildManifest, GENERATOR_VERSION
+from dependencies import DependencyGraph, plan_rebuild
+from discovery import ContentIndex, Page, discover_pages, create_output_dirs, page_dest
+from metadata import MetadataIndex
+from references import ReferenceIndex, check_references
+from listings import generate_listings, listing_outputs, entry_listings, FEED_PATH
+from static_sync import scan_static, sync_files
+from template import TemplateRegistry
+from markdown import set_template_registry, get_inline_cache, get_render_cache
+
+# watchdog delivers the OS's change notifications (inotify, FSEvents,
+# ReadDirectoryChangesW); without it the tree is polled
+try:
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+
+CONTENT_DIR = "content"
+STATIC_DIR = "static"
+TEMPLATE_PATH = "template.html"
+LAYOUTS_DIR = "layouts"
+OUTPUT_DIR = "docs"
+
+# Everything a build reads from
+WATCHED_DIRS = (CONTENT_DIR, STATIC_DIR, LAYOUTS_DIR)
+WATCHED_FILES = (TEMPLATE_PATH,)
+
+# How often the poller stats every file, for edits that don't touch their
+# directory (see PollingWatcher)
+DEFAULT_FULL_SCAN = 0.25
+
+# How long the tree has to be quiet before the session writes its indexes
+# (see WatchSession.save)
+DEFAULT_SAVE_DELAY = 2.0
+
+# Build options whose outputs depend on every static file at once
+# (fingerprinted names, image variants, compressed copies) or on the whole
+# site (shards). With any of them each change runs the whole incremental
+# build, as main.py does
+FULL_BUILD_OPTIONS = ("fingerprint", "images", "precompress", "shard")
+
+
+def diff_snapshots(old, new):
+    # Paths that were added or modified, and paths that were removed
+    changed = {path for path, info in new.items() if old.get(path) != info}
+    removed = {path for path in old if path not in new}
+    return changed, removed
+
+
+def merge_changes(changed, removed, more_changed, more_removed):
+    # Fold a later batch of changes into an earlier one; whatever happened
+    # last to a path wins
+    changed = (changed - more_removed) | more_changed
+    removed = (removed - more_changed) | more_removed
+    return changed, removed
+
+
+def _file_stat(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class PollingWatcher:
+    # Finds changes without OS notifications. Each poll stats only the
+    # watched directories and lists again just the ones whose mtime moved,
+    # which happens whenever a file is added, removed or renamed into place
+    # (how most editors save). A file written in place leaves its directory
+    # alone, so every file is also stat'ed once per full_scan seconds
+    def __init__(self, roots=WATCHED_DIRS, paths=WATCHED_FILES, full_scan=DEFAULT_FULL_SCAN):
+        self.roots = roots
+        self.paths = paths
+        self.full_scan = full_scan
+        # Directory -> its mtime when it was last listed
+        self.directories = {}
+        # Directory -> {file path: (mtime, size)} of the files directly in it
+        self.files = {}
+        # Watched single file -> (mtime, size), or None while it's missing
+        self.singles = {path: _file_stat(path) for path in paths}
+        for root in roots:
+            if os.path.isdir(root):
+                self._scan_directory(root, set(), set())
+        self.last_full_scan = time.monotonic()
+
+    def snapshot(self):
+        # Every watched file's (mtime, size), as of the last poll
+        files = {path: info for path, info in self.singles.items() if info is not None}
+        for directory_files in self.files.values():
+            files.update(directory_files)
+        return files
+
+    def _forget(self, directory, removed):
+        # A directory is gone, along with everything under it
+        for path in list(self.directories):
+            if path == directory or path.startswith(directory + os.sep):
+                del self.directories[path]
+                removed.update(self.files.pop(path, {}))
+
+    def _scan_directory(self, directory, changed, removed):
+        # List one directory again. Its mtime is read first, so anything
+        # that changes while it's being listed is seen on the next poll
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+            entries = list(os.scandir(directory))
+        except (FileNotFoundError, NotADirectoryError):
+            self._forget(directory, removed)
+            return
+        self.directories[directory] = mtime
+
+        files = {}
+        subdirectories = set()
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    subdirectories.add(entry.path)
+                    continue
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        new_changed, new_removed = diff_snapshots(self.files.get(directory, {}), files)
+        changed.update(new_changed)
+        removed.update(new_removed)
+        self.files[directory] = files
+
+        # New subdirectories are listed now; ones that are gone are forgotten
+        for path in subdirectories:
+            if path not in self.directories:
+                self._scan_directory(path, changed, removed)
+        for path in [path for path in self.directories if os.path.dirname(path) == directory]:
+            if path not in subdirectories:
+                self._forget(path, removed)
+
+    def poll(self, timeout):
+        # Wait timeout seconds, then return the (changed, removed) paths
+        time.sleep(timeout)
+        changed, removed = set(), set()
+        now = time.monotonic()
+        full_scan = now - self.last_full_scan >= self.full_scan
+        if full_scan:
+            self.last_full_scan = now
+
+        for directory, mtime in list(self.directories.items()):
+            # Already forgotten along with its parent
+            if directory not in self.directories:
+                continue
+            try:
+                current = os.stat(directory).st_mtime_ns
+            except FileNotFoundError:
+                self._forget(directory, removed)
+                continue
+            if full_scan or current != mtime:
+                self._scan_directory(directory, changed, removed)
+        for root in self.roots:
+            if root not in self.directories and os.path.isdir(root):
+                self._scan_directory(root, changed, removed)
+
+        for path, info in self.singles.items():
+            current = _file_stat(path)
+            if current != info:
+                self.singles[path] = current
+                (changed if current is not None else removed).add(path)
+        return changed, removed
+
+    def stop(self):
+        pass
+
+
+class EventWatcher:
+    # Collects the changes watchdog reports from its own thread until the
+    # next poll. Observer calls dispatch() for each event, so this is the
+    # event handler too
+    def __init__(self, roots=WATCHED_DIRS, paths=WATCHED_FILES):
+        self.roots = roots
+        self.paths = paths
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.changed = set()
+        self.removed = set()
+        self.observer = Observer()
+        # The top level only, for the single files and for watched
+        # directories that don't exist yet
+        self.observer.schedule(self, ".", recursive=False)
+        self.scheduled = set()
+        for root in roots:
+            self._schedule(root)
+        self.observer.start()
+
+    def _schedule(self, root):
+        if root not in self.scheduled and os.path.isdir(root):
+            self.observer.schedule(self, root, recursive=True)
+            self.scheduled.add(root)
+
+    def _watched(self, path):
+        return path in self.paths or path in self.roots or path.startswith(
+            tuple(root + os.sep for root in self.roots))
+
+    def dispatch(self, event):
+        # Opening or reading a file changes nothing, and a directory's own
+        # "modified" event just echoes the changes to its entries
+        if event.event_type in ("opened", "closed_no_write"):
+            return
+        if event.is_directory and event.event_type == "modified":
+            return
+        paths = [(event.src_path, event.event_type in ("deleted", "moved"))]
+        if event.event_type == "moved":
+            paths.append((event.dest_path, False))
+
+        with self.lock:
+            for path, gone in paths:
+                path = os.path.relpath(os.fsdecode(path))
+                if not self._watched(path):
+                    continue
+                if gone:
+                    self.changed.discard(path)
+                    self.removed.add(path)
+                else:
+                    self.removed.discard(path)
+                    self.changed.add(path)
+                    if path in self.roots:
+                        self._schedule(path)
+                self.ready.set()
+
+    def poll(self, timeout):
+        # Wait up to timeout seconds for a change, then return the
+        # (changed, removed) paths reported so far
+        self.ready.wait(timeout)
+        with self.lock:
+            changed, removed = self.changed, self.removed
+            self.changed, self.removed = set(), set()
+            self.ready.clear()
+        return changed, removed
+
+    def stop(self):
+        self.observer.stop()
+        self.observer.join()
+
+
+def make_watcher(poll=False, full_scan=DEFAULT_FULL_SCAN):
+    if Observer is not None and not poll:
+        return EventWatcher()
+    return PollingWatcher(full_scan=full_scan)
+
+
+def rebuild(basepath='/', build_args=()):
+    # Run the same incremental build main.py does, with the same options.
+    # Its manifest and indexes work out what the changes affect (layouts,
+    # listings, fingerprinted names, image attributes) and save what was
+    # built for the next round
+    try:
+        build([basepath, "--incremental", *build_args])
+    except SystemExit as e:
+        # Failed pages or broken links. Keep watching; the author will
+        # probably fix it in a moment
+        if e.code:
+            print(f"Build failed with exit status {e.code}", file=sys.stderr)
+            return False
+    except Exception as e:
+        # e.g. a page asking for a layout that doesn't exist
+        print(f"Build failed: {type(e).__name__}: {e}", file=sys.stderr)
+        return False
+    return True
+
+
+class WatchSession:
+    # An incremental build kept in memory between changes: the manifest's
+    # records, the dependency graph made from them, the compiled templates
+    # and the metadata and reference indexes. Each change is planned from
+    # the paths the watcher reported instead of hashing every source, only
+    # the outputs it affects are rebuilt, and the indexes are written by
+    # save() once the tree has been quiet for a while rather than after
+    # every change
+    def __init__(self, basepath='/', build_args=()):
+        self.basepath = basepath
+        self.build_args = list(build_args)
+        self.args = parse_build_args([basepath, "--incremental", *self.build_args])
+        self.targeted = not any(getattr(self.args, option) for option in FULL_BUILD_OPTIONS)
+        self.loaded = False
+        self.dirty = False
+
+    def start(self):
+        # Bring the tree up to date with a whole build, then keep what it
+        # saved in memory
+        ok = rebuild(self.basepath, self.build_args)
+        self._reload()
+        return ok
+
+    def load(self):
+        args = self.args
+        previous = BuildManifest.load(args.manifest)
+        # What's built so far: the current records of the last round
+        self.manifest = BuildManifest()
+        self.manifest.current, self.manifest.hashes = previous.previous, previous.previous_hashes
+        self.graph = DependencyGraph(self.manifest.current)
+        self.references = ReferenceIndex.load(args.reference_index)
+        self.metadata = MetadataIndex.load(args.metadata_index)
+        # Source path -> discovery.Page for every page, and static source ->
+        # output for every static file
+        self.found = {page.source: page for page in discover_pages(CONTENT_DIR, OUTPUT_DIR,
+                                                                   ContentIndex.load(args.content_index))}
+        self.metadata.scan(sorted(self.found.values()), OUTPUT_DIR)
+        self.static = dict(scan_static(STATIC_DIR, OUTPUT_DIR)) if os.path.isdir(STATIC_DIR) else {}
+        self.listings = listing_outputs(self.metadata.entries, CONTENT_DIR, OUTPUT_DIR)
+        self.registry = TemplateRegistry(TEMPLATE_PATH, self.basepath, CONTENT_DIR, args.layouts, args.minify)
+        set_template_registry(self.registry)
+        # Page output -> its layout
+        self.layouts = {}
+        for source in self.found:
+            self._resolve_layout(source)
+        self.loaded = True
+        self.dirty = False
+
+    def _reload(self):
+        self.loaded = False
+        if not self.targeted:
+            return
+        try:
+            self.load()
+        except Exception as e:
+            # e.g. no template yet. Every change runs the whole build until
+            # one succeeds
+            print(f"Build state not loaded: {type(e).__name__}: {e}", file=sys.stderr)
+
+    def _resolve_layout(self, source):
+        dest = self.found[source].dest
+        try:
+            self.layouts[dest] = self.registry.layout_path(source, self.metadata.metadata_for(source))
+        except ValueError:
+            # build_pages reports the page as failed
+            self.layouts.pop(dest, None)
+
+    def update(self, changed, removed):
+        # Rebuild what the changed and removed paths affect. Returns False
+        # when a page failed or (with --check-links) a link is broken
+        if self.loaded:
+            try:
+                return self._update(changed, removed)
+            except Exception as e:
+                # The indexes on disk still describe the last save, so the
+                # whole build works out what has changed since
+                print(f"Rebuild failed: {type(e).__name__}: {e}", file=sys.stderr)
+        ok = rebuild(self.basepath, self.build_args)
+        self._reload()
+        return ok
+
+    def _expand(self, changed, removed):
+        # Files rather than directories: a directory created or moved in
+        # brings everything in it, and one that's gone takes along every
+        # source known to be in it. A changed path that is already gone
+        # again counts as removed
+        files_changed, files_removed = set(), set()
+        for path in changed:
+            if os.path.isdir(path):
+                for directory, _, names in os.walk(path):
+                    files_changed.update(os.path.join(directory, name) for name in names)
+            elif os.path.exists(path):
+                files_changed.add(path)
+            else:
+                removed = removed | {path}
+        for path in removed:
+            prefix = path + os.sep
+            inside = [source for source in (*self.found, *self.static) if source.startswith(prefix)]
+            files_removed.update(inside or [path])
+        return files_changed - files_removed, files_removed
+
+    def _update(self, changed, removed):
+        args = self.args
+        changed, removed = self._expand(changed, removed)
+        templates_changed = False
+        pages_changed, pages_removed = [], []
+        for path in changed | removed:
+            if path == TEMPLATE_PATH or path.startswith(args.layouts + os.sep):
+                templates_changed = True
+            elif path.startswith(CONTENT_DIR + os.sep) and path.endswith(".md"):
+                if path in removed:
+                    page = self.found.pop(path, None)
+                    if page is not None:
+                        self.layouts.pop(page.dest, None)
+                    pages_removed.append(path)
+                else:
+                    stat = os.stat(path)
+                    self.found[path] = Page(path, page_dest(path, CONTENT_DIR, OUTPUT_DIR), stat.st_mtime_ns,
+                                            stat.st_size)
+                    pages_changed.append(self.found[path])
+            elif path.startswith(STATIC_DIR + os.sep):
+                if path in removed:
+                    self.static.pop(path, None)
+                else:
+                    self.static[path] = os.path.join(OUTPUT_DIR, os.path.relpath(path, STATIC_DIR))
+
+        # Front matter of the changed pages; every other page's is reused
+        # and the listings that link to the ones whose entries changed
+        relisted = set()
+        if pages_changed or pages_removed:
+            before = {entry.source: entry for entry in self.metadata.entries}
+            self.metadata.refresh(pages_changed, pages_removed, OUTPUT_DIR)
+            after = {entry.source: entry for entry in self.metadata.entries}
+            for page in [*pages_changed, *pages_removed]:
+                source = getattr(page, "source", page)
+                if before.get(source) != after.get(source):
+                    for entry in (before.get(source), after.get(source)):
+                        relisted.update(entry_listings(entry, OUTPUT_DIR) if entry is not None else ())
+                    # The feed is named after the home page
+                    relisted.add(os.path.join(OUTPUT_DIR, FEED_PATH))
+        if relisted:
+            self.listings = listing_outputs(self.metadata.entries, CONTENT_DIR, OUTPUT_DIR)
+
+        # A new or edited layout can change which layout any page uses
+        if templates_changed:
+            self.registry = TemplateRegistry(TEMPLATE_PATH, self.basepath, CONTENT_DIR, args.layouts, args.minify)
+            set_template_registry(self.registry)
+            self.layouts = {}
+            for source in self.found:
+                self._resolve_layout(source)
+        else:
+            for path in changed:
+                if path in self.found:
+                    self._resolve_layout(path)
+
+        outputs = {page.dest: "page" for page in self.found.values()}
+        outputs.update((dst_path, "static") for dst_path in self.static.values())
+        outputs.update((path, "listing") for path in self.listings)
+
+        # Everything built so far stays built unless this round drops it
+        manifest = BuildManifest(self.manifest.current, self.manifest.hashes)
+        manifest.current = dict(self.manifest.current)
+        manifest.hashes = dict(self.manifest.hashes)
+        planned, stale = plan_rebuild(manifest, outputs, self.basepath, self.layouts, args.minify, False,
+                                      changed | removed, self.graph)
+        for path in stale:
+            del manifest.current[path]
+            self.references.outgoing.pop(path, None)
+
+        # Static copies first, so pages embedding them record the new copies
+        pairs = [(src_path, dst_path) for src_path, dst_path in sorted(self.static.items()) if dst_path in planned]
+        if pairs:
+            sync_files(pairs, manifest, args.static_compare, args.static_link, args.static_jobs, args.minify)
+
+        # A few pages at a time: worker processes would cost more to start
+        # than they save
+        found = [page for page in sorted(self.found.values()) if page.dest in planned]
+        create_output_dirs(found)
+        pages = [(page.source, page.dest) for page in found]
+        errors = build_pages(pages, TEMPLATE_PATH, OUTPUT_DIR, self.basepath, manifest, references=self.references,
+                             metadata=self.metadata)
+
+        # Every listing uses the templates; otherwise only the ones linking
+        # to a changed page, and new ones, are written again
+        relisted.update(path for path in planned if outputs[path] == "listing")
+        if templates_changed or relisted:
+            select = None if templates_changed else relisted.__contains__
+            for path in generate_listings(self.metadata.entries, CONTENT_DIR, TEMPLATE_PATH, OUTPUT_DIR,
+                                          self.basepath, args.site_url, args.feed_size, self.references, select):
+                manifest.record(path, {"inputs": {}, "generator": GENERATOR_VERSION})
+
+        for path in manifest.prune(OUTPUT_DIR):
+            print(f"Removed: {path}")
+
+        # Keep the graph in step with the records
+        for path in stale:
+            self.graph.remove(path)
+        for path, record in manifest.current.items():
+            if record is not self.manifest.current.get(path):
+                self.graph.update(path, record)
+        self.manifest = manifest
+        self.dirty = True
+
+        broken = check_references(self.references, OUTPUT_DIR) if args.check_links else []
+        for dest_file_path, kind, url in broken:
+            print(f"Broken {kind}: {dest_file_path}: {url}", file=sys.stderr)
+        for dest_file_path, message in errors:
+            print(f"Failed: {dest_file_path}: {message}", file=sys.stderr)
+        return not errors and not broken
+
+    def save(self):
+        # Write what the rounds since the last save changed, for the next
+        # build (or the next watch) to start from
+        if not self.dirty:
+            return
+        args = self.args
+        self.manifest.save(args.manifest)
+        self.references.save(args.reference_index)
+        self.metadata.save(args.metadata_index)
+        inline_cache = get_inline_cache()
+        if inline_cache is not None and args.inline_cache_file:
+            inline_cache.save(args.inline_cache_file)
+        render_cache = get_render_cache()
+        if render_cache is not None:
+            render_cache.evict()
+        self.dirty = False
+
+
+def serve(port):
+    # Serve docs/ from a background thread so the watch loop keeps running
+    handler = functools.partial(SimpleHTTPRequestHandler, directory=OUTPUT_DIR)
+    server = ThreadingHTTPServer(("", port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    print(f"Serving {OUTPUT_DIR}/ at http://localhost:{port}/")
+    return server
+
+
+def watch(basepath='/', interval=0.05, debounce=0.03, on_rebuild=None, should_stop=None, build_args=(),
+          watcher=None, session=None, save_delay=DEFAULT_SAVE_DELAY):
+    watcher = watcher or make_watcher()
+    if session is None:
+        session = WatchSession(basepath, build_args)
+        session._reload()
+    last_rebuild = time.monotonic()
+    try:
+        while should_stop is None or not should_stop():
+            changed, removed = watcher.poll(interval)
+            if not changed and not removed:
+                # Write the indexes once the author has stopped for a while
+                if session.dirty and time.monotonic() - last_rebuild >= save_delay:
+                    session.save()
+                continue
+
+            # Editors often write a file in several steps; wait until the
+            # tree has been quiet for the debounce period before rebuilding
+            while True:
+                more_changed, more_removed = watcher.poll(debounce)
+                if not more_changed and not more_removed:
+                    break
+                changed, removed = merge_changes(changed, removed, more_changed, more_removed)
+
+            start = time.perf_counter()
+            session.update(changed, removed)
+            last_rebuild = time.monotonic()
+            print(f"Rebuilt {len(changed) + len(removed)} change(s) in {(time.perf_counter() - start) * 1000:.0f} ms")
+            if on_rebuild is not None:
+                on_rebuild(changed, removed)
+    finally:
+        watcher.stop()
+        session.save()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Rebuild the site as sources change and serve docs/. Options not listed here are passed on "
+                    "to main.py (give ones that take a value as --option=value)")
+    parser.add_argument("basepath", nargs="?", default="/")
+    parser.add_argument("--port", type=int, default=8888)
+    parser.add_argument("--interval", type=float, default=0.05, help="seconds between checks for changes")
+    parser.add_argument("--debounce", type=float, default=0.03, help="quiet period before rebuilding")
+    parser.add_argument("--poll", action="store_true",
+                        help="poll for changes even if watchdog is installed (e.g. on network filesystems)")
+    parser.add_argument("--full-scan", type=float, default=DEFAULT_FULL_SCAN,
+                        help="when polling, seconds between checks of every file rather than just directories")
+    parser.add_argument("--save-delay", type=float, default=DEFAULT_SAVE_DELAY,
+                        help="seconds without changes before the build indexes are written to disk")
+    parser.add_argument("--no-serve", action="store_true", help="only watch and rebuild")
+    args, build_args = parser.parse_known_args(argv)
+
+    # Unknown options stop here, not at every rebuild
+    parse_build_args([args.basepath, *build_args])
+
+    # Start from an up to date tree; the incremental build skips anything
+    # that is already current
+    session = WatchSession(args.basepath, build_args)
+    session.start()
+
+    if not args.no_serve:
+        serve(args.port)
+    try:
+        watch(args.basepath, args.interval, args.debounce, build_args=build_args,
+              watcher=make_watcher(args.poll, args.full_scan), session=session, save_delay=args.save_delay)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()